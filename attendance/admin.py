@@ -1,27 +1,58 @@
 # attendance/admin.py
 from datetime import date
+from urllib.parse import urlencode
 
+from django.conf import settings
 from django.contrib import admin, messages
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import path
-from django.utils.html import format_html
-from django.http import HttpResponseRedirect
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest
 
-from django.db.models import Min, Max
 from import_export import resources
 from import_export.admin import ExportMixin
 
-from .models import Student, Attendance, PasswordReset, LeaveRequest, AttendanceDeletionLog
+from .models import (
+    Student, Attendance, AttendanceDailySummary, PasswordReset, LeaveRequest, AttendanceDeletionLog, CaptureJob,
+)
+from .exports import SESSION_HEADER, export_response, session_rows
+from .session_cache import invalidate_open_sessions
+from .summaries import (
+    COUNT_CACHE_SECONDS, PAGE_SIZE, refresh_summaries, summary_counts, summary_page,
+)
 
 
 # -----------------------
 # CUSTOM ADMIN ACTIONS
 # -----------------------
 
+def parse_day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_cursor(value):
+    """"<date>.<student_id>" page cursor -> (date, student_id), or None."""
+    day, _, student_id = (value or "").partition(".")
+    day = parse_day(day)
+    return (day, int(student_id)) if day and student_id.isdigit() else None
+
+
+def attendance_changed(pairs):
+    """Keep daily summaries and the recognizers' open-session cache in sync after admin edits."""
+    refresh_summaries(pairs)
+    for student_id in {student_id for student_id, _ in pairs}:
+        invalidate_open_sessions(student_id)
+
+
 def delete_daily_attendance_action(modeladmin, request, queryset):
     """Admin action to delete selected attendance records"""
     count = queryset.count()
+    pairs = set(queryset.values_list("student_id", "date"))
     queryset.delete()
+    attendance_changed(pairs)
     messages.success(request, f"Successfully deleted {count} attendance records.")
 
 delete_daily_attendance_action.short_description = "Delete selected attendance records"
@@ -35,10 +66,6 @@ class StudentResource(resources.ModelResource):
     class Meta:
         model = Student
 
-class AttendanceResource(resources.ModelResource):
-    class Meta:
-        model = Attendance
-
 
 # -----------------------
 # INLINE ATTENDANCE FOR STUDENT
@@ -71,9 +98,8 @@ class StudentAdmin(ExportMixin, admin.ModelAdmin):
 # -----------------------
 
 @admin.register(Attendance)
-class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
-    resource_class = AttendanceResource
-
+class AttendanceAdmin(admin.ModelAdmin):
+    # Exports go through export_view (streamed), not ExportMixin, which builds every row in memory
     # We will render our own summary table, so keep list_display simple
     list_display = ("student", "date", "check_in", "check_out")
     search_fields = ("student__name", "student__student_id")
@@ -83,18 +109,59 @@ class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
 
     change_list_template = "attendance/admin/attendance_summary_changelist.html"
 
-    def get_daily_summary(self):
-        """Returns one row per (student, date) with first_in and last_out."""
-        return (
-            Attendance.objects
-            .values("student__student_id", "student__name", "date")
-            .annotate(
-                first_in=Min("check_in"),
-                last_out=Max("check_out"),
-            )
-            .order_by("-date", "student__name")
+    def get_daily_summary(self, start=None, end=None, course=None):
+        """Returns one row per (student, date) with first_in and last_out, optionally filtered."""
+        summaries = AttendanceDailySummary.objects.all()
+        if start:
+            summaries = summaries.filter(date__gte=start)
+        if end:
+            summaries = summaries.filter(date__lte=end)
+        if course:
+            summaries = summaries.filter(student__course=course)
+        return summaries.values("student_id", "student__name", "date", "first_in", "last_out", "sessions")
+
+    def daily_summary_context(self, request):
+        """One keyset page of the daily summary plus cached counts and navigation links."""
+        config = getattr(settings, "ATTENDANCE_ADMIN", {})
+        filters = {
+            "from": parse_day(request.GET.get("from")),
+            "to": parse_day(request.GET.get("to")),
+            "course": request.GET.get("course") or None,
+        }
+        summary = self.get_daily_summary(filters["from"], filters["to"], filters["course"])
+        rows, has_older, has_newer = summary_page(
+            summary,
+            after=parse_cursor(request.GET.get("after")),
+            before=parse_cursor(request.GET.get("before")),
+            size=config.get("PAGE_SIZE", PAGE_SIZE),
         )
 
+        kept = {name: str(value) for name, value in filters.items() if value}
+
+        def link(**cursor):
+            return "?" + urlencode({**kept, **cursor})
+
+        return {
+            "daily_summary": rows,
+            "summary_counts": summary_counts(
+                summary, urlencode(sorted(kept.items())), config.get("COUNT_CACHE_SECONDS", COUNT_CACHE_SECONDS),
+            ),
+            "summary_filters": kept,
+            "export_query": urlencode(kept),
+            "courses": Student.objects.order_by("course").values_list("course", flat=True).distinct(),
+            "newest_url": link() if has_newer else None,
+            "newer_url": link(before=f"{rows[0]['date']}.{rows[0]['student_id']}") if has_newer and rows else None,
+            "older_url": link(after=f"{rows[-1]['date']}.{rows[-1]['student_id']}") if has_older else None,
+        }
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if getattr(request, "daily_summary_view", False):
+            # The summary page lists AttendanceDailySummary rows itself; don't let the
+            # stock changelist count and fetch raw sessions it never shows.
+            return queryset.none()
+        return queryset
+
     def changelist_view(self, request, extra_context=None):
         # Check if it's a delete request from the summary page
         if 'delete_all' in request.GET and request.GET.get('delete_all') == '1':
@@ -109,6 +176,7 @@ class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
                 )
                 count = records.count()
                 records.delete()
+                attendance_changed({(int(student_id), date.fromisoformat(date_str))})
                 messages.success(request, f"Successfully deleted {count} attendance records for {date_str}")
                 
                 # Redirect to remove the query parameters
@@ -123,7 +191,14 @@ class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
         # Otherwise, show the daily summary with custom template
         self.change_list_template = "attendance/admin/attendance_summary_changelist.html"
         extra_context = extra_context or {}
-        extra_context["daily_summary"] = self.get_daily_summary()
+        extra_context.update(self.daily_summary_context(request))
+
+        # Summary parameters are ours, not changelist lookups (which would be rejected)
+        request.GET = request.GET.copy()
+        for name in ("from", "to", "course", "after", "before"):
+            request.GET.pop(name, None)
+        # Only the GET page skips the sessions; a POSTed action needs its real queryset
+        request.daily_summary_view = request.method == "GET"
         return super().changelist_view(request, extra_context=extra_context)
 
     def get_urls(self):
@@ -144,9 +219,34 @@ class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
                 self.admin_site.admin_view(self.daily_breaks_view),
                 name="attendance_daily_breaks",
             ),
+            path(
+                "export/",
+                self.admin_site.admin_view(self.export_view),
+                name="attendance_export",
+            ),
         ]
         return custom + urls
 
+    def export_view(self, request):
+        """
+        Stream every session in ?from=&to= (optional) for one ?student=, one
+        ?course= or everyone, as ?format=csv (default) or xlsx.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        export_format = request.GET.get("format", "csv")
+        if export_format not in ("csv", "xlsx"):
+            return HttpResponseBadRequest("format must be csv or xlsx")
+
+        start, end = parse_day(request.GET.get("from")), parse_day(request.GET.get("to"))
+        student_id = request.GET.get("student")
+        course = request.GET.get("course") or None
+        rows = session_rows(
+            start, end, student_id=int(student_id) if student_id and student_id.isdigit() else None, course=course,
+        )
+        name = "_".join(str(part) for part in ("attendance", course, start, end) if part).replace(" ", "_")
+        return export_response(request, export_format, SESSION_HEADER, rows, name)
+
     def bulk_delete_confirm_page(self, request):
         """Show confirmation page with remarks field"""
         student_id = request.GET.get('student_id')
@@ -191,6 +291,7 @@ class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
                     
                     # Now delete the records
                     records.delete()
+                    attendance_changed({(student.student_id, date.fromisoformat(date_str))})
                     
                     # Show success message with remarks
                     messages.success(request, f'Deleted {count} records for {student_name} on {date_str}. Remarks: {remarks}')
@@ -239,6 +340,23 @@ class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
             context,
         )
 
+    # Keep daily summaries and the recognizers' open-session cache in sync with admin edits
+    def save_model(self, request, obj, form, change):
+        # An edit may move the session to another student or day; refresh the old one too
+        pairs = set(Attendance.objects.filter(pk=obj.pk).values_list("student_id", "date")) if change else set()
+        super().save_model(request, obj, form, change)
+        attendance_changed(pairs | {(obj.student_id, obj.date)})
+
+    def delete_model(self, request, obj):
+        pair = (obj.student_id, obj.date)
+        super().delete_model(request, obj)
+        attendance_changed({pair})
+
+    def delete_queryset(self, request, queryset):
+        pairs = set(queryset.values_list("student_id", "date"))
+        super().delete_queryset(request, queryset)
+        attendance_changed(pairs)
+
     def get_form(self, request, obj=None, **kwargs):
         """Pre-fill form with student and date from URL parameters"""
         form = super().get_form(request, obj, **kwargs)
@@ -294,6 +412,26 @@ class PasswordResetAdmin(admin.ModelAdmin):
     list_filter = ("created_when",)
 
 
+# -----------------------
+# CAPTURE JOB ADMIN
+# -----------------------
+
+@admin.register(CaptureJob)
+class CaptureJobAdmin(admin.ModelAdmin):
+    list_display = ("student", "status", "count", "target", "camera", "created_at", "total_seconds")
+    list_filter = ("status", "camera", "created_at")
+    search_fields = ("student__name", "job_id")
+    readonly_fields = [f.name for f in CaptureJob._meta.fields]
+
+    def total_seconds(self, obj):
+        total = obj.metrics.get("total_ms")
+        return f"{total / 1000:.1f}s" if total is not None else "-"
+    total_seconds.short_description = "Duration"
+
+    def has_add_permission(self, request):
+        return False
+
+
 # -----------------------
 # LEAVE REQUEST ADMIN
 # -----------------------
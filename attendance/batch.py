@@ -0,0 +1,156 @@
+# attendance/batch.py
+"""
+Offline attendance from recorded videos.
+
+Each video is split into frame ranges that worker processes decode in
+parallel (every `stride`-th frame is decoded, the rest are only grabbed).
+Workers load their own detector/embedder and the gallery once and return
+the first/last second at which each student was seen.
+"""
+import itertools
+import os
+import time
+
+import cv2
+
+from .face_pipeline import FaceBatcher
+from .gallery import GalleryStore
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+# ----------------------------
+# INPUTS
+# ----------------------------
+def find_videos(path):
+    """A single video file, or every video file inside a directory (sorted)."""
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(VIDEO_EXTENSIONS)
+        )
+    return [path]
+
+
+def video_info(path):
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return fps, frame_count
+
+
+def video_segments(path, segments):
+    """
+    Split a video into `segments` contiguous (path, start_frame, end_frame)
+    ranges. A video whose container does not report a frame count becomes
+    one range read sequentially to its end (end_frame None).
+    """
+    _, frame_count = video_info(path)
+    if frame_count <= 0:
+        return [(path, 0, None)]
+    segments = max(1, min(segments, frame_count))
+    bounds = [round(i * frame_count / segments) for i in range(segments + 1)]
+    return [(path, bounds[i], bounds[i + 1]) for i in range(segments) if bounds[i] < bounds[i + 1]]
+
+
+# ----------------------------
+# WORKER PROCESS
+# ----------------------------
+_worker = {}
+
+
+def init_worker(faces_dir, matcher_options, pipeline_options, threshold):
+    """Process-pool initializer: load the models and the gallery once per process."""
+    from keras_facenet import FaceNet
+    from mtcnn import MTCNN
+
+    _worker["batcher"] = FaceBatcher(MTCNN(), FaceNet(), **pipeline_options)
+    _worker["matcher"] = GalleryStore(faces_dir).load(**matcher_options)
+    _worker["threshold"] = threshold
+
+
+def process_segment(path, start_frame, end_frame, stride):
+    """
+    Recognise faces in frames [start_frame, end_frame) of `path` (to the end
+    of the video if end_frame is None). Returns counts plus
+    {student_id: [first_second, last_second, hits]}.
+    """
+    batcher, matcher = _worker["batcher"], _worker["matcher"]
+    capture = cv2.VideoCapture(path)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    sightings = {}
+    frames = faces = 0
+    indices = range(start_frame, end_frame) if end_frame is not None else itertools.count(start_frame)
+    for index in indices:
+        if index % stride:
+            if not capture.grab():
+                break
+            continue
+
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames += 1
+
+        batch = batcher.process(batcher.preprocessor.rgb(frame))
+        faces += len(batch)
+        if not len(batch):
+            continue
+
+        seconds = index / fps
+        for student_id, _ in matcher.best(batch.embeddings, threshold=_worker["threshold"]):
+            if student_id is None:
+                continue
+            seen = sightings.setdefault(student_id, [seconds, seconds, 0])
+            seen[0] = min(seen[0], seconds)
+            seen[1] = max(seen[1], seconds)
+            seen[2] += 1
+
+    capture.release()
+    return {"path": path, "frames": frames, "faces": faces, "sightings": sightings}
+
+
+# ----------------------------
+# DRIVER
+# ----------------------------
+def recognize_videos(videos, executor, stride=5, segments_per_video=4):
+    """
+    Fan every video's segments out to `executor` (a pool built with init_worker).
+    Returns ({path: {student_id: [first_s, last_s, hits]}}, stats).
+    """
+    start = time.perf_counter()
+    futures = [
+        executor.submit(process_segment, path, first, last, stride)
+        for video in videos
+        for path, first, last in video_segments(video, segments_per_video)
+    ]
+
+    per_video = {path: {} for path in videos}
+    decoded = {path: 0 for path in videos}
+    frames = faces = 0
+    for future in futures:
+        result = future.result()
+        frames += result["frames"]
+        decoded[result["path"]] += result["frames"]
+        faces += result["faces"]
+        merged = per_video[result["path"]]
+        for student_id, (first, last, hits) in result["sightings"].items():
+            seen = merged.setdefault(student_id, [first, last, 0])
+            seen[0] = min(seen[0], first)
+            seen[1] = max(seen[1], last)
+            seen[2] += hits
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "videos": len(videos),
+        "frames": frames,
+        "decoded": decoded,  # frames decoded per video
+        "faces": faces,
+        "seconds": elapsed,
+        "frames_per_second": frames / elapsed if elapsed else 0.0,
+        "faces_per_second": faces / elapsed if elapsed else 0.0,
+    }
+    return per_video, stats
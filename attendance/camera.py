@@ -0,0 +1,311 @@
+# attendance/camera.py
+import os
+import threading
+import time
+
+import cv2
+
+
+# ----------------------------
+# SOURCES
+# ----------------------------
+class VideoFileSource:
+    """
+    A recorded video that behaves like a camera: frames are paced at the
+    file's FPS (when `realtime`) and the video can loop forever. Used in place
+    of live cameras for testing the recognizers.
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 25
+        self._next_frame_at = None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_frame_at is not None and now < self._next_frame_at:
+                time.sleep(self._next_frame_at - now)
+            self._next_frame_at = max(now, self._next_frame_at or now) + self.frame_interval
+
+        ok, frame = self.capture.read()
+        if not ok and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+        return ok, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT and self.loop:
+            return 0  # never ends, like a camera
+        return self.capture.get(prop)
+
+    def release(self):
+        self.capture.release()
+
+
+def open_source(spec, realtime=True, loop=False):
+    """
+    Open a camera index ("0"), a stream URL (rtsp://, http://) or a video file.
+    Video files are wrapped in VideoFileSource.
+    """
+    spec = str(spec)
+    if spec.isdigit():
+        return cv2.VideoCapture(int(spec))
+    if os.path.exists(spec):
+        return VideoFileSource(spec, realtime=realtime, loop=loop)
+    return cv2.VideoCapture(spec)
+
+
+def is_file_source(capture):
+    """True for captures that end (video files) rather than live cameras/streams."""
+    frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT) if hasattr(capture, "get") else 0
+    return frame_count > 0
+
+
+def source_name(spec):
+    """Short label used to tag frames and attendance events from `spec`."""
+    spec = str(spec)
+    if spec.isdigit():
+        return f"camera{spec}"
+    if os.path.exists(spec):
+        return os.path.basename(spec)
+    return spec.split("@")[-1]  # drop credentials from stream URLs
+
+
+def source_names(specs):
+    """
+    {label: spec} for several sources, in order, duplicates dropped. Labels
+    are source_name()s made unique with a "#2", "#3"... suffix, so
+    a/cam.mp4 and b/cam.mp4 don't end up sharing one.
+    """
+    names = {}
+    for spec in dict.fromkeys(str(spec) for spec in specs):
+        name = label = source_name(spec)
+        suffix = 2
+        while label in names:
+            label = f"{name}#{suffix}"
+            suffix += 1
+        names[label] = spec
+    return names
+
+
+# ----------------------------
+# CAMERA HUB
+# ----------------------------
+class CameraFeed:
+    """
+    One device read by one thread. The newest `buffer_size` frames are kept in
+    a ring buffer; frames are published read-only and shared by every
+    subscriber, so nobody may draw on them in place.
+    """
+
+    def __init__(self, spec, capture, buffer_size=4, retry_delay=0.05):
+        self.spec = spec
+        self.capture = capture
+        self.retry_delay = retry_delay
+        self.frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        self.subscribers = 0
+        self.ended = False
+        self._ring = [None] * max(1, buffer_size)
+        self._index = 0  # index of the newest frame; frame i lives in _ring[i % size]
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"camera-{source_name(spec)}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                ok, frame = self.capture.read()
+                if not ok:
+                    if is_file_source(self.capture):
+                        break
+                    time.sleep(self.retry_delay)  # camera hiccup: retry without spinning
+                    continue
+
+                frame.flags.writeable = False
+                with self._changed:
+                    self._index += 1
+                    self._ring[self._index % len(self._ring)] = frame
+                    self._changed.notify_all()
+        finally:
+            self.capture.release()
+            with self._changed:
+                self.ended = True
+                self._changed.notify_all()
+
+    def frame_after(self, last_index, timeout=1.0):
+        """
+        (index, frame) of the oldest buffered frame newer than `last_index`,
+        waiting up to `timeout` seconds for one. A subscriber that fell more
+        than the ring behind skips to the oldest frame still buffered.
+        Returns (last_index, None) on timeout or once the source has ended.
+        """
+        with self._changed:
+            if not self._changed.wait_for(lambda: self._index > last_index or self.ended, timeout):
+                return last_index, None
+            if self._index <= last_index:
+                return last_index, None
+            index = max(last_index + 1, self._index - len(self._ring) + 1)
+            return index, self._ring[index % len(self._ring)]
+
+
+class Subscription:
+    """
+    A consumer of one CameraFeed. next_frame() returns shared read-only frames;
+    read() mimics cv2.VideoCapture (returns a private copy) so a subscription
+    can be handed to code written for a capture, e.g. RecognitionEngine.
+    """
+
+    def __init__(self, hub, feed):
+        self.hub = hub
+        self.feed = feed
+        self.last_index = 0
+        self.closed = False
+
+    def next_frame(self, timeout=1.0):
+        if self.closed:
+            return None
+        self.last_index, frame = self.feed.frame_after(self.last_index, timeout)
+        return frame
+
+    def latest_frame(self, timeout=1.0):
+        """Newest buffered frame (skipping older ones), or wait for the next one if already seen."""
+        self.last_index = max(self.last_index, self.feed._index - 1)
+        return self.next_frame(timeout)
+
+    # cv2.VideoCapture-like interface
+    def isOpened(self):
+        return not self.closed and not (self.feed.ended and self.last_index >= self.feed._index)
+
+    def read(self):
+        frame = self.next_frame()
+        if frame is None:
+            return False, None
+        return True, frame.copy()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.feed.frame_count  # still known after the reader released the device
+        return self.feed.capture.get(prop)
+
+    def release(self):
+        if not self.closed:
+            self.closed = True
+            self.hub._unsubscribe(self.feed)
+
+    close = release
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class CameraHub:
+    """
+    Opens each camera (or stream / video file) once, however many consumers
+    want it. subscribe() starts the reader on first use; the device is
+    released when the last subscription closes. A source that ended while
+    still subscribed (e.g. a stream that dropped) is reopened by the next
+    subscribe().
+
+    `opener(spec)` returns a capture; tests pass one that opens a
+    VideoFileSource instead of a real device.
+    """
+
+    def __init__(self, opener=None, buffer_size=4):
+        self.opener = opener or (lambda spec: open_source(spec, realtime=True, loop=True))
+        self.buffer_size = buffer_size
+        self._feeds = {}
+        self._closing = {}  # spec -> feed whose reader is still releasing the device
+        self._opening = {}  # spec -> lock held while that source is opened or closed
+        self._lock = threading.Lock()
+
+    def subscribe(self, spec):
+        spec = str(spec)
+        with self._lock:
+            feed = self._join(spec)
+            if feed is None:
+                opening = self._opening.setdefault(spec, threading.Lock())
+        if feed is not None:
+            return Subscription(self, feed)
+
+        # Opening (and waiting for the old reader) can take seconds; the hub
+        # lock stays free meanwhile, so other sources are not held up.
+        with opening:
+            with self._lock:
+                feed = self._join(spec)  # another thread may have opened it meanwhile
+                if feed is None:
+                    stale = [f for f in (self._feeds.pop(spec, None), self._closing.get(spec)) if f is not None]
+            if feed is not None:
+                return Subscription(self, feed)
+
+            for old in stale:  # an ended feed (restarted here) or one still closing
+                old.stop()
+            capture = self.opener(spec)
+            if not capture.isOpened():
+                capture.release()
+                raise IOError(f"Could not open camera source {spec}")
+            feed = CameraFeed(spec, capture, self.buffer_size).start()
+            with self._lock:
+                self._feeds[spec] = feed
+                feed.subscribers += 1
+        return Subscription(self, feed)
+
+    def _join(self, spec):
+        """The running feed of `spec` with one more subscriber, or None (caller holds self._lock)."""
+        feed = self._feeds.get(spec)
+        if feed is None or feed.ended:
+            return None
+        feed.subscribers += 1
+        return feed
+
+    def _unsubscribe(self, feed):
+        with self._lock:
+            feed.subscribers -= 1
+            if feed.subscribers > 0:
+                return
+            if self._feeds.get(feed.spec) is feed:
+                del self._feeds[feed.spec]
+                self._closing[feed.spec] = feed
+        # Wait (outside the lock) for the reader to release the device; a
+        # subscribe() in the meantime waits for the same before reopening it
+        feed.stop()
+        with self._lock:
+            if self._closing.get(feed.spec) is feed:
+                del self._closing[feed.spec]
+
+    def active_sources(self):
+        with self._lock:
+            return {spec: feed.subscribers for spec, feed in self._feeds.items()}
+
+
+def camera_hub_from_settings():
+    from django.conf import settings
+
+    config = getattr(settings, "CAMERA_HUB", {})
+    return CameraHub(buffer_size=config.get("BUFFER_SIZE", 4))
+
+
+def default_camera():
+    """The device the web app streams from and captures with (settings.CAMERA_HUB["SOURCE"])."""
+    from django.conf import settings
+
+    return str(getattr(settings, "CAMERA_HUB", {}).get("SOURCE", "0"))
@@ -0,0 +1,290 @@
+# attendance/capture_jobs.py
+"""
+Face-registration captures as jobs.
+
+The job row (CaptureJob) holds status, progress and the cancel flag, so any
+web worker can report or cancel a capture started by another one. The
+capture itself runs in this process's bounded worker pool; at most
+PER_CAMERA jobs hold a camera at a time (checked against the database, so
+the limit holds across processes).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import cv2
+import numpy as np
+from django.db import close_old_connections
+from django.db.models import Count, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from .enrollment import EnrollmentSelector, enrollment_options_from_settings
+from .gallery import RAW_DIRNAME, GalleryStore
+from .models import CaptureJob
+from .preprocess import FramePreprocessor
+from .streaming import ProgressBroadcaster
+
+MAX_WORKERS = 2
+PER_CAMERA = 1
+IMAGES = 10               # distinct good faces collected before the templates are chosen
+TIMEOUT = 120.0           # seconds a job may run (or sit in the queue) before it fails
+HEARTBEAT_EVERY = 2.0     # seconds between progress writes when nothing changed
+CANCEL_CHECK_EVERY = 0.5  # seconds between checks of the cancel flag
+CAPTURE_INTERVAL = 0.5    # seconds after an accepted face, so the next one differs a little
+
+FACES_DIR = "faces"
+
+# Progress changes made in this process, keyed by student id, for the SSE views
+capture_progress = ProgressBroadcaster()
+
+
+class CaptureCancelled(Exception):
+    pass
+
+
+class CaptureJobRunner:
+    """
+    Runs capture jobs on at most `max_workers` threads of this process.
+
+    `hub` provides camera subscriptions; `face_batcher` is a callable that
+    returns a FaceBatcher for the calling thread (e.g. face_models.face_batcher).
+    """
+
+    def __init__(self, hub, face_batcher, max_workers=MAX_WORKERS, per_camera=PER_CAMERA,
+                 images=IMAGES, timeout=TIMEOUT, faces_dir=FACES_DIR, enrollment=None):
+        self.hub = hub
+        self.face_batcher = face_batcher
+        self.per_camera = per_camera
+        self.images = images
+        self.timeout = timeout
+        self.faces_dir = faces_dir
+        self.enrollment = enrollment or {}  # EnrollmentSelector options
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="capture")
+        self._slot_freed = threading.Condition()
+
+    # ---- API used by the views ----
+    def submit(self, student, camera):
+        """Queue a capture for `student` on `camera`; cancels the student's unfinished jobs."""
+        expire_stale_jobs(self.timeout)
+        request_cancel(student.student_id)
+        job = CaptureJob.objects.create(student=student, camera=str(camera), target=self.images)
+        capture_progress.publish(student.student_id)
+        self._executor.submit(self._run, job.pk)
+        return job
+
+    # ---- worker side ----
+    def _run(self, pk):
+        close_old_connections()
+        try:
+            job = CaptureJob.objects.select_related("student").get(pk=pk)
+            metrics = {}
+            try:
+                self._wait_for_camera(job, metrics)
+                self._capture(job, metrics)
+            except CaptureCancelled:
+                self._finish(job, "cancelled", metrics)
+            except Exception as e:
+                print(f"❌ Capture {job.job_id} failed: {e}")
+                self._finish(job, "failed", metrics, error=str(e))
+            finally:
+                with self._slot_freed:
+                    self._slot_freed.notify_all()
+        finally:
+            close_old_connections()
+
+    def _claim(self, job):
+        """
+        Mark the job running if its camera has a free slot. One conditional
+        UPDATE: SQLite takes its write lock before the statement reads, so two
+        workers cannot both see the same free slot (a count followed by an
+        UPDATE in a deferred transaction could).
+        """
+        now = timezone.now()
+        running = (
+            CaptureJob.objects.filter(
+                camera=job.camera, status="running", heartbeat_at__gte=now - timedelta(seconds=self.timeout)
+            )
+            .order_by().values("camera").annotate(n=Count("id")).values("n")
+        )
+        claimed = bool(
+            CaptureJob.objects.filter(LessThan(Coalesce(Subquery(running), 0), self.per_camera), pk=job.pk, status="queued")
+            .update(status="running", started_at=now, heartbeat_at=now)
+        )
+        if claimed:
+            capture_progress.publish(job.student_id)
+        return claimed
+
+    def _wait_for_camera(self, job, metrics):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while not self._claim(job):
+            if cancel_requested(job.pk):
+                raise CaptureCancelled()
+            if time.monotonic() > deadline:
+                raise TimeoutError("camera stayed busy")
+            with self._slot_freed:
+                self._slot_freed.wait(CANCEL_CHECK_EVERY)
+        metrics["queued_ms"] = (time.perf_counter() - start) * 1000
+
+    def _capture(self, job, metrics):
+        student = job.student
+        folder = os.path.join(self.faces_dir, str(student.student_id))
+        os.makedirs(folder, exist_ok=True)
+
+        start = time.perf_counter()
+        face_batcher = self.face_batcher()  # loads the models on first use
+        metrics["models_ms"] = (time.perf_counter() - start) * 1000
+
+        selector = EnrollmentSelector(**self.enrollment)
+        preprocessor = FramePreprocessor()
+        frames = detect_ms = embed_ms = 0.0
+        deadline = time.monotonic() + self.timeout
+        last_check = last_write = time.monotonic()
+        capture_start = time.perf_counter()
+
+        with self.hub.subscribe(job.camera) as feed:
+            while len(selector) < job.target:
+                now = time.monotonic()
+                if now - last_check >= CANCEL_CHECK_EVERY:
+                    last_check = now
+                    if cancel_requested(job.pk):
+                        raise CaptureCancelled()
+                if now > deadline:
+                    raise TimeoutError(f"only {len(selector)}/{job.target} usable faces captured "
+                                       f"(rejected: {selector.rejected})")
+                if now - last_write >= HEARTBEAT_EVERY:
+                    last_write = now
+                    update_job(job)
+                if not feed.isOpened():
+                    raise IOError("camera stream ended")
+
+                frame = feed.latest_frame()
+                if frame is None:
+                    continue
+                frames += 1
+
+                faces = face_batcher.process(preprocessor.rgb(frame), limit=1)
+                detect_ms += faces.timings.get("detect", 0.0)
+                embed_ms += faces.timings.get("embed", 0.0)
+                for ((x, y, w, h), embedding), detection in zip(faces, faces.detections):
+                    accepted, _ = selector.add(embedding, frame[y:y + h, x:x + w], detection)
+                    if not accepted:
+                        continue
+                    count = len(selector)
+                    update_job(job, count=count)
+                    last_write = time.monotonic()
+                    print(f"✅ Captured {count}/{job.target} ({faces.timing_summary()})")
+                    time.sleep(CAPTURE_INTERVAL)
+
+        metrics.update({
+            "capture_ms": (time.perf_counter() - capture_start) * 1000,
+            "frames": int(frames),
+            "detect_ms": detect_ms,
+            "embed_ms": embed_ms,
+            "rejected": sum(selector.rejected.values()),
+        })
+
+        start = time.perf_counter()
+        templates = save_templates(folder, student, selector)
+        GalleryStore(self.faces_dir).upsert(student.student_id, templates)
+        metrics["save_ms"] = (time.perf_counter() - start) * 1000
+        print(f"✅ Saved {len(templates)} templates (rejected: {selector.rejected}).")
+
+        self._finish(job, "done", metrics)
+
+    def _finish(self, job, status, metrics, error=""):
+        now = timezone.now()
+        metrics["total_ms"] = (now - job.created_at).total_seconds() * 1000
+        CaptureJob.objects.filter(pk=job.pk).update(
+            status=status, error=error, metrics=metrics, finished_at=now, heartbeat_at=now
+        )
+        capture_progress.publish(job.student_id)
+        summary = " | ".join(f"{k} {v:.0f}" for k, v in metrics.items())
+        print(f"⏱️ Capture {job.job_id} {status}: {summary}")
+
+
+def save_templates(folder, student, selector):
+    """
+    Keep every pooled capture under `<folder>/raw/` (re-embedding reads
+    those), replace the face images in `folder` with the selected templates'
+    crops and save their embeddings as a (K, dim) stack. Returns that stack.
+    """
+    raw_folder = os.path.join(folder, RAW_DIRNAME)
+    os.makedirs(raw_folder, exist_ok=True)
+    for directory in (folder, raw_folder):
+        for name in os.listdir(directory):
+            if name.lower().endswith(".jpg"):
+                os.remove(os.path.join(directory, name))
+
+    for i, (_, crop, _) in enumerate(selector.samples, start=1):
+        cv2.imwrite(os.path.join(raw_folder, f"{student.name}_{i}.jpg"), crop)
+    for i, (_, crop, _) in enumerate(selector.templates(), start=1):
+        cv2.imwrite(os.path.join(folder, f"{student.name}_{i}.jpg"), crop)
+
+    templates = selector.template_matrix()
+    np.save(os.path.join(folder, f"{student.student_id}_embedding.npy"), templates)
+    return templates
+
+
+# ----------------------------
+# JOB STATE (any process)
+# ----------------------------
+def update_job(job, **fields):
+    """Heartbeat `job`, saving `fields` (progress) with it."""
+    CaptureJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now(), **fields)
+    if fields:
+        capture_progress.publish(job.student_id)
+
+
+def cancel_requested(pk):
+    return CaptureJob.objects.filter(pk=pk, cancel_requested=True).exists()
+
+
+def request_cancel(student_id):
+    """
+    Cancel the student's unfinished captures. Queued jobs stop at once;
+    running ones stop at their next cancel check (within CANCEL_CHECK_EVERY).
+    """
+    active = CaptureJob.objects.filter(student_id=student_id).exclude(status__in=CaptureJob.FINISHED)
+    active.update(cancel_requested=True)
+    cancelled = active.filter(status="queued").update(status="cancelled", finished_at=timezone.now())
+    if cancelled:
+        capture_progress.publish(student_id)
+    return cancelled
+
+
+def expire_stale_jobs(timeout=TIMEOUT):
+    """Fail jobs whose worker went away (process restarted) without finishing them."""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    CaptureJob.objects.filter(status="running", heartbeat_at__lt=cutoff).update(
+        status="failed", error="worker stopped responding", finished_at=timezone.now()
+    )
+    CaptureJob.objects.filter(status="queued", created_at__lt=cutoff).update(
+        status="failed", error="never started", finished_at=timezone.now()
+    )
+
+
+def capture_state(student_id):
+    """Progress of the student's latest capture ({"count": 0, "done": False} if none)."""
+    job = CaptureJob.objects.filter(student_id=student_id).order_by("-created_at", "-id").first()
+    if job is None:
+        return {"count": 0, "done": False}
+    return job.progress()
+
+
+def capture_runner_from_settings(hub, face_batcher):
+    from django.conf import settings
+
+    config = getattr(settings, "CAPTURE_JOBS", {})
+    return CaptureJobRunner(
+        hub, face_batcher,
+        max_workers=config.get("MAX_WORKERS", MAX_WORKERS),
+        per_camera=config.get("PER_CAMERA", PER_CAMERA),
+        images=config.get("IMAGES", IMAGES),
+        timeout=config.get("TIMEOUT", TIMEOUT),
+        enrollment=enrollment_options_from_settings(),
+    )
@@ -0,0 +1,389 @@
+# attendance/engine.py
+import queue
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from .camera import is_file_source
+from .preprocess import FramePreprocessor
+
+WRITE_RETRIES = 3  # failed flushes retried before their events are given up
+STATS_EVERY = 10.0  # seconds between the recognizer scripts' stage/queue reports
+
+
+# ----------------------------
+# PIPELINE DATA
+# ----------------------------
+class FramePacket:
+    """One captured frame on its way through the pipeline."""
+
+    def __init__(self, source, index, frame):
+        self.source = source
+        self.index = index
+        self.frame = frame
+        self.captured_at = time.time()
+
+
+class RecognitionResult:
+    """Boxes and (student_id, score) matches found in one frame."""
+
+    def __init__(self, packet, boxes, matches, timings):
+        self.packet = packet
+        self.boxes = boxes
+        self.matches = matches
+        self.timings = timings
+
+
+class AttendanceEvent:
+    """A recognised student, queued for the attendance writer."""
+
+    def __init__(self, student_id, score, source, frame_index, seen_at):
+        self.student_id = student_id
+        self.score = score
+        self.source = source
+        self.frame_index = frame_index
+        self.seen_at = seen_at
+        self.status = None
+
+    @property
+    def when(self):
+        return datetime.fromtimestamp(self.seen_at, tz=dt_timezone.utc)
+
+
+class StageStats:
+    """Thread-safe counters and latency for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.dropped = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, ms):
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "dropped": self.dropped,
+                "avg_ms": self.total_ms / self.count if self.count else 0.0,
+                "max_ms": self.max_ms,
+            }
+
+
+def put_latest(q, item):
+    """
+    Put `item` on a bounded queue, discarding the oldest entry when it is full.
+    Returns True if something was dropped.
+    """
+    try:
+        q.put_nowait(item)
+        return False
+    except queue.Full:
+        pass
+    try:
+        q.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        q.put_nowait(item)
+    except queue.Full:
+        pass
+    return True
+
+
+# ----------------------------
+# ENGINE
+# ----------------------------
+class RecognitionEngine:
+    """
+    Pipelined recognizer: capture -> detect/embed/match workers -> attendance writer.
+
+    - one capture thread per source (camera index, stream or video file) reads
+      frames and publishes each one for display; frames for recognition go
+      through a small bounded queue and the oldest one is dropped when workers
+      fall behind, so recognition always sees fresh frames
+    - `workers` threads run detection, embedding and matching (each with its own
+      FaceBatcher buffer, sharing the loaded models); a worker takes up to
+      `frames_per_batch` queued frames, usually from different cameras, and
+      embeds all of their faces in one FaceNet call
+    - a single writer thread feeds recognised students into `sink` (an
+      AttendanceSink) and flushes it every `sink.window` seconds, so a slow
+      database write never stalls the cameras and a burst of students costs
+      one transaction. Only frames are ever dropped: a full write queue makes
+      the workers wait (and so frames are dropped upstream), and a failed
+      flush is retried up to WRITE_RETRIES times
+
+    `sources` is a dict of name -> capture (or a single capture). Each
+    AttendanceEvent carries the name of the source that saw the student.
+    Students are not written again within `cooldown` seconds of their last event.
+    """
+
+    def __init__(self, sources, face_batcher, matcher, sink, workers=2,
+                 queue_size=2, write_queue_size=64, threshold=0.6, cooldown=5.0, frames_per_batch=None):
+        if not isinstance(sources, dict):
+            sources = {"camera0": sources}
+        self.sources = sources
+        self.face_batcher = face_batcher
+        self.matcher = matcher
+        self.sink = sink
+        self.workers = workers
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.frames_per_batch = frames_per_batch or len(sources)
+
+        self.frame_queue = queue.Queue(maxsize=max(queue_size, len(sources)))
+        self.write_queue = queue.Queue(maxsize=write_queue_size)
+        self.stats = {name: StageStats(name) for name in ("capture", "recognize", "write")}
+        self.statuses = {}  # student_id -> last status from the writer
+
+        self._stop = threading.Event()
+        self._captures_running = len(sources)
+        self._capture_done = threading.Event()
+        self._threads = []
+        self._latest = {name: (None, None) for name in sources}  # source -> (packet, result)
+        self._latest_changed = threading.Condition()
+        self._last_event = {}
+        self._failed_flushes = 0
+
+    # ---- lifecycle ----
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._capture_loop, args=(name, capture), name=f"capture-{name}", daemon=True)
+            for name, capture in self.sources.items()
+        ]
+        for i in range(self.workers):
+            batcher = self.face_batcher.clone() if i else self.face_batcher
+            self._threads.append(
+                threading.Thread(target=self._worker_loop, args=(batcher,), name=f"recognize-{i}", daemon=True)
+            )
+        self._threads.append(threading.Thread(target=self._writer_loop, name="writer", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._latest_changed:
+            self._latest_changed.notify_all()
+
+    @property
+    def running(self):
+        return not self._stop.is_set() and any(t.is_alive() for t in self._threads)
+
+    def wait_until_finished(self, poll=0.5):
+        """Block until every source has ended and all queued work was written."""
+        while self.running:
+            time.sleep(poll)
+
+    def wait_for_frame(self, last_index=None, timeout=1.0, source=None):
+        """Block until `source` captured a frame newer than `last_index`; return (packet, result)."""
+        source = source or next(iter(self.sources))
+        with self._latest_changed:
+            self._latest_changed.wait_for(
+                lambda: self._stop.is_set()
+                or (self._latest[source][0] is not None and self._latest[source][0].index != last_index),
+                timeout,
+            )
+            return self._latest[source]
+
+    def queue_depths(self):
+        return {"frames": self.frame_queue.qsize(), "writes": self.write_queue.qsize()}
+
+    def stats_summary(self):
+        parts = []
+        for name, stats in self.stats.items():
+            snap = stats.snapshot()
+            parts.append(f"{name} {snap['count']} ({snap['avg_ms']:.0f}ms avg, {snap['dropped']} dropped)")
+        depths = self.queue_depths()
+        parts.append(f"queues frames={depths['frames']} writes={depths['writes']}")
+        return " | ".join(parts)
+
+    # ---- stages ----
+    def _capture_loop(self, source, capture):
+        index = 0
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                ok, frame = capture.read()
+                if not ok:
+                    if is_file_source(capture):
+                        break
+                    time.sleep(0.01)
+                    continue
+
+                index += 1
+                packet = FramePacket(source, index, frame)
+                self.stats["capture"].record((time.perf_counter() - start) * 1000)
+
+                with self._latest_changed:
+                    self._latest[source] = (packet, self._latest[source][1])
+                    self._latest_changed.notify_all()
+
+                if put_latest(self.frame_queue, packet):
+                    self.stats["capture"].drop()
+        finally:
+            with self._latest_changed:
+                self._captures_running -= 1
+                if not self._captures_running:
+                    self._capture_done.set()
+
+    def _next_packets(self):
+        """Wait for one queued frame, then take whatever else is ready (up to frames_per_batch)."""
+        packets = [self.frame_queue.get(timeout=0.1)]
+        while len(packets) < self.frames_per_batch:
+            try:
+                packets.append(self.frame_queue.get_nowait())
+            except queue.Empty:
+                break
+        return packets
+
+    def _worker_loop(self, face_batcher):
+        frames = FramePreprocessor()
+        while not self._stop.is_set():
+            try:
+                packets = self._next_packets()
+            except queue.Empty:
+                if self._capture_done.is_set():
+                    break
+                continue
+
+            start = time.perf_counter()
+            rgb_frames = [frames.rgb(packet.frame, slot=i) for i, packet in enumerate(packets)]
+            boxes = [face_batcher.detect(rgb_frame)[0] for rgb_frame in rgb_frames]
+            detected = time.perf_counter()
+            embeddings = face_batcher.embed_many(list(zip(rgb_frames, boxes)))
+            embedded = time.perf_counter()
+            matches = self.matcher.best(embeddings, threshold=self.threshold) if len(embeddings) else []
+            matched = time.perf_counter()
+
+            timings = {
+                "detect": (detected - start) * 1000,
+                "embed": (embedded - detected) * 1000,
+                "match": (matched - embedded) * 1000,
+            }
+            for _ in packets:
+                self.stats["recognize"].record((matched - start) * 1000 / len(packets))
+
+            offset = 0
+            for packet, packet_boxes in zip(packets, boxes):
+                packet_matches = matches[offset:offset + len(packet_boxes)]
+                offset += len(packet_boxes)
+                self._publish(RecognitionResult(packet, packet_boxes, packet_matches, timings))
+
+    def _publish(self, result):
+        packet = result.packet
+        with self._latest_changed:
+            latest_packet, latest_result = self._latest[packet.source]
+            if latest_result is None or latest_result.packet.index < packet.index:
+                self._latest[packet.source] = (latest_packet, result)
+
+        for matched_id, score in result.matches:
+            if matched_id is not None:
+                event = AttendanceEvent(matched_id, score, packet.source, packet.index, packet.captured_at)
+                self._put_event(event)
+
+    def _put_event(self, event):
+        """Queue a recognised student, waiting for room: check-ins are never dropped."""
+        while not self._stop.is_set():
+            try:
+                self.write_queue.put(event, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _writer_loop(self):
+        from django.db import connection
+
+        pending = []
+        try:
+            while not self._stop.is_set():
+                try:
+                    event = self.write_queue.get(timeout=0.05)
+                except queue.Empty:
+                    if pending and self.sink.due():
+                        self._flush(pending)
+                    if self._capture_done.is_set() and not any(
+                        t.is_alive() for t in self._threads if t.name.startswith("recognize")
+                    ):
+                        break
+                    continue
+
+                if event.seen_at - self._last_event.get(event.student_id, 0) < self.cooldown:
+                    continue
+                self._last_event[event.student_id] = event.seen_at
+
+                self.sink.add(event.student_id, event.when)
+                pending.append(event)
+                if self.sink.due():
+                    self._flush(pending)
+
+            while pending:  # ends once written or given up
+                self._flush(pending)
+                if pending:
+                    time.sleep(self.sink.window)
+        finally:
+            connection.close()
+
+    def _flush(self, pending):
+        """Write every buffered event in one transaction and record the statuses."""
+        start = time.perf_counter()
+        try:
+            results = self.sink.flush()
+        except Exception as e:
+            self._failed_flushes += 1
+            if self._failed_flushes <= WRITE_RETRIES:
+                # flush() took the events out of the sink; put them back for the next attempt
+                print(f"⚠️ Attendance write failed for {len(pending)} event(s), will retry: {e}")
+                for event in pending:
+                    self.sink.add(event.student_id, event.when)
+                return
+
+            print(f"❌ Attendance write failed {self._failed_flushes} times, "
+                  f"giving up {len(pending)} event(s): {e}")
+            for event in pending:
+                # Forget the cooldown so the student's next sighting is written
+                if self._last_event.get(event.student_id) == event.seen_at:
+                    del self._last_event[event.student_id]
+                self.stats["write"].drop()
+            self._failed_flushes = 0
+            pending.clear()
+            return
+
+        self._failed_flushes = 0
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for event, (_, status, _) in zip(pending, results):
+            event.status = status
+            self.statuses[event.student_id] = status
+            self.stats["write"].record(elapsed_ms / len(pending))
+            print(f"✅ [{event.source}] {status} for student {event.student_id}")
+        pending.clear()
+
+
+def recognition_engine_from_settings(sources, face_batcher, matcher):
+    """RecognitionEngine (not yet started) writing through an AttendanceSink, configured from settings.FACE_ENGINE."""
+    from django.conf import settings
+
+    from .marking import AttendanceSink
+
+    config = getattr(settings, "FACE_ENGINE", {})
+    return RecognitionEngine(
+        sources, face_batcher, matcher,
+        AttendanceSink(min_interval_seconds=60, window=config.get("WRITE_WINDOW", 0.5)),
+        workers=config.get("WORKERS", 2),
+        queue_size=config.get("QUEUE_SIZE", 2),
+        write_queue_size=config.get("WRITE_QUEUE_SIZE", 64),
+        cooldown=config.get("COOLDOWN", 5.0),
+    )
@@ -0,0 +1,179 @@
+# attendance/enrollment.py
+"""
+Quality-gated, diversity-aware face enrollment.
+
+Every detected face is scored for sharpness (variance of the Laplacian),
+brightness and pose (symmetry of the MTCNN keypoints). Faces that pass are
+pooled, near-duplicates of pooled faces are dropped, and at the end the K
+most diverse samples (greedy farthest-point selection on the embeddings)
+become the student's templates.
+"""
+import cv2
+import numpy as np
+
+from .gallery import l2_normalize
+
+TEMPLATES = 5          # embeddings kept per student
+MIN_BLUR = 60.0        # variance of the Laplacian of the grey crop; lower is blurry
+MIN_BRIGHTNESS = 40    # mean grey level
+MAX_BRIGHTNESS = 220
+MIN_SYMMETRY = 0.5     # 1.0 = nose exactly between the eyes (frontal), 0 = full profile
+MAX_ROLL = 25.0        # degrees the eye line may be tilted
+MAX_SIMILARITY = 0.95  # cosine similarity above which a new sample duplicates a pooled one
+
+
+# ----------------------------
+# QUALITY
+# ----------------------------
+def brightness(image):
+    """Mean grey level of a BGR (or already grey) image."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return float(np.mean(gray))
+
+
+def is_too_dark(frame, threshold=MIN_BRIGHTNESS):
+    return brightness(frame) < threshold
+
+
+def is_too_bright(frame, threshold=MAX_BRIGHTNESS):
+    return brightness(frame) > threshold
+
+
+def blur_score(image):
+    """Variance of the Laplacian: high for sharp crops, low for blurred ones."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def pose_scores(keypoints):
+    """
+    (symmetry, roll_degrees) from MTCNN keypoints. Symmetry compares the
+    nose with the midpoint between the eyes: 1.0 when frontal, dropping
+    towards 0 as the head turns. None when keypoints are missing.
+    """
+    try:
+        (lx, ly), (rx, ry) = keypoints["left_eye"], keypoints["right_eye"]
+        nose_x = keypoints["nose"][0]
+    except (KeyError, TypeError):
+        return None, None
+
+    eye_distance = float(np.hypot(rx - lx, ry - ly))
+    if eye_distance < 1:
+        return 0.0, 90.0
+    offset = abs(nose_x - (lx + rx) / 2) / (eye_distance / 2)
+    roll = float(np.degrees(np.arctan2(ry - ly, rx - lx)))
+    return max(0.0, 1.0 - offset), abs(roll)
+
+
+def assess_face(crop, detection=None):
+    """
+    Quality of one face crop (BGR). Returns a dict with blur, brightness,
+    symmetry, roll, a combined score in [0, 1] and `reason` (None if usable).
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    quality = {"blur": blur_score(gray), "brightness": brightness(gray)}
+    quality["symmetry"], quality["roll"] = pose_scores((detection or {}).get("keypoints"))
+
+    if quality["brightness"] < MIN_BRIGHTNESS:
+        reason = "too dark"
+    elif quality["brightness"] > MAX_BRIGHTNESS:
+        reason = "too bright"
+    elif quality["blur"] < MIN_BLUR:
+        reason = "blurry"
+    elif quality["symmetry"] is not None and quality["symmetry"] < MIN_SYMMETRY:
+        reason = "turned away"
+    elif quality["roll"] is not None and quality["roll"] > MAX_ROLL:
+        reason = "head tilted"
+    else:
+        reason = None
+
+    sharpness = min(1.0, quality["blur"] / (4 * MIN_BLUR))
+    symmetry = quality["symmetry"] if quality["symmetry"] is not None else 0.5
+    quality["score"] = 0.5 * sharpness + 0.5 * symmetry
+    quality["reason"] = reason
+    return quality
+
+
+# ----------------------------
+# SELECTION
+# ----------------------------
+def select_diverse(embeddings, k, first=0):
+    """
+    Indices of k rows chosen by greedy farthest-point selection (cosine),
+    starting from row `first`: each pick is the sample least similar to
+    everything picked so far.
+    """
+    vectors = l2_normalize(embeddings)
+    k = min(k, len(vectors))
+    if k == 0:
+        return []
+    chosen = [first]
+    closest = vectors @ vectors[first]
+    while len(chosen) < k:
+        candidate = int(np.argmin(closest))
+        chosen.append(candidate)
+        closest = np.maximum(closest, vectors @ vectors[candidate])
+    return chosen
+
+
+class EnrollmentSelector:
+    """
+    Collects good, distinct face samples for one student.
+
+    add() returns (accepted, reason). A sample that passes the quality gate
+    but is nearly identical to a pooled one replaces it only if it is of
+    better quality, so consecutive frames of a still face count once.
+    templates() returns the K most diverse pooled samples.
+    """
+
+    def __init__(self, k=TEMPLATES, max_similarity=MAX_SIMILARITY):
+        self.k = k
+        self.max_similarity = max_similarity
+        self.samples = []  # (unit embedding, crop, quality)
+        self.rejected = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, embedding, crop, detection=None):
+        quality = assess_face(crop, detection)
+        if quality["reason"]:
+            return self._reject(quality["reason"])
+
+        vector = l2_normalize(embedding)[0]
+        if self.samples:
+            sims = np.stack([s[0] for s in self.samples]) @ vector
+            nearest = int(np.argmax(sims))
+            if sims[nearest] > self.max_similarity:
+                if quality["score"] > self.samples[nearest][2]["score"]:
+                    self.samples[nearest] = (vector, crop.copy(), quality)
+                return self._reject("duplicate")
+
+        self.samples.append((vector, crop.copy(), quality))
+        return True, None
+
+    def _reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return False, reason
+
+    def templates(self):
+        """[(embedding, crop, quality)] of the K most diverse samples, best-quality sample first."""
+        if not self.samples:
+            return []
+        best = max(range(len(self.samples)), key=lambda i: self.samples[i][2]["score"])
+        chosen = select_diverse(np.stack([s[0] for s in self.samples]), self.k, first=best)
+        return [self.samples[i] for i in chosen]
+
+    def template_matrix(self):
+        """(K, dim) float32 array of the selected embeddings, ready for np.save."""
+        return np.stack([embedding for embedding, _, _ in self.templates()]).astype(np.float32)
+
+
+def enrollment_options_from_settings():
+    from django.conf import settings
+
+    config = getattr(settings, "FACE_ENROLLMENT", {})
+    return {
+        "k": config.get("TEMPLATES", TEMPLATES),
+        "max_similarity": config.get("MAX_SIMILARITY", MAX_SIMILARITY),
+    }
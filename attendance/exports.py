@@ -0,0 +1,161 @@
+# attendance/exports.py
+"""
+Attendance exports whose memory use does not grow with the number of rows.
+
+Sessions are read with .iterator(chunk_size=CHUNK_SIZE), so only one chunk
+is held at a time. CSV is written straight into a StreamingHttpResponse.
+XLSX goes through a write-only openpyxl workbook (rows are serialised to a
+temporary file as they are appended) and the finished file is streamed
+from disk.
+
+Under ASGI a response must be fed by an async iterator, or Django collects
+a sync one into a list before sending it (i.e. buffers the whole export).
+For an ASGIRequest both writers therefore hand Django async iterators that
+step the sync ones in a thread.
+"""
+import csv
+import os
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .models import Attendance
+
+CHUNK_SIZE = 2000
+STREAM_BATCH = 500         # CSV lines per chunk handed to the server
+FILE_BLOCK = 64 * 1024     # bytes per chunk of a spooled XLSX
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+SESSION_HEADER = ["Student ID", "Name", "Course", "Date", "Check-In", "Check-Out"]
+REPORT_HEADER = ["Date", "Day", "Status", "Check-In", "Check-Out"]
+
+
+def local_time(value):
+    """Stored UTC datetime as local (Asia/Kathmandu) HH:MM:SS, or ""."""
+    return timezone.localtime(value).strftime("%H:%M:%S") if value else ""
+
+
+def session_rows(start=None, end=None, student_id=None, course=None, chunk_size=CHUNK_SIZE):
+    """
+    Every Attendance session in [start, end] (either bound optional), for one
+    student, one course or the whole institution, in (date, student) order.
+    """
+    sessions = Attendance.objects.all()
+    if start:
+        sessions = sessions.filter(date__gte=start)
+    if end:
+        sessions = sessions.filter(date__lte=end)
+    if student_id:
+        sessions = sessions.filter(student_id=student_id)
+    if course:
+        sessions = sessions.filter(student__course=course)
+
+    rows = (
+        sessions.order_by("date", "student_id", "id")  # follows the (date, student) index
+        .values_list("student_id", "student__name", "student__course", "date", "check_in", "check_out")
+        .iterator(chunk_size=chunk_size)
+    )
+    for student_id, name, course, day, check_in, check_out in rows:
+        yield [student_id, name, course, day.isoformat(), local_time(check_in), local_time(check_out)]
+
+
+def report_rows(attendance_status):
+    """Rows of a month_report() for the report exports."""
+    for row in attendance_status:
+        yield [row["date"], row["day"], row["status"], row["check_in"], row["check_out"]]
+
+
+# ----------------------------
+# WRITERS
+# ----------------------------
+class Echo:
+    """File-like object whose write() hands the line back, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def batched(lines, size=STREAM_BATCH):
+    """Join consecutive lines into one chunk, so each write (or await) moves many rows."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+async def aiterate(chunks):
+    """
+    Async iterator over a sync one. Each step runs in Django's thread-sensitive
+    executor, so a database cursor behind `chunks` always sees the same thread.
+    """
+    chunks = iter(chunks)
+    step = sync_to_async(lambda: next(chunks, None))
+    while (chunk := await step()) is not None:
+        yield chunk
+
+
+async def afile_chunks(output, block_size=FILE_BLOCK):
+    read = sync_to_async(output.read, thread_sensitive=False)
+    try:
+        while chunk := await read(block_size):
+            yield chunk
+    finally:
+        output.close()
+
+
+def csv_response(request, header, rows, filename):
+    chunks = batched(csv_lines(header, rows))
+    if isinstance(request, ASGIRequest):
+        chunks = aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def write_xlsx(header, rows, output, title="Attendance"):
+    """Write a one-sheet workbook to the file object `output` in constant memory."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(output)
+
+
+def xlsx_response(request, header, rows, filename, title="Attendance"):
+    output = tempfile.TemporaryFile()
+    write_xlsx(header, rows, output, title)
+    output.seek(0)
+    if not isinstance(request, ASGIRequest):
+        return FileResponse(output, as_attachment=True, filename=f"{filename}.xlsx", content_type=XLSX_CONTENT_TYPE)
+
+    response = StreamingHttpResponse(afile_chunks(output), content_type=XLSX_CONTENT_TYPE)
+    response["Content-Length"] = os.fstat(output.fileno()).st_size
+    response["Content-Disposition"] = content_disposition_header(True, f"{filename}.xlsx")
+    return response
+
+
+def export_response(request, export_format, header, rows, filename, title="Attendance"):
+    """CSV or XLSX ("excel" is accepted for the old report links) download of `rows`."""
+    if export_format == "csv":
+        return csv_response(request, header, rows, filename)
+    if export_format in ("xlsx", "excel"):
+        return xlsx_response(request, header, rows, filename, title)
+    raise ValueError(f"Unknown export format: {export_format}")
@@ -0,0 +1,231 @@
+# attendance/face_models.py
+"""
+Lazily loaded face models for the web process.
+
+TensorFlow, MTCNN and FaceNet are only imported the first time a face
+endpoint needs them, so migrate/shell/check and the test runner never pay for
+them. With FACE_MODELS["WORKER_ADDRESS"] set, frames are sent to one
+long-lived inference worker (manage.py inference_worker) instead, and web
+workers never load the models at all.
+
+The worker unpickles what clients send, so it only accepts connections
+that know FACE_MODELS["AUTHKEY"] (there is no default) and listens on
+localhost unless told otherwise.
+"""
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .face_pipeline import FaceBatch, face_batcher_from_settings
+from .preprocess import FramePreprocessor
+
+
+def _settings():
+    from django.conf import settings
+
+    return getattr(settings, "FACE_MODELS", {})
+
+
+def parse_address(address):
+    """'host:port' -> (host, port); anything else (e.g. a socket path) unchanged."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def worker_authkey(config):
+    key = config.get("AUTHKEY")
+    if not key:
+        raise ImproperlyConfigured(
+            "FACE_MODELS['AUTHKEY'] (env FACE_WORKER_AUTHKEY) must be set to use the inference worker."
+        )
+    return key.encode() if isinstance(key, str) else key
+
+
+def listen_address(address):
+    """Where the worker listens for `address`: its port on localhost unless a host is given explicitly."""
+    parsed = parse_address(address)
+    return parsed if isinstance(parsed, str) else ("127.0.0.1", parsed[1])
+
+
+# ----------------------------
+# IN-PROCESS MODELS
+# ----------------------------
+class FaceModelRegistry:
+    """
+    Loads MTCNN and FaceNet once per process, on first use, under a lock.
+
+    Every thread gets its own FaceBatcher (clone() of the first one) so the
+    models are shared but the preallocated crop buffers are not.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batcher = None
+        self._local = threading.local()
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._batcher is not None
+
+    def load(self):
+        if self._batcher is None:
+            with self._lock:
+                if self._batcher is None:
+                    start = time.perf_counter()
+                    from keras_facenet import FaceNet
+                    from mtcnn import MTCNN
+
+                    self._batcher = face_batcher_from_settings(MTCNN(), FaceNet())
+                    self.load_seconds = time.perf_counter() - start
+                    print(f"🧠 Face models loaded in {self.load_seconds:.1f}s")
+        return self._batcher
+
+    def face_batcher(self):
+        """FaceBatcher for the calling thread (remote client if a worker is configured)."""
+        batcher = getattr(self._local, "batcher", None)
+        if batcher is None:
+            address = _settings().get("WORKER_ADDRESS")
+            if address:
+                batcher = RemoteFaceBatcher(address, worker_authkey(_settings()))
+            else:
+                batcher = self.load().clone()
+            self._local.batcher = batcher
+        return batcher
+
+    def warm_up(self):
+        """Load the models now (no-op when a remote inference worker is configured)."""
+        if not _settings().get("WORKER_ADDRESS"):
+            self.warm_up_local()
+
+    def warm_up_local(self):
+        """Load the models in this process and run one blank frame through them."""
+        import numpy as np
+
+        self.load().process(np.zeros((160, 160, 3), dtype=np.uint8))
+
+
+face_models = FaceModelRegistry()
+
+
+def warm_up_from_settings():
+    """Called from wsgi/asgi: load the models at startup if FACE_MODELS["WARM_UP"] is set."""
+    if _settings().get("WARM_UP"):
+        face_models.warm_up()
+
+
+# ----------------------------
+# INFERENCE WORKER
+# ----------------------------
+class RemoteFaceBatcher:
+    """
+    FaceBatcher stand-in that sends frames to the inference worker.
+
+    One connection per instance (face_models keeps one per thread); it is
+    reopened once if the worker was restarted. Implements the same methods
+    as FaceBatcher, so callers work unchanged with either backend.
+    """
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.preprocessor = FramePreprocessor()
+        self._conn = None
+
+    def clone(self):
+        """Another client with its own connection, for another worker thread."""
+        return RemoteFaceBatcher(self.address, self.authkey)
+
+    def _call(self, request):
+        for attempt in range(2):
+            try:
+                if self._conn is None:
+                    self._conn = Client(parse_address(self.address), authkey=self.authkey)
+                self._conn.send(request)
+                reply = self._conn.recv()
+                break
+            except (EOFError, OSError):
+                self.close()
+                if attempt:
+                    raise
+        if "error" in reply:
+            raise RuntimeError(f"Inference worker: {reply['error']}")
+        return reply
+
+    def process(self, rgb_frame, limit=None):
+        start = time.perf_counter()
+        reply = self._call({"op": "process", "frame": rgb_frame, "limit": limit})
+        timings = dict(reply["timings"])
+        timings["rpc"] = (time.perf_counter() - start) * 1000 - sum(reply["timings"].values())
+        return FaceBatch(reply["boxes"], reply["detections"], reply["embeddings"], timings)
+
+    def detect(self, rgb_frame):
+        reply = self._call({"op": "detect", "frame": rgb_frame})
+        return reply["boxes"], reply["detections"]
+
+    def embed(self, rgb_frame, boxes):
+        return self.embed_many([(rgb_frame, boxes)])
+
+    def embed_many(self, frames_and_boxes):
+        return self._call({"op": "embed_many", "frames_and_boxes": frames_and_boxes})["embeddings"]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def serve_connection(conn, batcher):
+    """Answer requests on one client connection until it closes."""
+    try:
+        while True:
+            request = conn.recv()
+            try:
+                op = request.get("op")
+                if op == "ping":
+                    conn.send({"ok": True})
+                    continue
+                if op == "detect":
+                    boxes, detections = batcher.detect(request["frame"])
+                    conn.send({"boxes": boxes, "detections": detections})
+                    continue
+                if op == "embed_many":
+                    conn.send({"embeddings": batcher.embed_many(request["frames_and_boxes"])})
+                    continue
+                faces = batcher.process(request["frame"], limit=request.get("limit"))
+                conn.send({
+                    "boxes": faces.boxes,
+                    "detections": faces.detections,
+                    "embeddings": faces.embeddings,
+                    "timings": faces.timings,
+                })
+            except Exception as e:
+                conn.send({"error": str(e)})
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def run_inference_worker(address, authkey, batcher=None):
+    """
+    Serve face detection/embedding to web workers. Every client connection
+    gets a thread with its own clone of one shared FaceBatcher.
+    """
+    if not authkey:
+        raise ImproperlyConfigured("Refusing to run the inference worker without an authkey.")
+    batcher = batcher or face_models.load()
+    with Listener(parse_address(address), authkey=authkey) as listener:
+        print(f"🧠 Inference worker listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError) as e:
+                print(f"⚠️ Rejected inference client: {e}")
+                continue
+            threading.Thread(target=serve_connection, args=(conn, batcher.clone()), daemon=True).start()
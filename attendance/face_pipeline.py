@@ -0,0 +1,154 @@
+# attendance/face_pipeline.py
+import time
+
+import cv2
+import numpy as np
+
+from .preprocess import FramePreprocessor
+
+FACE_SIZE = 160       # FaceNet input size
+MIN_FACE_SIZE = 80    # smaller detections are ignored
+MAX_BATCH = 16        # faces per FaceNet call
+DETECTION_SCALE = 1.0  # MTCNN runs on the frame resized by this factor
+TIMING_REPORT_EVERY = 100  # frames between timing lines printed by the kiosk
+
+
+def format_timings(timings):
+    return " | ".join(f"{stage} {ms:.0f}ms" for stage, ms in timings.items())
+
+
+def scale_detection(detection, factor):
+    """Copy of an MTCNN detection with its box and keypoints multiplied by `factor`."""
+    scaled = dict(detection)
+    scaled['box'] = [int(round(v * factor)) for v in detection['box']]
+    if 'keypoints' in detection:
+        scaled['keypoints'] = {
+            name: (int(round(px * factor)), int(round(py * factor)))
+            for name, (px, py) in detection['keypoints'].items()
+        }
+    return scaled
+
+
+class FaceBatch:
+    """Faces found in one frame: boxes, their embeddings and per-stage timings (ms)."""
+
+    def __init__(self, boxes, detections, embeddings, timings):
+        self.boxes = boxes
+        self.detections = detections
+        self.embeddings = embeddings
+        self.timings = timings
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __iter__(self):
+        return iter(zip(self.boxes, self.embeddings))
+
+    def timing_summary(self):
+        return f"{len(self)} face(s) | {format_timings(self.timings)}"
+
+
+class FaceBatcher:
+    """
+    Detects faces in a frame and embeds all valid crops in one FaceNet call.
+
+    Crops are resized straight into a preallocated (max_batch, 160, 160, 3)
+    buffer, so a crowded frame costs one forward pass instead of one per face.
+
+    With detection_scale < 1, MTCNN runs on a downsampled copy of the frame
+    (its cost grows with image area); boxes and keypoints are mapped back to
+    full-resolution coordinates and crops are still taken from the full frame.
+    """
+
+    def __init__(self, detector, embedder, max_batch=MAX_BATCH, min_face_size=MIN_FACE_SIZE,
+                 detection_scale=DETECTION_SCALE):
+        self.detector = detector
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.min_face_size = min_face_size
+        self.detection_scale = detection_scale
+        self.buffer = np.empty((max_batch, FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8)
+        self.preprocessor = FramePreprocessor()  # reused frame buffers (colour conversion, detection downscale)
+
+    def clone(self):
+        """Same models and settings with its own crop buffer, for another worker thread."""
+        return FaceBatcher(self.detector, self.embedder, self.max_batch, self.min_face_size, self.detection_scale)
+
+    def detect(self, rgb_frame):
+        """
+        Return (boxes, detections) for faces at least min_face_size wide and high,
+        in full-resolution coordinates.
+        """
+        scale = self.detection_scale
+        if scale < 1.0:
+            height, width = rgb_frame.shape[:2]
+            small = self.preprocessor.resized(rgb_frame, (max(1, round(width * scale)), max(1, round(height * scale))))
+            detections = [scale_detection(d, 1.0 / scale) for d in self.detector.detect_faces(small)]
+        else:
+            detections = self.detector.detect_faces(rgb_frame)
+
+        boxes, kept = [], []
+        for detection in detections:
+            x, y, w, h = detection['box']
+            x, y = max(0, x), max(0, y)
+            if w < self.min_face_size or h < self.min_face_size:
+                continue
+            boxes.append((x, y, w, h))
+            kept.append(detection)
+        return boxes, kept
+
+    def embed(self, rgb_frame, boxes):
+        """Embed the given boxes of `rgb_frame`, max_batch crops per model call."""
+        return self.embed_many([(rgb_frame, boxes)])
+
+    def embed_many(self, frames_and_boxes):
+        """
+        Embed the boxes of several frames (e.g. from different cameras) together.
+        `frames_and_boxes` is a list of (rgb_frame, boxes); embeddings come back
+        in the same order, max_batch crops per model call.
+        """
+        crops = [(frame, box) for frame, boxes in frames_and_boxes for box in boxes]
+        embeddings = []
+        for start in range(0, len(crops), self.max_batch):
+            chunk = crops[start:start + self.max_batch]
+            for i, (frame, (x, y, w, h)) in enumerate(chunk):
+                cv2.resize(frame[y:y + h, x:x + w], (FACE_SIZE, FACE_SIZE), dst=self.buffer[i])
+            embeddings.append(np.asarray(self.embedder.embeddings(self.buffer[:len(chunk)])))
+
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(embeddings)
+
+    def process(self, rgb_frame, limit=None):
+        """Detect and embed the faces of one RGB frame; `limit` keeps only the first N faces."""
+        start = time.perf_counter()
+        boxes, detections = self.detect(rgb_frame)
+        if limit is not None:
+            boxes, detections = boxes[:limit], detections[:limit]
+        detected = time.perf_counter()
+
+        embeddings = self.embed(rgb_frame, boxes)
+        embedded = time.perf_counter()
+
+        timings = {
+            "detect": (detected - start) * 1000,
+            "embed": (embedded - detected) * 1000,
+        }
+        return FaceBatch(boxes, detections, embeddings, timings)
+
+
+def face_batcher_options_from_settings():
+    """FaceBatcher keyword arguments from settings.FACE_PIPELINE (e.g. for worker processes)."""
+    from django.conf import settings
+
+    config = getattr(settings, "FACE_PIPELINE", {})
+    return {
+        "max_batch": config.get("MAX_BATCH", MAX_BATCH),
+        "min_face_size": config.get("MIN_FACE_SIZE", MIN_FACE_SIZE),
+        "detection_scale": config.get("DETECTION_SCALE", DETECTION_SCALE),
+    }
+
+
+def face_batcher_from_settings(detector, embedder):
+    """FaceBatcher configured from settings.FACE_PIPELINE."""
+    return FaceBatcher(detector, embedder, **face_batcher_options_from_settings())
@@ -0,0 +1,587 @@
+# attendance/gallery.py
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# ----------------------------
+# HELPERS
+# ----------------------------
+def l2_normalize(vectors, eps=1e-10):
+    """Return a float32 copy of `vectors` with every row scaled to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, eps)
+
+
+def top_k(sims, k):
+    """Column indices and values of the k largest entries per row, best first."""
+    k = min(k, sims.shape[1])
+    if k == 0:
+        return np.empty((sims.shape[0], 0), dtype=np.intp), np.empty((sims.shape[0], 0), dtype=np.float32)
+
+    if k < sims.shape[1]:
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(sims.shape[1]), (sims.shape[0], 1))
+
+    top_scores = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def aggregate_by_id(sims, groups, aggregate="max", top_n=2):
+    """
+    Collapse per-template scores (n_queries, n_rows) into per-identity scores
+    (n_queries, n_identities). `groups` holds the identity index of every row
+    and must be sorted, so each identity's templates are adjacent.
+
+    "max" keeps each identity's best template; "mean_top" averages its
+    `top_n` best templates (all of them if it has fewer).
+    """
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    if aggregate == "max" or top_n == 1:
+        return np.maximum.reduceat(sims, starts, axis=1)
+    if aggregate != "mean_top":
+        raise ValueError(f"Unknown template aggregation: {aggregate}")
+
+    sizes = np.diff(np.r_[starts, sims.shape[1]])
+    width = int(sizes.max())
+    offsets = np.arange(width)
+    valid = offsets < sizes[:, None]
+    columns = np.where(valid, starts[:, None] + offsets, 0)
+
+    gathered = np.where(valid, sims[:, columns], -np.inf)  # (n_queries, n_identities, width)
+    best = -np.sort(-gathered, axis=2)[:, :, :top_n]
+    # Unscored templates (-inf, e.g. outside an IVF probe) are left out of the mean
+    scored = np.isfinite(best)
+    counts = scored.sum(axis=2)
+    means = np.where(scored, best, 0).sum(axis=2) / np.maximum(counts, 1)
+    return np.where(counts > 0, means, -np.inf)
+
+
+def as_templates(embedding):
+    """One stored embedding (dim,) or a template stack (K, dim) as a 2-D array."""
+    embedding = np.asarray(embedding, dtype=np.float32)
+    return embedding.reshape(1, -1) if embedding.ndim == 1 else embedding
+
+
+def make_matcher(embeddings, ids, backend="exact", normalized=False, version=0, **options):
+    """
+    Build a matcher for the requested backend.
+
+    "exact" scores every identity; "ivf" uses the approximate IVFMatcher
+    once the gallery has at least `min_size` rows (smaller galleries, and
+    an empty one whatever `min_size`, stay exact).
+    """
+    aggregation = {key: options.pop(key) for key in ("aggregate", "top_n") if key in options}
+    if backend == "exact":
+        return GalleryMatcher(embeddings, ids, normalized=normalized, version=version, **aggregation)
+    if backend == "ivf":
+        from .ann import IVFMatcher
+        min_size = options.pop("min_size", 0)
+        if len(ids) < max(min_size, 1):
+            return GalleryMatcher(embeddings, ids, normalized=normalized, version=version, **aggregation)
+        return IVFMatcher(embeddings, ids, normalized=normalized, version=version, **aggregation, **options)
+    raise ValueError(f"Unknown matcher backend: {backend}")
+
+
+# ----------------------------
+# EXACT MATCHER
+# ----------------------------
+class GalleryMatcher:
+    """
+    Exact cosine matcher over all registered students.
+
+    Every known embedding is L2-normalised once and stacked into a single
+    contiguous float32 matrix, so scoring all faces of a frame against all
+    identities is one matrix product instead of a Python loop.
+
+    A student may own several rows (enrollment templates). Rows are kept
+    grouped by id and an identity's score is its best template ("max") or
+    the mean of its `top_n` best ("mean_top").
+    """
+
+    def __init__(self, embeddings, ids, normalized=False, version=0, aggregate="max", top_n=2):
+        self.version = version
+        self.aggregate = aggregate
+        self.top_n = top_n
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+        if not normalized and len(matrix):
+            matrix = l2_normalize(matrix)
+
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.ids = np.asarray([str(i) for i in ids])
+
+        if len(self.ids) != self.matrix.shape[0]:
+            raise ValueError("Number of ids does not match number of embeddings.")
+
+        # identities: unique ids; groups: identity index of every row (None if one row each)
+        self.identities, groups = np.unique(self.ids, return_inverse=True)
+        if len(self.identities) == len(self.ids):
+            self.identities, self.groups = self.ids, None
+        else:
+            order = np.argsort(groups, kind="stable")
+            if np.any(order != np.arange(len(order))):
+                self.matrix = np.ascontiguousarray(self.matrix[order])
+                self.ids = self.ids[order]
+            self.groups = groups[order]
+
+    def __len__(self):
+        return len(self.identities)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def scores(self, queries):
+        """Cosine similarity of every query (rows) against every identity (columns of .identities)."""
+        sims = l2_normalize(queries) @ self.matrix.T
+        if self.groups is None:
+            return sims
+        return aggregate_by_id(sims, self.groups, self.aggregate, self.top_n)
+
+    def match(self, queries, k=1):
+        """
+        Return the top-k ids and scores for each query embedding.
+        Both results have shape (n_queries, k), best match first.
+        """
+        sims = self.scores(queries)
+        top, top_scores = top_k(sims, k)
+        return self.identities[top], top_scores
+
+    def best(self, queries, threshold=0.6):
+        """
+        Best identity per query as a list of (matched_id, score).
+        matched_id is None when the best score does not exceed the threshold.
+        """
+        top_ids, top_scores = self.match(queries, k=1)
+        results = []
+        for matched_id, score in zip(top_ids[:, 0], top_scores[:, 0]):
+            score = float(score)
+            results.append((str(matched_id) if score > threshold else None, score))
+        return results
+
+
+def matcher_options_from_settings():
+    """Translate settings.FACE_MATCHER into make_matcher() keyword arguments."""
+    from django.conf import settings
+
+    config = getattr(settings, "FACE_MATCHER", {})
+    options = {
+        "backend": config.get("BACKEND", "exact"),
+        "aggregate": config.get("AGGREGATE", "max"),
+        "top_n": config.get("TOP_N", 2),
+    }
+    if options["backend"] == "ivf":
+        options.update(
+            min_size=config.get("MIN_SIZE", 0),
+            nlist=config.get("NLIST"),
+            nprobe=config.get("NPROBE", 8),
+        )
+    return options
+
+
+# ----------------------------
+# ON-DISK GALLERY
+# ----------------------------
+GALLERY_FORMAT = 3
+GALLERY_DIRNAME = ".gallery"
+RAW_DIRNAME = "raw"  # per-student folder of every pooled capture, kept for re-embedding
+KEEP_SNAPSHOTS = 2  # current + previous, for readers that opened the manifest just before a swap
+
+
+class GalleryStore:
+    """
+    Consolidated gallery of all registered students inside `faces/.gallery/`,
+    written as immutable, versioned snapshots:
+
+    - matrix.<version>.f32  raw float32 rows, L2-normalised, memory-mapped on load
+    - ids.<version>.npy     student id for each row (a student has one row per template)
+    - manifest.json         format, version, row count, dimension, the snapshot's
+                            file names and the (mtime_ns, size) of every student's
+                            embedding file whose rows it holds
+
+    Every change writes a new snapshot and then swaps manifest.json in with
+    one rename, so a reader always sees a matching matrix and ids, and the
+    version only goes up. Long-running recognizers follow it with
+    GalleryWatcher. Writers (rebuild, upsert, remove) hold an exclusive
+    lock on `.gallery/lock` for their whole read-modify-write, so
+    registrations in different processes never overwrite each other's rows.
+
+    The per-student `faces/<id>/<id>_embedding.npy` files (one vector, or a
+    (K, dim) stack of enrollment templates) stay the source of truth; the
+    gallery is rebuilt from them whenever it is missing or any student's
+    file differs from what the manifest recorded.
+    """
+
+    def __init__(self, faces_dir):
+        self.faces_dir = os.fspath(faces_dir)
+        self.gallery_dir = os.path.join(self.faces_dir, GALLERY_DIRNAME)
+        self.manifest_path = os.path.join(self.gallery_dir, "manifest.json")
+        self.lock_path = os.path.join(self.gallery_dir, "lock")
+
+    # ---- reading ----
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_stale(self, manifest=None):
+        """True if the gallery files are missing or any student's embedding file changed since."""
+        manifest = manifest if manifest is not None else self.read_manifest()
+        if not manifest or manifest.get("format") != GALLERY_FORMAT:
+            return True
+        matrix_path, ids_path = self._snapshot_paths(manifest)
+        if not (os.path.exists(matrix_path) and os.path.exists(ids_path)):
+            return True
+        expected_bytes = manifest["count"] * manifest["dim"] * 4
+        if os.path.getsize(matrix_path) < expected_bytes:
+            return True
+        recorded = manifest.get("files", {})
+        current = self._embedding_files()
+        return recorded.keys() != current.keys() or any(
+            recorded[student_id] != self._file_signature(path) for student_id, path in current.items()
+        )
+
+    def load(self, backend="exact", **options):
+        """
+        Return a matcher backed by the memory-mapped gallery.
+        `backend` and `options` are passed to make_matcher().
+        """
+        for attempt in range(3):
+            manifest = self.read_manifest()
+            if self.is_stale(manifest):
+                manifest = self.rebuild()
+            try:
+                ids, matrix = self._open_snapshot(manifest)
+                break
+            except (OSError, ValueError):
+                # Snapshot replaced and cleaned up between reading the manifest and opening it
+                if attempt == 2:
+                    raise
+        return make_matcher(matrix, ids, backend, normalized=True, version=manifest["version"], **options)
+
+    def _open_snapshot(self, manifest):
+        matrix_path, ids_path = self._snapshot_paths(manifest)
+        count, dim = manifest["count"], manifest["dim"]
+        ids = np.load(ids_path)
+        if len(ids) != count:
+            raise ValueError("gallery ids do not match the manifest")
+        if count == 0:
+            matrix = np.empty((0, dim), dtype=np.float32)
+        else:
+            matrix = np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(count, dim))
+        return ids, matrix
+
+    def _read_rows(self, manifest):
+        """(ids list, in-memory matrix) of the current snapshot, for writing the next one."""
+        ids, matrix = self._open_snapshot(manifest)
+        return [str(i) for i in ids], np.array(matrix, dtype=np.float32).reshape(len(ids), manifest["dim"])
+
+    # ---- writing ----
+    def rebuild(self):
+        """Rebuild the gallery from every per-student embedding file."""
+        with self._locked():
+            return self._rebuild()
+
+    def upsert(self, student_id, embedding):
+        """
+        Add or replace one student's embedding(s) without re-reading every
+        student's file. `embedding` is one vector or a (K, dim) array of
+        enrollment templates, normally just saved to the student's file.
+        """
+        student_id = str(student_id)
+        rows = l2_normalize(as_templates(embedding))
+        with self._locked():
+            manifest = self.read_manifest()
+            if self.is_stale_except(manifest, student_id) or manifest["dim"] not in (0, rows.shape[1]):
+                return self._rebuild()
+
+            ids, matrix = self._read_rows(manifest)
+            keep = np.array([row_id != student_id for row_id in ids], dtype=bool)
+            matrix = np.concatenate([matrix[keep], rows]) if len(matrix) else rows
+            ids = [row_id for row_id, kept in zip(ids, keep) if kept] + [student_id] * len(rows)
+
+            files = dict(manifest["files"])
+            path = self._embedding_path(student_id)
+            if os.path.exists(path):
+                files[student_id] = self._file_signature(path)
+            return self._write_snapshot(ids, matrix, files)
+
+    def remove(self, student_id):
+        """Drop a student's rows (e.g. after the Student was deleted) and bump the version."""
+        student_id = str(student_id)
+        with self._locked():
+            manifest = self.read_manifest()
+            if self.is_stale_except(manifest, student_id):
+                return self._rebuild()
+
+            ids, matrix = self._read_rows(manifest)
+            keep = np.array([row_id != student_id for row_id in ids], dtype=bool)
+            files = {key: value for key, value in manifest["files"].items() if key != student_id}
+            if keep.all() and files == manifest["files"]:
+                return manifest
+            ids = [row_id for row_id, kept in zip(ids, keep) if kept]
+            return self._write_snapshot(ids, matrix[keep], files)
+
+    def is_stale_except(self, manifest, student_id):
+        """is_stale(), ignoring `student_id`, whose rows the caller is about to replace."""
+        if not manifest or manifest.get("format") != GALLERY_FORMAT:
+            return True
+        others = {key: value for key, value in manifest.get("files", {}).items() if key != student_id}
+        return self.is_stale({**manifest, "files": {**others, **self._current(student_id)}})
+
+    # ---- internals ----
+    def _rebuild(self):
+        embeddings, ids, files = [], [], {}
+        for student_id, path in sorted(self._embedding_files().items()):
+            signature = self._file_signature(path)  # before reading: a later change shows as stale
+            try:
+                templates = as_templates(np.load(path))
+            except (OSError, ValueError, EOFError) as e:
+                # Still being written by a registration; left unrecorded, so the gallery stays stale
+                print(f"⚠️ Skipping unreadable embedding file {path}: {e}")
+                continue
+            embeddings.extend(templates)
+            ids.extend([student_id] * len(templates))
+            files[student_id] = signature
+
+        dim = embeddings[0].shape[0] if embeddings else 0
+        matrix = l2_normalize(embeddings) if embeddings else np.empty((0, dim), dtype=np.float32)
+
+        manifest = self._write_snapshot(ids, matrix, files)
+        print(f"🗂️ Rebuilt face gallery with {len(set(ids))} students ({len(ids)} templates).")
+        return manifest
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive inter-process lock for a read-modify-write of the gallery."""
+        os.makedirs(self.gallery_dir, exist_ok=True)
+        with open(self.lock_path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _embedding_path(self, student_id):
+        return os.path.join(self.faces_dir, student_id, f"{student_id}_embedding.npy")
+
+    def _embedding_files(self):
+        """{student_id: path} of every per-student embedding file."""
+        files = {}
+        for entry in os.scandir(self.faces_dir):
+            if entry.is_dir() and entry.name != GALLERY_DIRNAME:
+                path = self._embedding_path(entry.name)
+                if os.path.exists(path):
+                    files[entry.name] = path
+        return files
+
+    def _current(self, student_id):
+        path = self._embedding_path(student_id)
+        return {student_id: self._file_signature(path)} if os.path.exists(path) else {}
+
+    @staticmethod
+    def _file_signature(path):
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+
+    def _snapshot_paths(self, manifest):
+        return (
+            os.path.join(self.gallery_dir, manifest["matrix"]),
+            os.path.join(self.gallery_dir, manifest["ids"]),
+        )
+
+    def _snapshot_versions(self):
+        versions = set()
+        for name in os.listdir(self.gallery_dir):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[0] in ("matrix", "ids") and parts[1].isdigit():
+                versions.add(int(parts[1]))
+        return versions
+
+    def _write_snapshot(self, ids, matrix, files):
+        """Write matrix and ids under a new version, then publish it by replacing the manifest."""
+        os.makedirs(self.gallery_dir, exist_ok=True)
+        previous = self.read_manifest() or {}
+        version = max([previous.get("version", 0), *self._snapshot_versions()]) + 1
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        dim = matrix.shape[1] if matrix.ndim == 2 else 0
+
+        matrix_name, ids_name = f"matrix.{version}.f32", f"ids.{version}.npy"
+        self._write_atomic(os.path.join(self.gallery_dir, matrix_name), matrix.tobytes())
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(ids, dtype=str))
+        self._write_atomic(os.path.join(self.gallery_dir, ids_name), buffer.getvalue())
+
+        manifest = {
+            "format": GALLERY_FORMAT,
+            "version": version,
+            "count": len(ids),
+            "dim": int(dim),
+            "matrix": matrix_name,
+            "ids": ids_name,
+            "files": files,
+            "updated_at": time.time(),
+        }
+        self._write_atomic(self.manifest_path, json.dumps(manifest).encode())
+        self._drop_old_snapshots(version)
+        return manifest
+
+    def _drop_old_snapshots(self, version):
+        for old in self._snapshot_versions():
+            if old <= version - KEEP_SNAPSHOTS:
+                for name in (f"matrix.{old}.f32", f"ids.{old}.npy"):
+                    try:
+                        os.remove(os.path.join(self.gallery_dir, name))
+                    except FileNotFoundError:
+                        pass
+        for name in ("matrix.f32", "ids.npy"):  # format 1 leftovers
+            try:
+                os.remove(os.path.join(self.gallery_dir, name))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_atomic(path, data):
+        # A unique temp name, so concurrent writers never share (and truncate) one file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+
+# ----------------------------
+# HOT RELOAD
+# ----------------------------
+RELOAD_EVERY = 2.0  # seconds between manifest checks
+
+
+class GalleryWatcher:
+    """
+    Matcher that follows the on-disk gallery while a recognizer keeps running.
+
+    A background thread stats manifest.json every `interval` seconds; when
+    a writer published a new version it loads that
+    snapshot and swaps it in with a single reference assignment. The frame
+    loop calls best()/match() as on any matcher and never waits for a load:
+    a batch already being scored finishes on the snapshot it started with.
+    """
+
+    def __init__(self, store, interval=RELOAD_EVERY, **options):
+        self.store = store
+        self.interval = interval
+        self.options = options  # make_matcher() arguments for every reload
+        self.matcher = store.load(**options)
+        self.reloads = 0
+        self._manifest_stat = self._stat()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def version(self):
+        return self.matcher.version
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def scores(self, queries):
+        return self.matcher.scores(queries)
+
+    def match(self, queries, k=1):
+        return self.matcher.match(queries, k)
+
+    def best(self, queries, threshold=0.6):
+        return self.matcher.best(queries, threshold)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="gallery-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.store.manifest_path)
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:  # keep recognising with the current snapshot
+                print(f"⚠️ Gallery reload failed: {e}")
+
+    def check(self):
+        """Reload if the gallery changed since the last check; returns True if a new snapshot was swapped in."""
+        stat = self._stat()
+        if stat == self._manifest_stat:
+            return False
+        self._manifest_stat = stat
+
+        manifest = self.store.read_manifest()
+        if not manifest or manifest.get("version") == self.matcher.version:
+            return False
+
+        start = time.perf_counter()
+        matcher = self.store.load(**self.options)
+        previous, self.matcher = self.matcher, matcher
+        self.reloads += 1
+        print(f"🔄 Gallery v{previous.version} → v{matcher.version}: {len(matcher)} students "
+              f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+        return True
+
+
+def gallery_watcher_from_settings(faces_dir="faces"):
+    """GalleryWatcher over `faces_dir` with settings.FACE_MATCHER options, already started."""
+    from django.conf import settings
+
+    interval = getattr(settings, "FACE_MATCHER", {}).get("RELOAD_EVERY", RELOAD_EVERY)
+    return GalleryWatcher(GalleryStore(faces_dir), interval=interval, **matcher_options_from_settings()).start()
@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from attendance.batch import find_videos, init_worker, recognize_videos, video_info
+from attendance.face_pipeline import face_batcher_options_from_settings
+from attendance.gallery import matcher_options_from_settings
+from attendance.models import Attendance, Student
+from attendance.session_cache import invalidate_open_sessions
+from attendance.summaries import refresh_summaries
+
+
+class Command(BaseCommand):
+    help = "Mark attendance from recorded lecture videos (a file or a directory of files)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Video file or directory of videos")
+        parser.add_argument("--stride", type=int, default=5, help="Decode every Nth frame")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--segments", type=int, default=None,
+                            help="Segments per video decoded in parallel (default: workers)")
+        parser.add_argument("--start", help="Local start time of the recording, 'YYYY-MM-DD HH:MM' "
+                                            "(default: file modification time minus its duration)")
+        parser.add_argument("--min-hits", type=int, default=2,
+                            help="Sightings needed before a student is marked present")
+        parser.add_argument("--threshold", type=float, default=0.6)
+        parser.add_argument("--dry-run", action="store_true", help="Report, but do not write attendance")
+
+    def handle(self, *args, **options):
+        videos = find_videos(options["path"])
+        if not videos or not all(os.path.exists(v) for v in videos):
+            raise CommandError(f"No video found at {options['path']}")
+        if not options["start"]:
+            # The recording start is derived from the file's length, which must be known
+            unknown = [video for video in videos if video_info(video)[1] <= 0]
+            if unknown:
+                raise CommandError(
+                    f"Cannot tell the length of {', '.join(unknown)}; pass --start 'YYYY-MM-DD HH:MM'."
+                )
+
+        initargs = (
+            os.path.join(settings.BASE_DIR, "faces"),
+            matcher_options_from_settings(),
+            face_batcher_options_from_settings(),
+            options["threshold"],
+        )
+
+        self.stdout.write(f"🎞️ Processing {len(videos)} video(s) with {options['workers']} worker(s)...")
+        context = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        with ProcessPoolExecutor(options["workers"], mp_context=context,
+                                 initializer=init_worker, initargs=initargs) as executor:
+            per_video, stats = recognize_videos(
+                videos, executor,
+                stride=options["stride"],
+                segments_per_video=options["segments"] or options["workers"],
+            )
+
+        for video, count in stats["decoded"].items():
+            if not count:
+                self.stderr.write(f"⚠️ No frames could be decoded from {video}.")
+
+        sessions = self.collect_sessions(per_video, options)
+        self.stdout.write(
+            f"⏱️ {stats['frames']} frames, {stats['faces']} faces in {stats['seconds']:.1f}s "
+            f"({stats['frames_per_second']:.1f} frames/s, {stats['faces_per_second']:.1f} faces/s)"
+        )
+
+        if options["dry_run"]:
+            for (student_id, day), (first, last, hits) in sorted(sessions.items()):
+                self.stdout.write(f"  {student_id} {day}: {first:%H:%M:%S} - {last:%H:%M:%S} ({hits} sightings)")
+            return
+
+        created = self.write_attendance(sessions)
+        self.stdout.write(self.style.SUCCESS(f"✅ Wrote {created} attendance record(s)."))
+
+    def recording_start(self, path, start_option):
+        if start_option:
+            return timezone.make_aware(datetime.strptime(start_option, "%Y-%m-%d %H:%M"))
+        fps, frame_count = video_info(path)
+        modified = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.get_current_timezone())
+        return modified - timedelta(seconds=frame_count / fps)
+
+    def collect_sessions(self, per_video, options):
+        """(student_id, local date) -> [first_seen, last_seen, hits] across all videos."""
+        sessions = {}
+        for path, sightings in per_video.items():
+            start = self.recording_start(path, options["start"])
+            for student_id, (first, last, hits) in sightings.items():
+                first_seen = start + timedelta(seconds=first)
+                last_seen = start + timedelta(seconds=last)
+                key = (student_id, timezone.localtime(first_seen).date())
+                session = sessions.setdefault(key, [first_seen, last_seen, 0])
+                session[0] = min(session[0], first_seen)
+                session[1] = max(session[1], last_seen)
+                session[2] += hits
+
+        return {key: s for key, s in sessions.items() if s[2] >= options["min_hits"]}
+
+    def write_attendance(self, sessions):
+        """One closed Attendance row per (student, date), in a single bulk insert."""
+        known = set(
+            Student.objects.filter(student_id__in={sid for sid, _ in sessions}).values_list("student_id", flat=True)
+        )
+        # Skip sessions already written by an earlier run over the same recording
+        existing = set(
+            Attendance.objects
+            .filter(date__in={day for _, day in sessions}, check_in__in=[s[0] for s in sessions.values()])
+            .values_list("student_id", "check_in")
+        )
+
+        records = []
+        for (student_id, day), (first, last, _) in sessions.items():
+            if int(student_id) not in known:
+                self.stderr.write(f"❌ Student with ID {student_id} not found.")
+                continue
+            if (int(student_id), first) in existing:
+                continue
+            records.append(Attendance(
+                student_id=student_id,
+                date=day,
+                check_in=first,
+                # Always closed: an open session from a past recording would turn
+                # the student's next live sighting into a check-out
+                check_out=last,
+            ))
+
+        with transaction.atomic():
+            Attendance.objects.bulk_create(records)
+            refresh_summaries({(record.student_id, record.date) for record in records})
+        if records:
+            invalidate_open_sessions()  # running recognizers re-read today's sessions
+        return len(records)
@@ -0,0 +1,165 @@
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Q
+
+from attendance.models import Attendance, AttendanceDailySummary, LeaveRequest
+from attendance.summaries import PAGE_SIZE
+
+BENCH_ALIAS = "bench"
+START_DAY = date(2025, 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway SQLite database with synthetic attendance sessions (and their daily "
+        "summaries) and compare EXPLAIN QUERY PLAN and timings of the hot queries without and "
+        "with the indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Attendance sessions to seed")
+        parser.add_argument("--students", type=int, default=2000)
+        parser.add_argument("--sessions-per-day", type=int, default=2)
+        parser.add_argument("--repeat", type=int, default=50, help="Runs of each query per measurement")
+
+    def handle(self, *args, **options):
+        fd, path = tempfile.mkstemp(suffix=".sqlite3", prefix="attendance-bench-")
+        os.close(fd)
+        connections.databases[BENCH_ALIAS] = {**connections.databases["default"], "NAME": path}
+        try:
+            self.run(options)
+        finally:
+            connections[BENCH_ALIAS].close()
+            del connections.databases[BENCH_ALIAS]
+            os.remove(path)
+
+    def run(self, options):
+        connection = connections[BENCH_ALIAS]
+        with connection.cursor() as cursor:
+            # Throwaway database: skip fsyncs so seeding is bound by CPU, not the disk
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA journal_mode = MEMORY")
+        call_command("migrate", database=BENCH_ALIAS, verbosity=0)
+        self.set_indexes(False)
+
+        start = time.perf_counter()
+        days = self.seed(connection, options)
+        self.stdout.write(f"🌱 Seeded {options['rows']:,} sessions for {options['students']:,} students "
+                          f"over {days} days in {time.perf_counter() - start:.1f}s\n")
+
+        rng = random.Random(0)
+        samples = [
+            (rng.randint(1, options["students"]), START_DAY + timedelta(days=rng.randrange(days)))
+            for _ in range(options["repeat"])
+        ]
+
+        before = self.measure(samples, "without indexes")
+        start = time.perf_counter()
+        self.set_indexes(True)
+        self.stdout.write(f"\n🧱 Created indexes in {time.perf_counter() - start:.1f}s")
+        after = self.measure(samples, "with indexes")
+
+        self.stdout.write(f"\n{'query':<22} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+        for name in before:
+            self.stdout.write(f"{name:<22} {before[name]:>10.3f} {after[name]:>10.3f} "
+                              f"{before[name] / max(after[name], 1e-6):>7.0f}x")
+
+    # ---- data ----
+    def seed(self, connection, options):
+        students, per_day = options["students"], options["sessions_per_day"]
+        days = max(1, options["rows"] // (students * per_day))
+
+        with transaction.atomic(using=BENCH_ALIAS), connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO attendance_student (student_id, name, email, phone_number, address, password, dob, course) "
+                "VALUES (%s, %s, %s, '9800000000', 'Kathmandu', 'x', '2000-01-01', %s)",
+                [(i, f"Student {i}", f"student{i}@example.com", f"Course {i % 8}") for i in range(1, students + 1)],
+            )
+            cursor.executemany(
+                "INSERT INTO attendance_leaverequest (student_id, category, from_date, to_date, reason, status, submitted_at) "
+                "VALUES (%s, 'other', %s, %s, 'bench', %s, '2025-01-01 00:00:00')",
+                [
+                    (i, str(START_DAY + timedelta(days=d)), str(START_DAY + timedelta(days=d + 2)),
+                     "approved" if d % 2 else "pending")
+                    for i in range(1, students + 1) for d in range(0, days, 30)
+                ],
+            )
+
+            batch = []
+            for offset in range(days):
+                day = START_DAY + timedelta(days=offset)
+                base = datetime(day.year, day.month, day.day, 3)
+                for student_id in range(1, students + 1):
+                    for session in range(per_day):
+                        check_in = base + timedelta(hours=3 * session)
+                        batch.append((student_id, str(day), str(check_in), str(check_in + timedelta(hours=2))))
+                if len(batch) >= 50_000:
+                    self.insert_sessions(cursor, batch)
+                    batch = []
+            self.insert_sessions(cursor, batch)
+
+            # What refresh_summaries() keeps up to date, derived in one statement
+            cursor.execute(
+                "INSERT INTO attendance_attendancedailysummary "
+                "(student_id, date, first_in, last_out, sessions, present_seconds, break_seconds, updated_at) "
+                "SELECT student_id, date, MIN(check_in), MAX(check_out), COUNT(*), "
+                "CAST(SUM((julianday(check_out) - julianday(check_in)) * 86400) AS INTEGER), 0, MAX(check_in) "
+                "FROM attendance_attendance GROUP BY student_id, date"
+            )
+        return days
+
+    def insert_sessions(self, cursor, batch):
+        cursor.executemany(
+            "INSERT INTO attendance_attendance (student_id, date, check_in, check_out) VALUES (%s, %s, %s, %s)", batch
+        )
+
+    def set_indexes(self, enabled):
+        with connections[BENCH_ALIAS].schema_editor() as editor:
+            for model in (Attendance, AttendanceDailySummary, LeaveRequest):
+                for index in model._meta.indexes:
+                    if enabled:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+
+    # ---- queries ----
+    def queries(self, student_id, day):
+        month_start = day.replace(day=1)
+        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        sessions = Attendance.objects.using(BENCH_ALIAS)
+        summaries = AttendanceDailySummary.objects.using(BENCH_ALIAS)
+        return {
+            "latest session": sessions.filter(student_id=student_id, date=day).order_by("-id")[:1],
+            "day warm-up": sessions.filter(date=day).order_by("student_id", "-id"),
+            # month_report()
+            "month summary": summaries.filter(student_id=student_id, date__gte=month_start, date__lte=month_end)
+            .values("date", "first_in", "last_out"),
+            # The admin changelist: summary_page(after=(day, student_id)) over get_daily_summary()
+            "admin keyset page": summaries.values("student_id", "student__name", "date", "first_in", "last_out", "sessions")
+            .filter(Q(date__lt=day) | Q(date=day, student_id__lt=student_id))
+            .order_by("-date", "-student_id")[:PAGE_SIZE + 1],
+            "approved leaves": LeaveRequest.objects.using(BENCH_ALIAS).filter(
+                student_id=student_id, status="approved", from_date__lte=month_end, to_date__gte=month_start,
+            ).values_list("from_date", "to_date"),
+        }
+
+    def measure(self, samples, label):
+        self.stdout.write(f"\n📋 Query plans {label}:")
+        for name, queryset in self.queries(*samples[0]).items():
+            plan = queryset.explain().replace("\n", "\n      ")
+            self.stdout.write(f"  {name}:\n      {plan}")
+
+        timings = {}
+        for name in self.queries(*samples[0]):
+            start = time.perf_counter()
+            for student_id, day in samples:
+                list(self.queries(student_id, day)[name])
+            timings[name] = (time.perf_counter() - start) * 1000 / len(samples)
+        return timings
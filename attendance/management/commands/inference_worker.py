@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.face_models import face_models, listen_address, run_inference_worker, worker_authkey
+
+
+class Command(BaseCommand):
+    help = "Run the long-lived face inference worker that web workers send frames to."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--address",
+            help="host:port to listen on (default: FACE_MODELS['WORKER_ADDRESS']'s port on 127.0.0.1)",
+        )
+
+    def handle(self, *args, **options):
+        config = getattr(settings, "FACE_MODELS", {})
+        address = options["address"]
+        if not address and config.get("WORKER_ADDRESS"):
+            host, port = listen_address(config["WORKER_ADDRESS"])
+            address = f"{host}:{port}"
+        if not address:
+            raise CommandError("Set FACE_MODELS['WORKER_ADDRESS'] or pass --address.")
+        try:
+            authkey = worker_authkey(config)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        face_models.warm_up_local()
+        try:
+            run_inference_worker(address, authkey)
+        except KeyboardInterrupt:
+            self.stdout.write("⏹️ Inference worker stopped.")
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.face_pipeline import FACE_SIZE
+from attendance.reembed import (
+    BATCH_SIZE, ReembedCheckpoint, choose_templates, embed_students, face_images, init_worker, source_signature,
+    student_folders,
+)
+
+
+class Command(BaseCommand):
+    help = "Re-embed every stored face image and rebuild all templates and the gallery."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--faces-dir", default=os.path.join(settings.BASE_DIR, "faces"))
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Images per FaceNet call")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Processes embedding students in parallel (1 = this process)")
+        parser.add_argument("--students-per-task", type=int, default=None,
+                            help="Students handed to a worker at once (default: enough to fill a batch)")
+        parser.add_argument("--templates", type=int,
+                            default=getattr(settings, "FACE_ENROLLMENT", {}).get("TEMPLATES", 5))
+        parser.add_argument("--student", action="append", dest="students",
+                            help="Only this student id (repeatable)")
+        parser.add_argument("--restart", action="store_true", help="Ignore a previous interrupted run")
+
+    def handle(self, *args, **options):
+        faces_dir = options["faces_dir"]
+        if not os.path.isdir(faces_dir):
+            raise CommandError(f"No faces directory at {faces_dir}")
+
+        fingerprint = {
+            "model": "FaceNet",
+            "face_size": FACE_SIZE,
+            "templates": options["templates"],
+            "students": sorted(options["students"] or []),
+        }
+        checkpoint = ReembedCheckpoint(faces_dir, fingerprint)
+        done = checkpoint.open(restart=options["restart"])
+
+        if not checkpoint.committing:
+            folders = [f for f in student_folders(faces_dir, options["students"]) if f[0] not in done]
+            if done:
+                self.stdout.write(f"↩️ Resuming: {len(done)} student(s) already re-embedded.")
+            self.embed(folders, checkpoint, options)
+
+        swapped, stale, manifest = checkpoint.commit()
+        if stale:
+            self.stderr.write(f"⚠️ Re-registered during the run, kept their new templates: {', '.join(stale)}. "
+                              f"Re-run with --student to re-embed them.")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Updated {swapped} student(s); gallery version {manifest['version']} with {manifest['count']} templates."
+        ))
+
+    def embed(self, folders, checkpoint, options):
+        batch_size = options["batch_size"]
+        per_task = options["students_per_task"] or max(1, batch_size // 10)
+        tasks = [folders[i:i + per_task] for i in range(0, len(folders), per_task)]
+        total_images = sum(len(face_images(folder)) for _, folder in folders)
+        # Taken before any image is read, so a re-registration during the run shows at commit
+        sources = {student_id: source_signature(folder) for student_id, folder in folders}
+        self.stdout.write(f"🧠 Re-embedding {total_images} image(s) of {len(folders)} student(s) "
+                          f"in batches of {batch_size} with {options['workers']} worker(s)...")
+
+        start = time.perf_counter()
+        images = 0
+        for results in self.run_tasks(tasks, options):
+            for student_id, embeddings in results:
+                if not len(embeddings):
+                    self.stderr.write(f"⚠️ No readable images for student {student_id}; keeping old templates.")
+                    continue
+                checkpoint.save(student_id, choose_templates(embeddings, options["templates"]), sources[student_id])
+                images += len(embeddings)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"  {images}/{total_images} images ({images / elapsed if elapsed else 0:.1f} images/s)")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"⏱️ {images} images in {elapsed:.1f}s ({images / elapsed if elapsed else 0:.1f} images/s)")
+
+    def run_tasks(self, tasks, options):
+        """Yield each task's results as it completes (in this process or a spawn pool)."""
+        if options["workers"] <= 1:
+            from keras_facenet import FaceNet
+
+            embedder = FaceNet()
+            for task in tasks:
+                yield embed_students(task, embedder, options["batch_size"])
+            return
+
+        context = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        with ProcessPoolExecutor(options["workers"], mp_context=context,
+                                 initializer=init_worker, initargs=(options["batch_size"],)) as executor:
+            for result in executor.map(embed_students, tasks):
+                yield result
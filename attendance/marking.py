@@ -0,0 +1,135 @@
+# attendance/marking.py
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Attendance
+from .session_cache import session_cache
+from .summaries import refresh_summaries
+
+CHECK_IN = "Check-In Successful"
+CHECK_OUT = "Check-Out Successful"
+
+
+def decide(last_record, now, min_interval_seconds):
+    """
+    Check-in / check-out rule for one recognition at `now`, given the latest
+    session of the day (or None). Returns "check_in", "check_out" or "wait"
+    with the status message shown to the student.
+    """
+    # No record today -> first CHECK-IN
+    if last_record is None:
+        return "check_in", CHECK_IN
+
+    # Open session -> CHECK-OUT (with optional wait)
+    if last_record.check_out is None:
+        elapsed_seconds = (now - last_record.check_in).total_seconds()
+        if elapsed_seconds >= min_interval_seconds:
+            return "check_out", CHECK_OUT
+        wait_seconds = int(min_interval_seconds - elapsed_seconds)
+        return "wait", f"Wait {wait_seconds}s before checkout"
+
+    # Last session closed -> start NEW CHECK-IN
+    return "check_in", CHECK_IN
+
+
+class AttendanceSink:
+    """
+    Buffers recognition events and writes them together.
+
+    flush() resolves the latest session of today for every student in the
+    buffer (from the open-session cache, with one query for any misses),
+    applies the events in order (same rules as decide()), then saves new
+    check-ins with bulk_create and check-outs with bulk_update in a single
+    transaction, together with the touched days' summaries. The cache is
+    updated write-through afterwards.
+    """
+
+    def __init__(self, min_interval_seconds=60, window=0.5, sessions=session_cache):
+        self.min_interval_seconds = min_interval_seconds
+        self.window = window
+        self.sessions = sessions
+        self._events = []
+        self._first_added = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, student_id, when=None):
+        if not self._events:
+            self._first_added = time.monotonic()
+        self._events.append((int(student_id), when or timezone.now()))
+
+    def due(self):
+        """True once the oldest buffered event has waited `window` seconds."""
+        return bool(self._events) and time.monotonic() - self._first_added >= self.window
+
+    def flush(self):
+        """Write all buffered events; returns [(student_id, status, when)] in order."""
+        events, self._events = self._events, []
+        if not events:
+            return []
+
+        today = timezone.localdate()
+        student_ids = {student_id for student_id, _ in events}
+        latest = self.sessions.lookup(student_ids) if self.sessions else {}
+
+        missing = student_ids - latest.keys()
+        if missing:
+            sessions = (
+                Attendance.objects
+                .filter(student_id__in=missing, date=today)
+                .order_by("student_id", "-id")
+            )
+            for record in sessions:
+                latest.setdefault(record.student_id, record)
+            for student_id in missing:
+                latest.setdefault(student_id, None)
+
+        created, updated, results = [], [], []
+        for student_id, when in events:
+            record = latest.get(student_id)
+            action, status = decide(record, when, self.min_interval_seconds)
+            if action == "check_in":
+                record = Attendance(student_id=student_id, date=today, check_in=when)
+                created.append(record)
+                latest[student_id] = record
+            elif action == "check_out":
+                record.check_out = when
+                if record.pk is not None and record not in updated:
+                    updated.append(record)
+            results.append((student_id, status, when))
+
+        if created or updated:
+            try:
+                with transaction.atomic():
+                    if created:
+                        Attendance.objects.bulk_create(created)
+                    if updated:
+                        Attendance.objects.bulk_update(updated, ["check_out"])
+                    refresh_summaries({(record.student_id, record.date) for record in created + updated})
+            except Exception:
+                if self.sessions:
+                    for student_id in student_ids:
+                        self.sessions.invalidate(student_id)
+                raise
+
+        if self.sessions:
+            for student_id in student_ids:
+                self.sessions.store(student_id, latest[student_id])
+            if created or updated:
+                self.sessions.publish_change()
+        return results
+
+
+def mark_attendance(student, min_interval_seconds=60):
+    """
+    Mark check-in or check-out for the latest session today.
+    If the latest session is closed, start a new one with check-in.
+    Optionally enforce a minimum interval before checkout.
+    """
+    sink = AttendanceSink(min_interval_seconds)
+    sink.add(student.student_id)
+    _, status, now = sink.flush()[0]
+    return status, now
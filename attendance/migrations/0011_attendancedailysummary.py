@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def summarize(sessions):
+    """Frozen copy of attendance.summaries.summarize as of this migration."""
+    sessions = sorted(sessions, key=lambda s: (s[0] is None, s[0]))
+    check_ins = [check_in for check_in, _ in sessions if check_in]
+    check_outs = [check_out for _, check_out in sessions if check_out]
+
+    present = sum(
+        (check_out - check_in).total_seconds()
+        for check_in, check_out in sessions if check_in and check_out
+    )
+    breaks = sum(
+        (curr_in - prev_out).total_seconds()
+        for (_, prev_out), (curr_in, _) in zip(sessions, sessions[1:])
+        if prev_out and curr_in and curr_in > prev_out
+    )
+    return {
+        'first_in': min(check_ins) if check_ins else None,
+        'last_out': max(check_outs) if check_outs else None,
+        'sessions': len(sessions),
+        'present_seconds': int(present),
+        'break_seconds': int(breaks),
+    }
+
+
+def fill_summaries(apps, schema_editor):
+    """Summarise the sessions recorded before the table existed."""
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceDailySummary = apps.get_model('attendance', 'AttendanceDailySummary')
+
+    db_alias = schema_editor.connection.alias
+
+    days = {}
+    rows = Attendance.objects.using(db_alias).values_list('student_id', 'date', 'check_in', 'check_out').iterator(chunk_size=2000)
+    for student_id, day, check_in, check_out in rows:
+        days.setdefault((student_id, day), []).append((check_in, check_out))
+    AttendanceDailySummary.objects.using(db_alias).bulk_create(
+        [AttendanceDailySummary(student_id=student_id, date=day, **summarize(sessions))
+         for (student_id, day), sessions in days.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_capturejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('first_in', models.DateTimeField(blank=True, null=True)),
+                ('last_out', models.DateTimeField(blank=True, null=True)),
+                ('sessions', models.IntegerField(default=0)),
+                ('present_seconds', models.IntegerField(default=0)),
+                ('break_seconds', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='attendance.student')),
+            ],
+            options={
+                'verbose_name': 'Daily Attendance Summary',
+                'verbose_name_plural': 'Daily Attendance Summaries',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('student', 'date'), name='unique_daily_summary')],
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
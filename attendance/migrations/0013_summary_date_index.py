@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0012_attendance_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancedailysummary',
+            index=models.Index(fields=['date', 'student'], name='summary_date_student'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 import uuid
+from datetime import timedelta
 from django.utils import timezone
 from django.contrib.auth.models import User
 
@@ -27,6 +28,14 @@ class Attendance(models.Model):
     def __str__(self):
         return f"{self.student.name} - {self.date}"
 
+    class Meta:
+        indexes = [
+            # Latest session of a student on a day (marking, face_success, summaries)
+            models.Index(fields=['student', 'date'], name='attendance_student_date'),
+            # All sessions of a day (open-session cache warm-up)
+            models.Index(fields=['date', 'student'], name='attendance_date_student'),
+        ]
+
 
 class PasswordReset(models.Model):
     user = models.ForeignKey(Student, on_delete=models.CASCADE)
@@ -63,13 +72,14 @@ class LeaveRequest(models.Model):
     def clean(self):
         """Custom validation to restrict leave requests to 2 per month."""
         # Check how many requests the student has already made this month
-        current_month = self.from_date.month
-        current_year = self.from_date.year
-        
+        # (a date range, so the (student, from_date, to_date) index applies)
+        month_start = self.from_date.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+
         leave_count = LeaveRequest.objects.filter(
             student=self.student,
-            from_date__month=current_month,
-            from_date__year=current_year
+            from_date__gte=month_start,
+            from_date__lt=next_month,
         ).count()
 
         # If this is a new request (not an edit) and count is already 2
@@ -83,6 +93,11 @@ class LeaveRequest(models.Model):
     def __str__(self):
         return f"{self.student.name} ({self.category}) - {self.from_date}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'from_date', 'to_date'], name='leave_student_dates'),
+        ]
+
 # AttendanceDeletionLog class - MOVED OUTSIDE LeaveRequest (FIXED INDENTATION)
 class AttendanceDeletionLog(models.Model):
     """Log for tracking attendance deletions with remarks"""
@@ -112,4 +127,81 @@ class AttendanceDeletionLog(models.Model):
     class Meta:
         ordering = ['-deleted_at']
         verbose_name = "Attendance Deletion Log"
-        verbose_name_plural = "Attendance Deletion Logs"
\ No newline at end of file
+        verbose_name_plural = "Attendance Deletion Logs"
+
+class CaptureJob(models.Model):
+    """One face-registration capture, shared by every web worker through the database."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    FINISHED = ('done', 'failed', 'cancelled')
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    camera = models.CharField(max_length=200)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    count = models.IntegerField(default=0)
+    target = models.IntegerField(default=10)
+    cancel_requested = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    metrics = models.JSONField(default=dict, blank=True)  # per-stage timings (ms) and counters
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # last sign of life from the worker
+
+    @property
+    def done(self):
+        return self.status in self.FINISHED
+
+    def progress(self):
+        return {
+            "job_id": str(self.job_id),
+            "status": self.status,
+            "count": self.count,
+            "target": self.target,
+            "done": self.done,
+            "cancelled": self.status == 'cancelled',
+        }
+
+    def __str__(self):
+        return f"Capture {self.job_id} for {self.student.name} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['student', '-created_at'])]
+
+
+class AttendanceDailySummary(models.Model):
+    """
+    One row per student and day, derived from that day's Attendance sessions.
+
+    Kept up to date by attendance/summaries.py whenever sessions are written
+    or deleted, so reports and the admin read one row per day instead of
+    aggregating the raw sessions. `rebuild_daily_summaries` recomputes a range.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    date = models.DateField()
+    first_in = models.DateTimeField(null=True, blank=True)
+    last_out = models.DateTimeField(null=True, blank=True)
+    sessions = models.IntegerField(default=0)
+    present_seconds = models.IntegerField(default=0)  # sum of closed sessions
+    break_seconds = models.IntegerField(default=0)    # gaps between consecutive sessions
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student.name} - {self.date} ({self.sessions} session(s))"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = "Daily Attendance Summary"
+        verbose_name_plural = "Daily Attendance Summaries"
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'date'], name='unique_daily_summary'),
+        ]
+        # Admin listing: newest day first, paged by (date, student) keyset
+        indexes = [models.Index(fields=['date', 'student'], name='summary_date_student')]
@@ -0,0 +1,64 @@
+# attendance/preprocess.py
+"""
+Per-frame preprocessing shared by the recognizers, registration and the
+capture jobs.
+
+Each FramePreprocessor owns its output buffers and reuses them for every
+frame of the same size, so converting a camera frame costs no allocation
+after the first one. A buffer is overwritten by the next call for the same
+slot: use one preprocessor per thread, and copy a result that must outlive
+the next frame.
+"""
+import cv2
+import numpy as np
+
+BRIGHTNESS_STEP = 8  # brightness samples every 8th pixel of every 8th row
+
+# Rec. 601 luma weights in BGR order, the same ones COLOR_BGR2GRAY uses
+LUMA_BGR = np.array([0.114, 0.587, 0.299])
+
+
+def _reuse(buffers, key, shape):
+    buffer = buffers.get(key)
+    if buffer is None or buffer.shape != shape:
+        buffer = buffers[key] = np.empty(shape, dtype=np.uint8)
+    return buffer
+
+
+class FramePreprocessor:
+    """
+    rgb()        BGR camera frame -> RGB, converted once into a reused buffer
+    resized()    downscaled copy (e.g. for detection) into a reused buffer
+    brightness() mean grey level estimated on a subsampled grid, no grey image made
+
+    `slot` keeps separate buffers for frames that are alive at the same time
+    (e.g. several cameras' frames in one engine batch).
+    """
+
+    def __init__(self, brightness_step=BRIGHTNESS_STEP):
+        self.brightness_step = brightness_step
+        self._rgb = {}
+        self._resized = {}
+        self._grid = {}
+
+    def rgb(self, bgr_frame, slot=0):
+        out = _reuse(self._rgb, slot, bgr_frame.shape)
+        cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB, dst=out)
+        return out
+
+    def resized(self, image, size, slot=0):
+        """`image` resized to (width, height) with INTER_AREA."""
+        out = _reuse(self._resized, slot, (size[1], size[0]) + image.shape[2:])
+        cv2.resize(image, size, dst=out, interpolation=cv2.INTER_AREA)
+        return out
+
+    def brightness(self, bgr_frame):
+        """Mean grey level of a BGR (or grey) frame, estimated from every brightness_step-th pixel."""
+        step = self.brightness_step
+        view = bgr_frame[::step, ::step]
+        grid = _reuse(self._grid, 0, view.shape)
+        np.copyto(grid, view)
+        means = cv2.mean(grid)
+        if bgr_frame.ndim == 2:
+            return means[0]
+        return float(np.dot(means[:3], LUMA_BGR))
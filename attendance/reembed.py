@@ -0,0 +1,207 @@
+# attendance/reembed.py
+"""
+Rebuild every student's templates from the face crops stored in `faces/`
+(each student's `raw/` captures, or the template crops of registrations
+made before those were kept).
+
+Crops of many students are embedded together in large FaceNet batches
+(optionally in several worker processes). Results are staged per student
+in `faces/.gallery/reembed/` so an interrupted run resumes where it
+stopped; only when every student is done are the embedding files swapped
+in and the gallery rebuilt.
+"""
+import json
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+from .enrollment import select_diverse
+from .face_pipeline import FACE_SIZE
+from .gallery import GALLERY_DIRNAME, RAW_DIRNAME, GalleryStore, l2_normalize
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+BATCH_SIZE = 64
+
+
+# ----------------------------
+# INPUTS
+# ----------------------------
+def student_folders(faces_dir, only=None):
+    """[(student_id, folder)] for every student directory in `faces_dir`, sorted by id."""
+    folders = []
+    for entry in os.scandir(faces_dir):
+        if not entry.is_dir() or entry.name == GALLERY_DIRNAME or entry.name.startswith("."):
+            continue
+        if only and entry.name not in only:
+            continue
+        folders.append((entry.name, entry.path))
+    return sorted(folders, key=lambda f: (len(f[0]), f[0]))
+
+
+def face_images(folder):
+    """A student's stored captures: `raw/` when present, else the template crops of older registrations."""
+    raw_folder = os.path.join(folder, RAW_DIRNAME)
+    if os.path.isdir(raw_folder) and any(name.lower().endswith(IMAGE_EXTENSIONS) for name in os.listdir(raw_folder)):
+        folder = raw_folder
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def source_signature(folder):
+    """[[name, mtime_ns, size]] of a student's face images, to tell later whether they changed."""
+    signature = []
+    for path in face_images(folder):
+        st = os.stat(path)
+        signature.append([os.path.relpath(path, folder), st.st_mtime_ns, st.st_size])
+    return signature
+
+
+# ----------------------------
+# EMBEDDING (worker side)
+# ----------------------------
+_worker = {}
+
+
+def init_worker(batch_size):
+    """Process-pool initializer: load FaceNet once per process."""
+    from keras_facenet import FaceNet
+
+    _worker["embedder"] = FaceNet()
+    _worker["batch_size"] = batch_size
+
+
+def embed_students(folders, embedder=None, batch_size=None):
+    """
+    Embed the stored crops of several students, filling batches across
+    student boundaries. Returns [(student_id, (n_images, dim) embeddings)].
+    """
+    embedder = embedder or _worker["embedder"]
+    batch_size = batch_size or _worker.get("batch_size", BATCH_SIZE)
+    buffer = np.empty((batch_size, FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8)
+
+    owners, chunks = [], []
+    filled = 0
+
+    def flush():
+        nonlocal filled
+        if filled:
+            chunks.append(np.asarray(embedder.embeddings(buffer[:filled]), dtype=np.float32))
+            filled = 0
+
+    for student_id, folder in folders:
+        for path in face_images(folder):
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            # Resize first, then convert the 160x160 crop in place
+            cv2.resize(image, (FACE_SIZE, FACE_SIZE), dst=buffer[filled])
+            cv2.cvtColor(buffer[filled], cv2.COLOR_BGR2RGB, dst=buffer[filled])
+            owners.append(student_id)
+            filled += 1
+            if filled == batch_size:
+                flush()
+    flush()
+
+    embeddings = np.concatenate(chunks) if chunks else np.empty((0, 0), dtype=np.float32)
+    owners = np.asarray(owners)
+    return [(student_id, embeddings[owners == student_id]) for student_id, _ in folders]
+
+
+def choose_templates(embeddings, k):
+    """K most diverse embeddings, starting from the one closest to the student's mean."""
+    if len(embeddings) <= k:
+        return embeddings
+    vectors = l2_normalize(embeddings)
+    first = int(np.argmax(vectors @ vectors.mean(axis=0)))
+    return embeddings[select_diverse(vectors, k, first=first)]
+
+
+# ----------------------------
+# CHECKPOINT
+# ----------------------------
+class ReembedCheckpoint:
+    """
+    Staged results of one re-embedding run. `fingerprint` describes the
+    settings that shape the embeddings; a checkpoint written with different
+    settings is discarded instead of resumed.
+    """
+
+    def __init__(self, faces_dir, fingerprint):
+        self.faces_dir = faces_dir
+        self.stage_dir = os.path.join(faces_dir, GALLERY_DIRNAME, "reembed")
+        self.state_path = os.path.join(self.stage_dir, "state.json")
+        self.fingerprint = fingerprint
+        self.committing = False  # an earlier run crashed while swapping results in
+
+    def open(self, restart=False):
+        """Create or resume the stage; returns the student ids already done."""
+        state = None
+        if not restart:
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = None
+        if state is None or state.get("fingerprint") != self.fingerprint:
+            shutil.rmtree(self.stage_dir, ignore_errors=True)
+            os.makedirs(self.stage_dir)
+            self._write_state(committing=False)
+        else:
+            self.committing = state.get("committing", False)
+        return {name[:-4] for name in os.listdir(self.stage_dir) if name.endswith(".npy")}
+
+    def _write_state(self, committing):
+        state = {"fingerprint": self.fingerprint, "committing": committing}
+        GalleryStore._write_atomic(self.state_path, json.dumps(state).encode())
+
+    def save(self, student_id, templates, sources):
+        """Stage a student's templates with the source_signature() taken before their images were read."""
+        GalleryStore._write_atomic(self._sources_path(student_id), json.dumps(sources).encode())
+        path = os.path.join(self.stage_dir, f"{student_id}.npy")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, templates)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _sources_path(self, student_id):
+        return os.path.join(self.stage_dir, f"{student_id}.sources.json")
+
+    def _staged_sources(self, student_id):
+        try:
+            with open(self._sources_path(student_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def commit(self):
+        """
+        Swap every staged result into `faces/<id>/<id>_embedding.npy`, rebuild
+        the gallery, then drop the stage. Safe to repeat after a crash.
+
+        A student whose images changed since they were staged (re-registered
+        during the run) keeps the new templates. Returns (swapped, stale
+        student ids, manifest).
+        """
+        self._write_state(committing=True)
+        swapped, stale = 0, []
+        for name in sorted(os.listdir(self.stage_dir)):
+            if not name.endswith(".npy"):
+                continue
+            student_id = name[:-4]
+            folder = os.path.join(self.faces_dir, student_id)
+            if not os.path.isdir(folder):  # student may have been deleted meanwhile
+                continue
+            if self._staged_sources(student_id) != source_signature(folder):
+                stale.append(student_id)
+                continue
+            os.replace(os.path.join(self.stage_dir, name), os.path.join(folder, f"{student_id}_embedding.npy"))
+            swapped += 1
+        manifest = GalleryStore(self.faces_dir).rebuild()
+        shutil.rmtree(self.stage_dir, ignore_errors=True)
+        return swapped, stale, manifest
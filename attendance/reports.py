@@ -0,0 +1,102 @@
+# attendance/reports.py
+"""
+Monthly attendance report of one student.
+
+The month's daily summaries (one query) and approved leaves (one query,
+expanded into a set of dates) are fetched up front and every day's
+status is decided in memory, so a report costs the same number of queries
+whatever the month holds.
+"""
+import calendar
+from datetime import date, timedelta
+
+from .models import AttendanceDailySummary, LeaveRequest
+
+NEPAL_OFFSET = timedelta(hours=5, minutes=45)
+
+# Comprehensive Nepali Public Holidays 2026
+PUBLIC_HOLIDAYS = {
+    date(2026, 1, 11): "Prithvi Jayanti",
+    date(2026, 1, 14): "Maghe Sankranti",
+    date(2026, 1, 30): "Martyrs' Day",
+    date(2026, 2, 15): "Maha Shivaratri",
+    date(2026, 2, 18): "Gyalpo Lhosar",
+    date(2026, 2, 19): "Prajatantra Diwas",
+    date(2026, 3, 2): "Holi (Hilly Region)",
+    date(2026, 3, 3): "Holi (Terai Region)",
+    date(2026, 3, 8): "Women's Day",
+    date(2026, 4, 14): "Nepali New Year",
+    date(2026, 5, 1): "Labour Day / Buddha Jayanti",
+    date(2026, 5, 29): "Republic Day",
+    date(2026, 9, 19): "Constitution Day",
+    date(2026, 10, 21): "Dashain (Vijaya Dashami)",
+    date(2026, 11, 11): "Bhai Tika (Tihar)",
+}
+
+
+def leave_dates(student, start, end):
+    """Set of dates in [start, end] covered by the student's approved leaves (one query)."""
+    leaves = LeaveRequest.objects.filter(
+        student=student, status='approved', from_date__lte=end, to_date__gte=start
+    ).values_list('from_date', 'to_date')
+
+    covered = set()
+    for from_date, to_date in leaves:
+        day, last = max(from_date, start), min(to_date, end)
+        while day <= last:
+            covered.add(day)
+            day += timedelta(days=1)
+    return covered
+
+
+def nepal_time(value):
+    """HH:MM:SS in Nepal time (UTC+5:45) of a stored UTC datetime, or "—"."""
+    if not value:
+        return "—"
+    return (value + NEPAL_OFFSET).strftime("%H:%M:%S")
+
+
+def month_report(student, year, month, today=None):
+    """
+    One row per day of the month (up to `today` for the current month):
+    date, day, status, check_in, check_out.
+    """
+    today = today or date.today()
+    _, num_days = calendar.monthrange(year, month)
+    first_day, last_day = date(year, month, 1), date(year, month, num_days)
+
+    # We only show records up to 'today' if viewing current month
+    limit_date = min(last_day, today)
+    all_dates = [date(year, month, day) for day in range(1, limit_date.day + 1)]
+
+    # A date range rather than date__year/date__month, so the (student, date) index is used
+    summaries = AttendanceDailySummary.objects.filter(
+        student=student, date__gte=first_day, date__lte=last_day
+    ).values('date', 'first_in', 'last_out')
+    attendance_map = {rec['date']: rec for rec in summaries}
+    on_leave = leave_dates(student, first_day, last_day)
+
+    attendance_status = []
+    for d in all_dates:
+        record = attendance_map.get(d)
+        holiday_name = PUBLIC_HOLIDAYS.get(d)
+
+        if d.weekday() == 5:
+            status = 'Weekend'
+        elif holiday_name:
+            status = f'Holiday ({holiday_name})'
+        elif d in on_leave:
+            status = 'On Leave'
+        elif record:
+            status = 'Present'
+        else:
+            status = 'Absent'
+
+        attendance_status.append({
+            'date': d.strftime("%Y-%m-%d"),
+            'day': d.strftime("%A"),
+            'status': status,
+            'check_in': nepal_time(record and record['first_in']),
+            'check_out': nepal_time(record and record['last_out']),
+        })
+    return attendance_status
@@ -0,0 +1,130 @@
+# attendance/session_cache.py
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Attendance
+
+EPOCH_KEY = "attendance:open_sessions:epoch"
+EPOCH_CHECK_INTERVAL = 1.0  # seconds between checks for changes made by other processes
+
+
+class OpenSessionCache:
+    """
+    Per-process view of today's latest Attendance row for every student.
+
+    Warmed with one query for the current day (Asia/Kathmandu, via
+    timezone.localdate()) and kept up to date write-through by
+    AttendanceSink, so check-in / check-out / wait decisions for known
+    students need no query. A student missing from a warmed cache has no
+    session today. The cache resets at the day boundary.
+
+    Other processes (admin edits, the web app) publish a new epoch in the
+    Django cache; when it moves, this process drops its entries and re-warms.
+    Epochs are random tokens written with a plain set(), not counters:
+    cache.incr() is a read-modify-write on FileBasedCache, so two
+    concurrent bumps could land on the same value and one change would go
+    unseen. Every publish now yields a value nobody has seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._day = None
+        self._latest = {}
+        self._unknown = set()  # students whose latest session must be re-read
+        self._warm = False
+        self._epoch = None
+        self._epoch_checked = 0.0
+
+    def warm(self):
+        """Load today's latest session per student with one query."""
+        today = timezone.localdate()
+        epoch = cache.get(EPOCH_KEY, 0)  # before the query, so a change made during it is seen next check
+        latest = {}
+        for record in Attendance.objects.filter(date=today).order_by("student_id", "-id"):
+            latest.setdefault(record.student_id, record)
+
+        with self._lock:
+            self._day = today
+            self._latest = latest
+            self._unknown = set()
+            self._warm = True
+            self._epoch = epoch
+            self._epoch_checked = time.monotonic()
+        return len(latest)
+
+    def reset(self):
+        with self._lock:
+            self._day = None
+            self._latest = {}
+            self._unknown = set()
+            self._warm = False
+
+    def lookup(self, student_ids):
+        """
+        Return {student_id: latest record or None} for the students the cache
+        can answer for (warming it first if needed). Students left out must be
+        read from the database and passed to store().
+        """
+        with self._lock:
+            self._check_fresh()
+            if not self._warm:
+                self.warm()
+            return {
+                student_id: self._latest.get(student_id)
+                for student_id in student_ids
+                if student_id not in self._unknown
+            }
+
+    def store(self, student_id, record):
+        """Write-through update after `record` was saved as the student's latest session."""
+        with self._lock:
+            if not self._warm:
+                return
+            if record is None or (record.date == self._day and record.pk is not None):
+                self._latest[student_id] = record
+                self._unknown.discard(student_id)
+            else:
+                self._forget(student_id)
+
+    def invalidate(self, student_id=None):
+        """Forget one student (re-read on next lookup) or, with no id, everything."""
+        with self._lock:
+            if student_id is None:
+                self.reset()
+            else:
+                self._forget(student_id)
+
+    def _forget(self, student_id):
+        self._latest.pop(student_id, None)
+        self._unknown.add(student_id)
+
+    def publish_change(self):
+        """Tell other processes that today's sessions changed outside their cache."""
+        # Our own cache is current, but we don't adopt the new epoch: a change
+        # published by someone else at the same moment would then go unnoticed
+        # here. The cost is one re-warm query at the next epoch check.
+        cache.set(EPOCH_KEY, uuid.uuid4().hex, None)
+
+    def _check_fresh(self):
+        if self._day is not None and self._day != timezone.localdate():
+            self.reset()
+            return
+
+        now = time.monotonic()
+        if self._warm and now - self._epoch_checked >= EPOCH_CHECK_INTERVAL:
+            self._epoch_checked = now
+            if cache.get(EPOCH_KEY, 0) != self._epoch:
+                self.reset()
+
+
+session_cache = OpenSessionCache()
+
+
+def invalidate_open_sessions(student_id=None):
+    """Invalidation hook for edits made outside AttendanceSink (e.g. the admin)."""
+    session_cache.invalidate(student_id)
+    session_cache.publish_change()
@@ -3,11 +3,8 @@ import os
 import shutil
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
+from .gallery import GalleryStore
 from .models import Student
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-
-from .models import Attendance
 
 @receiver(post_delete, sender=Student)
 def delete_student_files(sender, instance, **kwargs):
@@ -15,4 +12,7 @@ def delete_student_files(sender, instance, **kwargs):
     if os.path.exists(face_folder):
         shutil.rmtree(face_folder)
         print(f"🗑️ Deleted folder: {face_folder}")
+    if os.path.isdir("faces"):
+        # New gallery version, so running recognizers drop the student
+        GalleryStore("faces").remove(instance.student_id)
 
@@ -0,0 +1,333 @@
+# attendance/streaming.py
+import asyncio
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+
+import cv2
+
+MAX_FPS = 15
+SCALE = 1.0
+JPEG_QUALITY = 80
+BOUNDARY = b"frame"
+
+
+def mjpeg_part(jpeg_bytes):
+    """One multipart/x-mixed-replace part holding a JPEG."""
+    return (b"--" + BOUNDARY + b"\r\n"
+            b"Content-Type: image/jpeg\r\n"
+            b"Content-Length: " + str(len(jpeg_bytes)).encode() + b"\r\n\r\n"
+            + jpeg_bytes + b"\r\n")
+
+
+class MjpegChannel:
+    """
+    One encoder thread per camera: takes the newest frame from the camera hub
+    at most `max_fps` times a second, downsizes and JPEG-encodes it once, and
+    publishes the finished multipart chunk for every viewer to send as is.
+    """
+
+    def __init__(self, broadcaster, spec, subscription):
+        self.broadcaster = broadcaster
+        self.spec = spec
+        self.subscription = subscription
+        self.viewers = 0
+        self.ended = False
+        self.encoded = 0
+        self._index = 0
+        self._chunk = None
+        self._changed = threading.Condition()
+        self._async_waiters = []  # (event loop, future) of async viewers waiting for a chunk
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"mjpeg-{spec}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        config = self.broadcaster
+        interval = 1.0 / config.max_fps if config.max_fps else 0.0
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), int(config.quality)]
+        next_at = time.monotonic()
+        try:
+            while not self._stop.is_set() and self.subscription.isOpened():
+                now = time.monotonic()
+                if now < next_at:
+                    self._stop.wait(next_at - now)
+                    continue
+
+                frame = self.subscription.latest_frame(timeout=0.5)
+                if frame is None:
+                    continue
+                next_at = max(next_at + interval, time.monotonic())
+
+                if config.scale != 1.0:
+                    height, width = frame.shape[:2]
+                    frame = cv2.resize(frame, (max(1, round(width * config.scale)), max(1, round(height * config.scale))),
+                                       interpolation=cv2.INTER_AREA)
+                ok, buffer = cv2.imencode(".jpg", frame, params)
+                if not ok:
+                    continue
+
+                chunk = mjpeg_part(buffer.tobytes())
+                with self._changed:
+                    self._index += 1
+                    self._chunk = chunk
+                    self.encoded += 1
+                    self._notify()
+        finally:
+            self.subscription.release()
+            with self._changed:
+                self.ended = True
+                self._notify()
+
+    def _notify(self):
+        """Wake sync and async viewers (caller holds self._changed)."""
+        self._changed.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._async_waiters = []
+
+    def chunk_after(self, last_index, timeout=1.0):
+        """
+        (index, chunk) of the newest encoded frame if newer than `last_index`.
+        A viewer that cannot keep up skips straight to the newest frame, so
+        nothing queues up behind a slow connection.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._index > last_index or self.ended, timeout)
+            if self._index > last_index:
+                return self._index, self._chunk
+            return last_index, None
+
+    async def achunk_after(self, last_index, timeout=1.0):
+        """chunk_after() for async views: waits without holding a thread."""
+        with self._changed:
+            if self._index > last_index or self.ended:
+                return self.chunk_after(last_index, 0)
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._async_waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._changed:
+                if (loop, future) in self._async_waiters:
+                    self._async_waiters.remove((loop, future))
+        return self.chunk_after(last_index, 0)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class MjpegBroadcaster:
+    """
+    Serves one camera to any number of MJPEG viewers with a single encoder.
+    The channel (and its camera subscription) starts with the first viewer
+    and stops when the last one disconnects.
+    """
+
+    def __init__(self, hub, max_fps=MAX_FPS, scale=SCALE, quality=JPEG_QUALITY):
+        self.hub = hub
+        self.max_fps = max_fps
+        self.scale = scale
+        self.quality = quality
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def join(self, spec):
+        spec = str(spec)
+        with self._lock:
+            channel = self._channels.get(spec)
+            if channel is None or channel.ended:
+                channel = self._channels[spec] = MjpegChannel(self, spec, self.hub.subscribe(spec)).start()
+            channel.viewers += 1
+        return channel
+
+    def leave(self, channel):
+        with self._lock:
+            channel.viewers -= 1
+            if channel.viewers > 0:
+                return
+            if self._channels.get(channel.spec) is channel:
+                del self._channels[channel.spec]
+        channel.stop()
+
+    def viewers(self):
+        with self._lock:
+            return {spec: channel.viewers for spec, channel in self._channels.items()}
+
+    def stream(self, spec):
+        """Generator of multipart chunks for one viewer; empty if the camera cannot be opened."""
+        try:
+            channel = self.join(spec)
+        except IOError as e:
+            print(f"❌ {e}")
+            return
+
+        try:
+            last_index = 0
+            while True:
+                last_index, chunk = channel.chunk_after(last_index)
+                if chunk is not None:
+                    yield chunk
+                elif channel.ended:
+                    break
+        finally:
+            self.leave(channel)
+
+    async def astream(self, spec):
+        """Async version of stream() for ASGI: an idle viewer costs no thread."""
+        try:
+            channel = await sync_to_async(self.join, thread_sensitive=False)(spec)
+        except IOError as e:
+            print(f"❌ {e}")
+            return
+
+        try:
+            last_index = 0
+            while True:
+                last_index, chunk = await channel.achunk_after(last_index)
+                if chunk is not None:
+                    yield chunk
+                elif channel.ended:
+                    break
+        finally:
+            # stop() joins the encoder thread, so keep it off the event loop
+            await sync_to_async(self.leave, thread_sensitive=False)(channel)
+
+
+def mjpeg_broadcaster_from_settings(hub):
+    from django.conf import settings
+
+    config = getattr(settings, "MJPEG_STREAM", {})
+    return MjpegBroadcaster(
+        hub,
+        max_fps=config.get("MAX_FPS", MAX_FPS),
+        scale=config.get("SCALE", SCALE),
+        quality=config.get("JPEG_QUALITY", JPEG_QUALITY),
+    )
+
+
+# ----------------------------
+# SERVER-SENT EVENTS
+# ----------------------------
+SSE_HEARTBEAT = 15.0  # seconds between keep-alive comments
+
+
+def sse_event(data, event=None):
+    """One text/event-stream message with `data` encoded as JSON."""
+    message = f"event: {event}\n" if event else ""
+    return (message + f"data: {json.dumps(data)}\n\n").encode()
+
+
+class ProgressBroadcaster:
+    """
+    In-process change signal for progress streams, keyed e.g. by student id.
+    Writers call publish(key) after saving new progress; viewers wait for it
+    instead of polling the database. Writers in other processes cannot
+    publish here, so viewers still re-read the state, backing off while
+    nothing changes.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._changed = threading.Condition()
+        self._async_waiters = {}  # key -> [(event loop, future)] of async viewers
+
+    def version(self, key):
+        with self._changed:
+            return self._versions.get(str(key), 0)
+
+    def publish(self, key):
+        key = str(key)
+        with self._changed:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._changed.notify_all()
+            for loop, future in self._async_waiters.pop(key, []):
+                loop.call_soon_threadsafe(_resolve, future)
+
+    def wait(self, key, seen, timeout):
+        """Block until `key` is published past version `seen` or `timeout` passes."""
+        key = str(key)
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions.get(key, 0) > seen, timeout)
+
+    async def await_change(self, key, seen, timeout):
+        """wait() for async views: waits without holding a thread."""
+        key = str(key)
+        with self._changed:
+            if self._versions.get(key, 0) > seen:
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._async_waiters.setdefault(key, []).append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._changed:
+                waiters = self._async_waiters.get(key, [])
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+                if not waiters:
+                    self._async_waiters.pop(key, None)
+
+
+def progress_events(read_state, changes=None, key=None, interval=0.25, max_interval=2.0):
+    """
+    Sync event stream: sends read_state() whenever it changes, until its
+    "done" flag is set. Between reads it waits for `changes` (a
+    ProgressBroadcaster) to publish `key`; the wait doubles from `interval`
+    to `max_interval` while the state stays the same. Heartbeat comments
+    keep proxies from closing the stream.
+    """
+    last, last_sent, wait = None, time.monotonic(), interval
+    while True:
+        seen = changes.version(key) if changes else 0
+        state = read_state()
+        if state != last:
+            last, last_sent, wait = dict(state), time.monotonic(), interval
+            yield sse_event(state)
+            if state.get("done"):
+                return
+        else:
+            wait = min(wait * 2, max_interval)
+            if time.monotonic() - last_sent >= SSE_HEARTBEAT:
+                last_sent = time.monotonic()
+                yield b": keep-alive\n\n"
+        if changes:
+            changes.wait(key, seen, wait)
+        else:
+            time.sleep(wait)
+
+
+async def aprogress_events(read_state, changes=None, key=None, interval=0.25, max_interval=2.0):
+    """Async progress_events(): waiting viewers hold no worker thread."""
+    read_state = sync_to_async(read_state)  # reads the database
+    last, last_sent, wait = None, time.monotonic(), interval
+    while True:
+        seen = changes.version(key) if changes else 0
+        state = await read_state()
+        if state != last:
+            last, last_sent, wait = dict(state), time.monotonic(), interval
+            yield sse_event(state)
+            if state.get("done"):
+                return
+        else:
+            wait = min(wait * 2, max_interval)
+            if time.monotonic() - last_sent >= SSE_HEARTBEAT:
+                last_sent = time.monotonic()
+                yield b": keep-alive\n\n"
+        if changes:
+            await changes.await_change(key, seen, wait)
+        else:
+            await asyncio.sleep(wait)
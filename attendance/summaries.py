@@ -0,0 +1,200 @@
+# attendance/summaries.py
+"""
+Maintenance of AttendanceDailySummary.
+
+Every write path (AttendanceSink, the admin) reports the (student, date)
+pairs it touched to refresh_summaries(), which re-derives just those days
+from their sessions: one query to read them and one upsert, whatever the
+size of the Attendance table. rebuild_summaries() recomputes a whole date
+range, e.g. after importing data or fixing rows by hand.
+
+The admin lists summaries a page at a time by keyset (summary_page) and
+caches their aggregate counts (summary_counts) until the next change.
+"""
+import uuid
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Attendance, AttendanceDailySummary
+
+SUMMARY_FIELDS = ["first_in", "last_out", "sessions", "present_seconds", "break_seconds"]
+REBUILD_BATCH = 2000
+PAGE_SIZE = 50
+COUNT_CACHE_SECONDS = 300
+VERSION_KEY = "attendance:daily_summaries:version"
+
+
+def summarize(sessions):
+    """
+    Summary fields of one student-day from its sessions [(check_in, check_out)].
+    Breaks are the gaps between a session's check-out and the next check-in,
+    as on the admin breaks page.
+    """
+    sessions = sorted(sessions, key=lambda s: (s[0] is None, s[0]))
+    check_ins = [check_in for check_in, _ in sessions if check_in]
+    check_outs = [check_out for _, check_out in sessions if check_out]
+
+    present = sum(
+        (check_out - check_in).total_seconds()
+        for check_in, check_out in sessions if check_in and check_out
+    )
+    breaks = sum(
+        (curr_in - prev_out).total_seconds()
+        for (_, prev_out), (curr_in, _) in zip(sessions, sessions[1:])
+        if prev_out and curr_in and curr_in > prev_out
+    )
+    return {
+        "first_in": min(check_ins) if check_ins else None,
+        "last_out": max(check_outs) if check_outs else None,
+        "sessions": len(sessions),
+        "present_seconds": int(present),
+        "break_seconds": int(breaks),
+    }
+
+
+def _save(summaries):
+    AttendanceDailySummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=["student", "date"],
+        update_fields=SUMMARY_FIELDS + ["updated_at"],
+    )
+
+
+def refresh_summaries(pairs):
+    """Re-derive the summaries of the given (student_id, date) pairs from their sessions."""
+    pairs = {(int(student_id), day) for student_id, day in pairs}
+    if not pairs:
+        return 0
+
+    sessions = {pair: [] for pair in pairs}
+    with transaction.atomic():
+        rows = Attendance.objects.filter(
+            student_id__in={student_id for student_id, _ in pairs},
+            date__in={day for _, day in pairs},
+        ).values_list("student_id", "date", "check_in", "check_out")
+        for student_id, day, check_in, check_out in rows:
+            if (student_id, day) in sessions:
+                sessions[(student_id, day)].append((check_in, check_out))
+
+        summaries = [
+            AttendanceDailySummary(student_id=student_id, date=day, **summarize(day_sessions))
+            for (student_id, day), day_sessions in sessions.items() if day_sessions
+        ]
+        if summaries:
+            _save(summaries)
+
+        emptied = [Q(student_id=student_id, date=day) for (student_id, day), s in sessions.items() if not s]
+        if emptied:
+            AttendanceDailySummary.objects.filter(reduce(or_, emptied)).delete()
+    bump_version()
+    return len(summaries)
+
+
+def rebuild_summaries(start=None, end=None, student_ids=None, batch_size=REBUILD_BATCH):
+    """
+    Recompute every summary in [start, end] (either bound optional) from the
+    raw sessions, streaming them in (student, date) order. Returns the number
+    of summaries written.
+    """
+    sessions = Attendance.objects.all()
+    summaries = AttendanceDailySummary.objects.all()
+    if start:
+        sessions, summaries = sessions.filter(date__gte=start), summaries.filter(date__gte=start)
+    if end:
+        sessions, summaries = sessions.filter(date__lte=end), summaries.filter(date__lte=end)
+    if student_ids:
+        sessions = sessions.filter(student_id__in=student_ids)
+        summaries = summaries.filter(student_id__in=student_ids)
+
+    rows = (
+        sessions.order_by("student_id", "date", "check_in")
+        .values_list("student_id", "date", "check_in", "check_out")
+        .iterator(chunk_size=batch_size)
+    )
+
+    written = 0
+    with transaction.atomic():
+        summaries.delete()
+        batch, current, day_sessions = [], None, []
+        for student_id, day, check_in, check_out in rows:
+            if (student_id, day) != current:
+                if day_sessions:
+                    batch.append(AttendanceDailySummary(student_id=current[0], date=current[1], **summarize(day_sessions)))
+                current, day_sessions = (student_id, day), []
+                if len(batch) >= batch_size:
+                    _save(batch)
+                    written, batch = written + len(batch), []
+            day_sessions.append((check_in, check_out))
+        if day_sessions:
+            batch.append(AttendanceDailySummary(student_id=current[0], date=current[1], **summarize(day_sessions)))
+        if batch:
+            _save(batch)
+            written += len(batch)
+    bump_version()
+    return written
+
+
+# ----------------------------
+# LISTING
+# ----------------------------
+def bump_version():
+    """
+    Invalidate every cached summary count (they are keyed by this version)
+    once the caller's transaction commits, so no reader can cache counts of
+    rows that are not visible yet. Outside a transaction this runs at once.
+    """
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    # A fresh random token rather than cache.incr(), which is a read-modify-write
+    # on FileBasedCache: two concurrent bumps could store the same value.
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def summary_page(queryset, after=None, before=None, size=PAGE_SIZE):
+    """
+    One page of `queryset` (values() rows with "date" and "student_id"),
+    newest day first, then by student id descending, so it walks the
+    (date, student) index. `after` / `before` are the (date, student_id)
+    of the last / first row of the neighbouring page; no OFFSET is used,
+    so page 1000 costs the same as page 1.
+
+    Returns (rows, has_older, has_newer).
+    """
+    if before is not None:
+        day, student_id = before
+        rows = list(
+            queryset.filter(Q(date__gt=day) | Q(date=day, student_id__gt=student_id))
+            .order_by("date", "student_id")[:size + 1]
+        )
+        has_newer = len(rows) > size
+        return rows[:size][::-1], True, has_newer
+
+    if after is not None:
+        day, student_id = after
+        queryset = queryset.filter(Q(date__lt=day) | Q(date=day, student_id__lt=student_id))
+    rows = list(queryset.order_by("-date", "-student_id")[:size + 1])
+    return rows[:size], len(rows) > size, after is not None
+
+
+def summary_counts(queryset, key, timeout=COUNT_CACHE_SECONDS):
+    """
+    {"days", "students", "sessions"} of `queryset` in one aggregate query,
+    cached under `key` until the summaries change or `timeout` passes.
+    """
+    version = cache.get(VERSION_KEY, "")
+    cache_key = f"attendance:daily_summaries:counts:{version}:{key}"
+    counts = cache.get(cache_key)
+    if counts is None:
+        counts = queryset.aggregate(
+            days=Count("id"), students=Count("student", distinct=True), sessions=Sum("sessions"),
+        )
+        counts["sessions"] = counts["sessions"] or 0
+        cache.set(cache_key, counts, timeout)
+    return counts
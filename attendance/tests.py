@@ -1,3 +1,1578 @@
-from django.test import TestCase
+import asyncio
+import io
+import itertools
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, time as time_of_day, timedelta, timezone as dt_timezone
+from multiprocessing import AuthenticationError
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import close_old_connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import batch, views
+from .batch import process_segment, video_segments
+from .management.commands.attendance_from_video import Command as AttendanceFromVideoCommand
+from .camera import CameraHub, VideoFileSource, source_names
+from .capture_jobs import CaptureJobRunner, capture_state, request_cancel, save_templates
+from .ann import IVFMatcher
+from .engine import WRITE_RETRIES, RecognitionEngine, recognition_engine_from_settings
+from .enrollment import EnrollmentSelector, assess_face
+from .face_models import RemoteFaceBatcher, listen_address, parse_address, run_inference_worker, worker_authkey
+from .face_pipeline import FaceBatch, FaceBatcher, scale_detection
+from .gallery import GalleryMatcher, GalleryStore, GalleryWatcher, l2_normalize, make_matcher
+from .marking import CHECK_IN, CHECK_OUT, AttendanceSink, mark_attendance
+from .models import Attendance, AttendanceDailySummary, CaptureJob, LeaveRequest, Student
+from .preprocess import FramePreprocessor
+from .reports import month_report
+from .tracking import FaceTracker, create_box_tracker, iou
+from .session_cache import OpenSessionCache, session_cache
+from .reembed import ReembedCheckpoint, choose_templates, embed_students, source_signature, student_folders
+from .streaming import MjpegBroadcaster, ProgressBroadcaster, aprogress_events
+from .summaries import VERSION_KEY, bump_version, rebuild_summaries, summary_counts, summary_page
+
+
+def write_test_video(path, frames=20, size=(64, 48)):
+    """Small MJPG video of textured noise frames standing in for a camera."""
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, size)
+    for _ in range(frames):
+        writer.write(rng.integers(60, 200, (size[1], size[0], 3), dtype=np.uint8))
+    writer.release()
+
+
+async def disconnect(chunks):
+    """Cancel a pending read, as the ASGI handler does when the browser goes away."""
+    while True:
+        task = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        if task.cancel():
+            await asyncio.gather(task, return_exceptions=True)
+            return
+
+
+class FakeCameraMixin:
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.video = os.path.join(self.tmp, "camera.avi")
+        write_test_video(self.video)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+
+class CameraHubTests(FakeCameraMixin, SimpleTestCase):
+    def make_hub(self):
+        self.opened = []
+
+        def opener(spec):
+            source = VideoFileSource(spec, realtime=True, loop=True)
+            self.opened.append(source)
+            return source
+
+        return CameraHub(opener=opener, buffer_size=4)
+
+    def test_subscribers_share_one_reader(self):
+        hub = self.make_hub()
+        first = hub.subscribe(self.video)
+        second = hub.subscribe(self.video)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(hub.active_sources(), {self.video: 2})
+
+        frame = first.next_frame(timeout=2)
+        self.assertIsNotNone(frame)
+        self.assertFalse(frame.flags.writeable)
+        self.assertIsNotNone(second.next_frame(timeout=2))
+
+        ok, copy = first.read()
+        self.assertTrue(ok)
+        self.assertTrue(copy.flags.writeable)
+
+        first.release()
+        second.release()
+
+    def test_device_released_after_last_subscriber(self):
+        hub = self.make_hub()
+        with hub.subscribe(self.video) as feed:
+            self.assertIsNotNone(feed.next_frame(timeout=2))
+        self.assertEqual(hub.active_sources(), {})
+        self.assertFalse(self.opened[0].isOpened())
+
+        # Subscribing again reopens the device
+        with hub.subscribe(self.video) as feed:
+            self.assertIsNotNone(feed.next_frame(timeout=2))
+        self.assertEqual(len(self.opened), 2)
+
+    def test_video_without_loop_ends(self):
+        hub = CameraHub(opener=lambda spec: VideoFileSource(spec, realtime=False, loop=False))
+        with hub.subscribe(self.video) as feed:
+            frames = 0
+            while feed.isOpened():
+                if feed.next_frame(timeout=2) is not None:
+                    frames += 1
+            self.assertGreater(frames, 0)
+            self.assertFalse(feed.read()[0])
+
+    def test_ended_source_restarts_on_next_subscribe(self):
+        hub = CameraHub(opener=lambda spec: VideoFileSource(spec, realtime=False, loop=False))
+        with hub.subscribe(self.video) as first:
+            while first.isOpened():
+                first.next_frame(timeout=2)
+            # Still subscribed, but the source ended: a new subscriber gets a fresh reader
+            with hub.subscribe(self.video) as second:
+                self.assertIsNot(second.feed, first.feed)
+                self.assertIsNotNone(second.next_frame(timeout=2))
+                self.assertEqual(hub.active_sources(), {self.video: 1})
+        self.assertEqual(hub.active_sources(), {})
+
+    def test_slow_open_does_not_block_other_sources(self):
+        opening, release = threading.Event(), threading.Event()
+
+        def opener(spec):
+            if spec == "slow":
+                opening.set()
+                release.wait(5)
+                spec = self.video
+            return VideoFileSource(spec, realtime=True, loop=True)
+
+        hub = CameraHub(opener=opener)
+        slow = []
+        thread = threading.Thread(target=lambda: slow.append(hub.subscribe("slow")))
+        thread.start()
+        self.assertTrue(opening.wait(5))
+        try:
+            start = time.monotonic()
+            with hub.subscribe(self.video) as feed:  # the hub lock is free while "slow" opens
+                self.assertLess(time.monotonic() - start, 2)
+                self.assertIsNotNone(feed.next_frame(timeout=2))
+        finally:
+            release.set()
+            thread.join()
+        slow[0].release()
+        self.assertEqual(hub.active_sources(), {})
+
+    def test_missing_source_raises(self):
+        hub = CameraHub()
+        with self.assertRaises(IOError):
+            hub.subscribe(os.path.join(self.tmp, "missing.avi"))
+        self.assertEqual(hub.active_sources(), {})
+
+
+class MjpegBroadcasterTests(FakeCameraMixin, SimpleTestCase):
+    def test_frames_encoded_once_for_all_viewers(self):
+        hub = CameraHub(opener=lambda spec: VideoFileSource(spec, realtime=True, loop=True))
+        broadcaster = MjpegBroadcaster(hub, max_fps=10, scale=0.5, quality=60)
+        first, second = broadcaster.stream(self.video), broadcaster.stream(self.video)
+
+        chunk = next(first)
+        self.assertIs(next(second), chunk)  # same bytes object, not a second encode
+        self.assertEqual(broadcaster.viewers(), {self.video: 2})
+        self.assertEqual(hub.active_sources(), {self.video: 1})
+
+        jpeg = chunk.split(b"\r\n\r\n", 1)[1][:-2]
+        image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(image.shape[:2], (24, 32))
+
+        first.close()
+        second.close()
+        self.assertEqual(broadcaster.viewers(), {})
+        self.assertEqual(hub.active_sources(), {})
+
+    def test_frame_rate_capped(self):
+        hub = CameraHub(opener=lambda spec: VideoFileSource(spec, realtime=False, loop=True))
+        broadcaster = MjpegBroadcaster(hub, max_fps=5)
+        stream = broadcaster.stream(self.video)
+        next(stream)
+        channel = broadcaster.join(self.video)
+        time.sleep(1.0)
+        self.assertLessEqual(channel.encoded, 7)
+        broadcaster.leave(channel)
+        stream.close()
+
+
+class CameraFeedViewTests(FakeCameraMixin, SimpleTestCase):
+    def test_stream_uses_shared_camera(self):
+        with override_settings(CAMERA_HUB={"SOURCE": self.video}):
+            response = self.client.get(reverse("camera_feed"))
+            chunks = iter(response.streaming_content)
+            self.assertTrue(next(chunks).startswith(b"--frame"))
+            self.assertEqual(views.camera_hub.active_sources(), {self.video: 1})
+            response.close()
+        self.assertEqual(views.camera_hub.active_sources(), {})
+
+    async def test_async_stream_under_asgi(self):
+        with override_settings(CAMERA_HUB={"SOURCE": self.video}):
+            response = await self.async_client.get(reverse("camera_feed"))
+            chunks = aiter(response.streaming_content)
+            self.assertTrue((await anext(chunks)).startswith(b"--frame"))
+            self.assertEqual(views.mjpeg.viewers(), {self.video: 1})
+            await disconnect(chunks)
+        self.assertEqual(views.mjpeg.viewers(), {})
+
+
+def make_student(name="Test Student", email="student@example.com"):
+    return Student.objects.create(
+        name=name, email=email, phone_number="9800000000", address="Kathmandu",
+        password="x", dob=date(2000, 1, 1), course="BIT",
+    )
+
+
+def progress_of(event):
+    return json.loads(event.decode()[len("data: "):])
+
+
+class CaptureProgressStreamTests(TestCase):
+    def setUp(self):
+        self.student = make_student()
+
+    async def test_progress_pushed_until_done(self):
+        job = await CaptureJob.objects.acreate(student=self.student, camera="0", status="running", count=3)
+        response = await self.async_client.get(reverse("capture_progress_stream", args=[self.student.student_id]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+
+        first = progress_of(await anext(events))
+        self.assertEqual((first["count"], first["done"]), (3, False))
+
+        await CaptureJob.objects.filter(pk=job.pk).aupdate(count=10, status="done")
+        last = progress_of(await anext(events))
+        self.assertEqual((last["count"], last["done"], last["job_id"]), (10, True, str(job.job_id)))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    async def test_idle_stream_backs_off_until_published(self):
+        changes = ProgressBroadcaster()
+        state, reads = {"count": 0, "done": False}, []
+
+        def read_state():
+            reads.append(time.monotonic())
+            return dict(state)
+
+        events = aprogress_events(read_state, changes, "7", interval=0.01, max_interval=5.0)
+        await anext(events)
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(1.0)
+        self.assertLess(len(reads), 12)  # a fixed 10 ms poll would have read ~100 times
+
+        state.update(count=1, done=True)
+        published = time.monotonic()
+        changes.publish(7)
+        self.assertEqual(progress_of(await pending)["count"], 1)
+        self.assertLess(time.monotonic() - published, 0.5)
+
+    def test_sync_fallback_under_wsgi(self):
+        CaptureJob.objects.create(student=self.student, camera="0", status="cancelled")
+        response = self.client.get(reverse("capture_progress_stream", args=[self.student.student_id]))
+        events = [progress_of(e) for e in b"".join(response.streaming_content).split(b"\n\n") if e]
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0]["cancelled"])
+
+    def test_progress_without_job(self):
+        response = self.client.get(reverse("check_progress", args=[self.student.student_id]))
+        self.assertEqual(response.json(), {"count": 0, "done": False})
+
+
+class FakeBatcher:
+    """Finds one face with a random embedding in every frame (or none), without loading any model."""
+
+    def __init__(self, faces=True):
+        self.faces = faces
+        self.rng = np.random.default_rng(1)
+
+    def process(self, rgb_frame, limit=None):
+        boxes = [(0, 0, 32, 32)] if self.faces else []
+        embeddings = self.rng.normal(size=(len(boxes), 512)).astype(np.float32)
+        return FaceBatch(boxes, [{}] * len(boxes), embeddings, {"detect": 1.0, "embed": 1.0})
+
+
+class FixedDetector:
+    def detect_faces(self, image):
+        return [{"box": [4, 4, 24, 24], "confidence": 0.99, "keypoints": {}}]
+
+
+class MeanEmbedder:
+    def embeddings(self, crops):
+        return crops.reshape(len(crops), -1, 3).mean(axis=1).astype(np.float32)
+
+
+class ScaledDetectionTests(SimpleTestCase):
+    class HalfSizeDetector:
+        """Finds a face (and a smaller one) at fixed spots of whatever image it is given."""
+
+        def __init__(self):
+            self.shapes = []
+
+        def detect_faces(self, image):
+            self.shapes.append(image.shape)
+            return [
+                {"box": [10, 10, 20, 20], "confidence": 0.99, "keypoints": {"nose": (20, 21)}},
+                {"box": [30, 2, 12, 12], "confidence": 0.9, "keypoints": {}},
+            ]
+
+    def test_boxes_mapped_back_and_crops_cut_from_full_frame(self):
+        frame = np.zeros((80, 100, 3), np.uint8)
+        frame[20:60, 20:60] = 200  # the face, in full-resolution coordinates
+        detector = self.HalfSizeDetector()
+        batcher = FaceBatcher(detector, MeanEmbedder(), min_face_size=30, detection_scale=0.5)
+
+        faces = batcher.process(frame)
+        self.assertEqual(detector.shapes, [(40, 50, 3)])
+        # 20 px at half size is 40 px: kept; the 12 px face is 24 px, under min_face_size
+        self.assertEqual(faces.boxes, [(20, 20, 40, 40)])
+        self.assertEqual(faces.detections[0]["keypoints"], {"nose": (40, 42)})
+        np.testing.assert_allclose(faces.embeddings, [[200, 200, 200]])
+
+        unscaled = FaceBatcher(self.HalfSizeDetector(), MeanEmbedder(), min_face_size=30)
+        self.assertEqual(unscaled.detect(frame)[0], [])  # 20 px boxes are too small at full size
+
+    def test_scale_detection_copies(self):
+        detection = {"box": [3, 4, 5, 6], "confidence": 0.9, "keypoints": {"left_eye": (1, 2)}}
+        scaled = scale_detection(detection, 1 / 0.4)
+        self.assertEqual(scaled["box"], [8, 10, 12, 15])
+        self.assertEqual(scaled["keypoints"], {"left_eye": (2, 5)})
+        self.assertEqual(detection["box"], [3, 4, 5, 6])
+        self.assertEqual(scale_detection({"box": [1, 1, 2, 2]}, 2.0), {"box": [2, 2, 4, 4]})
+
+
+class InferenceWorkerTests(SimpleTestCase):
+    def setUp(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.address = f"127.0.0.1:{probe.getsockname()[1]}"
+        self.local = FaceBatcher(FixedDetector(), MeanEmbedder(), min_face_size=8)
+        threading.Thread(target=run_inference_worker, args=(self.address, b"secret", self.local), daemon=True).start()
+        for _ in range(100):
+            with socket.socket() as probe:
+                if probe.connect_ex(parse_address(self.address)) == 0:
+                    break
+            time.sleep(0.01)
+
+    def test_remote_batcher_matches_local(self):
+        frame = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+        remote = RemoteFaceBatcher(self.address, b"secret").clone()
+        self.addCleanup(remote.close)
+
+        self.assertEqual(remote.detect(frame)[0], self.local.detect(frame)[0])
+        boxes = [(0, 0, 16, 16), (8, 8, 20, 20)]
+        np.testing.assert_allclose(remote.embed_many([(frame, boxes)]), self.local.embed(frame, boxes))
+        self.assertEqual(remote.process(frame).boxes, [(4, 4, 24, 24)])
+
+    def test_wrong_key_is_refused(self):
+        with self.assertRaises(AuthenticationError):
+            RemoteFaceBatcher(self.address, b"guess").detect(np.zeros((8, 8, 3), dtype=np.uint8))
+
+    def test_no_default_authkey(self):
+        with self.assertRaises(ImproperlyConfigured):
+            worker_authkey({"WORKER_ADDRESS": "127.0.0.1:6010"})
+        with self.assertRaises(ImproperlyConfigured):
+            run_inference_worker("127.0.0.1:0", b"")
+        self.assertEqual(listen_address("10.0.0.5:6010"), ("127.0.0.1", 6010))
+
+
+@mock.patch("attendance.capture_jobs.CAPTURE_INTERVAL", 0)
+class CaptureJobRunnerTests(FakeCameraMixin, TransactionTestCase):
+    def make_runner(self, faces=True, **options):
+        hub = CameraHub(opener=lambda spec: VideoFileSource(spec, realtime=True, loop=True))
+        options.setdefault("images", 3)
+        return CaptureJobRunner(hub, lambda: FakeBatcher(faces), faces_dir=self.tmp, **options)
+
+    def wait_for(self, job, *statuses, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job.refresh_from_db()
+            if job.status in statuses:
+                return job
+            time.sleep(0.05)
+        self.fail(f"job stayed {job.status}")
+
+    def test_capture_saves_images_and_metrics(self):
+        student = make_student()
+        job = self.make_runner().submit(student, self.video)
+        self.wait_for(job, "done")
+
+        self.assertEqual(job.count, 3)
+        folder = os.path.join(self.tmp, str(student.student_id))
+        templates = np.load(os.path.join(folder, f"{student.student_id}_embedding.npy"))
+        self.assertEqual(templates.shape, (3, 512))
+        self.assertEqual(len([f for f in os.listdir(folder) if f.endswith(".jpg")]), 3)
+        for key in ("queued_ms", "models_ms", "capture_ms", "save_ms", "total_ms"):
+            self.assertIn(key, job.metrics)
+        self.assertEqual(capture_state(student.student_id)["status"], "done")
+
+    def test_cancel_stops_running_capture(self):
+        student = make_student()
+        job = self.make_runner(faces=False).submit(student, self.video)
+        self.wait_for(job, "running")
+
+        request_cancel(student.student_id)
+        self.wait_for(job, "cancelled", timeout=3)
+        self.assertEqual(job.count, 0)
+
+    def test_concurrent_claims_respect_per_camera(self):
+        runner = CaptureJobRunner(None, None, per_camera=2, faces_dir=self.tmp)
+        student = make_student()
+        jobs = [CaptureJob.objects.create(student=student, camera="0") for _ in range(8)]
+        start = threading.Barrier(len(jobs))
+        claimed = []
+
+        def claim(job):
+            start.wait()
+            try:
+                if runner._claim(job):
+                    claimed.append(job.pk)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=claim, args=(job,)) for job in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(CaptureJob.objects.filter(status="running").count(), 2)
+
+    def test_one_capture_per_camera(self):
+        runner = self.make_runner(faces=False, per_camera=1)
+        first = runner.submit(make_student(), self.video)
+        self.wait_for(first, "running")
+        second = runner.submit(make_student("Other", "other@example.com"), self.video)
+        time.sleep(1.0)
+        second.refresh_from_db()
+        self.assertEqual(second.status, "queued")
+
+        request_cancel(first.student_id)
+        self.wait_for(second, "running")
+        request_cancel(second.student_id)
+        self.wait_for(second, "cancelled")
+
+
+class TemplateMatchingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.centres = l2_normalize(rng.normal(size=(3, 64)))
+        # student "a" has three templates, "b" one, "c" two; rows deliberately interleaved
+        self.rows = np.stack([self.centres[0], self.centres[1], self.centres[0] * 0.2 + self.centres[2],
+                              self.centres[2], -self.centres[0], self.centres[0]])
+        self.ids = ["a", "b", "a", "c", "a", "c"]
+
+    def test_max_uses_best_template(self):
+        matcher = GalleryMatcher(self.rows, self.ids, aggregate="max")
+        self.assertEqual(len(matcher), 3)
+        ids, scores = matcher.match(self.centres[0][None, :], k=3)
+        self.assertEqual(list(ids[0]), ["a", "c", "b"])
+        self.assertAlmostEqual(float(scores[0, 0]), 1.0, places=5)
+
+    def test_mean_top_averages_best_templates(self):
+        matcher = GalleryMatcher(self.rows, self.ids, aggregate="mean_top", top_n=2)
+        scores = matcher.scores(self.centres[0][None, :])[0]
+        normalized = l2_normalize(self.rows)
+        expected_a = np.mean(sorted(normalized[[0, 2, 4]] @ self.centres[0], reverse=True)[:2])
+        self.assertAlmostEqual(float(scores[list(matcher.identities).index("a")]), expected_a, places=5)
+        # "b" has a single template, so its score is that template's
+        self.assertAlmostEqual(float(scores[list(matcher.identities).index("b")]),
+                               float(self.centres[1] @ self.centres[0]), places=5)
+
+    def test_ivf_matches_exact_with_templates(self):
+        exact = GalleryMatcher(self.rows, self.ids)
+        ivf = IVFMatcher(self.rows, self.ids, nlist=2, nprobe=2)
+        queries = np.stack([self.centres[0], self.centres[2]])
+        self.assertEqual(exact.match(queries)[0].tolist(), ivf.match(queries)[0].tolist())
+
+
+class IVFMatcherTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # 2000 students in 40 loose clusters; queries are noisy views of known students
+        centres = l2_normalize(rng.normal(size=(40, 128)))
+        self.rows = l2_normalize(centres[rng.integers(0, 40, 2000)] + 0.35 * rng.normal(size=(2000, 128)))
+        self.ids = [f"s{i}" for i in range(2000)]
+        picked = rng.choice(2000, 200, replace=False)
+        self.queries = self.rows[picked] + 0.03 * rng.normal(size=(200, 128))
+        self.exact = GalleryMatcher(self.rows, self.ids)
+
+    def test_exhaustive_probe_equals_exact(self):
+        ivf = IVFMatcher(self.rows, self.ids, nlist=32)
+        exact_ids, exact_scores = self.exact.match(self.queries, k=5)
+        ivf_ids, ivf_scores = ivf.match(self.queries, k=5, nprobe=32)
+        self.assertEqual(ivf_ids.tolist(), exact_ids.tolist())
+        np.testing.assert_allclose(ivf_scores, exact_scores, rtol=1e-5, atol=1e-5)
+
+    def test_recall_against_exact(self):
+        ivf = IVFMatcher(self.rows, self.ids, nlist=32, nprobe=8)
+        exact_top = self.exact.match(self.queries, k=1)[0][:, 0]
+        ivf_top = ivf.match(self.queries, k=1)[0][:, 0]
+        self.assertGreaterEqual(np.mean(exact_top == ivf_top), 0.95)
+
+    def test_scores_follow_identities(self):
+        ivf = IVFMatcher(self.rows, self.ids, nlist=32, nprobe=4)
+        scores = ivf.scores(self.queries[:10])
+        self.assertEqual(scores.shape, (10, 2000))
+        exact = self.exact.scores(self.queries[:10])[:, [self.ids.index(i) for i in ivf.identities]]
+        probed = np.isfinite(scores)
+        self.assertTrue(probed.any(axis=1).all() and not probed.all())
+        np.testing.assert_allclose(scores[probed], exact[probed], rtol=1e-5, atol=1e-5)
+        # best() on a watcher delegates to the same matcher; scores() agrees with match()
+        best = ivf.identities[np.argmax(scores, axis=1)]
+        self.assertEqual(best.tolist(), ivf.match(self.queries[:10])[0][:, 0].tolist())
+
+    def test_templates_exhaustive_probe_equals_exact(self):
+        ids = [f"s{i // 3}" for i in range(600)]  # three templates per student
+        for aggregate in ("max", "mean_top"):
+            exact = GalleryMatcher(self.rows[:600], ids, aggregate=aggregate)
+            ivf = IVFMatcher(self.rows[:600], ids, nlist=16, aggregate=aggregate)
+            exact_ids, exact_scores = exact.match(self.queries, k=3)
+            ivf_ids, ivf_scores = ivf.match(self.queries, k=3, nprobe=16)
+            self.assertEqual(ivf_ids.tolist(), exact_ids.tolist())
+            np.testing.assert_allclose(ivf_scores, exact_scores, rtol=1e-5, atol=1e-5)
+
+    def test_fewer_probed_rows_than_k(self):
+        ivf = IVFMatcher(self.rows[:40], self.ids[:40], nlist=8, nprobe=1)
+        ids, scores = ivf.match(self.queries[:5], k=30)
+        probed = np.isfinite(scores)
+        self.assertTrue(probed[:, 0].all() and not probed.all())
+        self.assertTrue((ids[~probed] == "").all() and (ids[probed] != "").all())
+
+    def test_tiny_galleries(self):
+        rows = l2_normalize(np.random.default_rng(1).normal(size=(3, 16)))
+        for n in range(4):
+            matcher = make_matcher(rows[:n], [str(i) for i in range(n)], backend="ivf", min_size=0, nlist=100)
+            self.assertEqual(len(matcher), n)
+            if n:
+                self.assertIsInstance(matcher, IVFMatcher)
+                self.assertEqual(matcher.nlist, n)
+                self.assertEqual(matcher.best(rows[n - 1][None, :])[0][0], str(n - 1))
+            else:
+                self.assertNotIsInstance(matcher, IVFMatcher)
+
+
+class GalleryTemplateStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = GalleryStore(self.tmp)
+        self.rng = np.random.default_rng(0)
+        for student_id in ("1", "2"):
+            os.makedirs(os.path.join(self.tmp, student_id))
+            np.save(os.path.join(self.tmp, student_id, f"{student_id}_embedding.npy"), self.rng.normal(size=16))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_upsert_replaces_templates(self):
+        self.store.rebuild()
+        self.store.upsert("1", self.rng.normal(size=(3, 16)))
+        self.assertEqual(self.store.load().ids.tolist().count("1"), 3)
+
+        templates = self.rng.normal(size=(2, 16))
+        self.store.upsert("1", templates)
+        matcher = self.store.load()
+        self.assertEqual(matcher.ids.tolist().count("1"), 2)
+        self.assertEqual(len(matcher), 2)
+        self.assertEqual(matcher.best(templates[1][None, :])[0][0], "1")
+
+    def test_rebuild_reads_template_stacks(self):
+        np.save(os.path.join(self.tmp, "2", "2_embedding.npy"), self.rng.normal(size=(4, 16)))
+        self.store.rebuild()
+        matcher = self.store.load()
+        self.assertEqual(len(matcher.ids), 5)
+        self.assertEqual(sorted(matcher.identities.tolist()), ["1", "2"])
+
+
+class GalleryVersionTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = GalleryStore(self.tmp)
+        self.rng = np.random.default_rng(0)
+        for student_id in ("1", "2"):
+            os.makedirs(os.path.join(self.tmp, student_id))
+            np.save(os.path.join(self.tmp, student_id, f"{student_id}_embedding.npy"), self.rng.normal(size=16))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_every_change_bumps_the_version(self):
+        versions = [self.store.rebuild()["version"]]
+        versions.append(self.store.upsert("3", self.rng.normal(size=(2, 16)))["version"])
+        shutil.rmtree(os.path.join(self.tmp, "1"))  # as on Student delete; the files are the source of truth
+        versions.append(self.store.remove("1")["version"])
+        self.assertEqual(versions, [1, 2, 3])
+
+        matcher = self.store.load()
+        self.assertEqual(matcher.version, 3)
+        self.assertEqual(sorted(matcher.identities.tolist()), ["2", "3"])
+        # current + previous snapshot kept, older ones removed
+        snapshots = sorted(name for name in os.listdir(self.store.gallery_dir) if name.startswith("matrix."))
+        self.assertEqual(snapshots, ["matrix.2.f32", "matrix.3.f32"])
+
+    def test_watcher_swaps_in_new_version(self):
+        self.store.rebuild()
+        watcher = GalleryWatcher(self.store, interval=0.01)
+        held = watcher.matcher
+        self.assertFalse(watcher.check())
+
+        embedding = self.rng.normal(size=16)
+        self.store.upsert("3", embedding)
+        self.assertTrue(watcher.check())
+        self.assertEqual(watcher.version, 2)
+        self.assertEqual(watcher.best(embedding[None, :])[0][0], "3")
+        # a snapshot already handed out keeps working
+        self.assertEqual(len(held), 2)
+
+        self.store.remove("3")
+        watcher.start()
+        try:
+            deadline = time.monotonic() + 5
+            while watcher.version != 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            watcher.stop()
+        self.assertEqual(watcher.version, 3)
+        self.assertIsNone(watcher.best(embedding[None, :])[0][0])
+
+
+class GalleryConcurrencyTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.store = GalleryStore(self.tmp)
+        self.rng = np.random.default_rng(0)
+
+    def register(self, student_id, embedding):
+        """What register.py / capture jobs do: save the student's file, then upsert."""
+        os.makedirs(os.path.join(self.tmp, student_id), exist_ok=True)
+        np.save(os.path.join(self.tmp, student_id, f"{student_id}_embedding.npy"), embedding)
+        GalleryStore(self.tmp).upsert(student_id, embedding)
+
+    def test_concurrent_registrations_keep_every_student(self):
+        self.register("0", self.rng.normal(size=16))
+        start = threading.Barrier(8)
+
+        def register(student_id, embedding):
+            start.wait()
+            self.register(student_id, embedding)
+
+        threads = [
+            threading.Thread(target=register, args=(str(i), self.rng.normal(size=(2, 16)))) for i in range(1, 9)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        manifest = self.store.read_manifest()
+        self.assertFalse(self.store.is_stale(manifest))
+        self.assertEqual(manifest["version"], 9)
+        self.assertEqual(sorted(self.store.load().identities.tolist()), [str(i) for i in range(9)])
+        self.assertFalse([name for name in os.listdir(self.store.gallery_dir) if name.endswith(".tmp")])
+
+    def test_half_written_file_is_skipped(self):
+        self.register("1", self.rng.normal(size=16))
+        os.makedirs(os.path.join(self.tmp, "2"))
+        open(os.path.join(self.tmp, "2", "2_embedding.npy"), "wb").close()  # np.save still running
+
+        manifest = self.store.rebuild()
+        self.assertEqual(manifest["count"], 1)
+        self.assertTrue(self.store.is_stale(manifest))
+
+        self.register("2", self.rng.normal(size=16))
+        self.assertFalse(self.store.is_stale())
+
+    def test_changed_student_file_makes_gallery_stale(self):
+        for student_id in ("1", "2"):
+            self.register(student_id, self.rng.normal(size=16))
+        self.assertFalse(self.store.is_stale())
+
+        # Re-enrolled by a process that never told the gallery (faces/ itself is unchanged)
+        faces_mtime = os.stat(self.tmp).st_mtime_ns
+        np.save(os.path.join(self.tmp, "1", "1_embedding.npy"), self.rng.normal(size=(3, 16)))
+        self.assertEqual(os.stat(self.tmp).st_mtime_ns, faces_mtime)
+        self.assertTrue(self.store.is_stale())
+        self.assertEqual(self.store.load().ids.tolist().count("1"), 3)
+
+
+class StudentDeleteGalleryTests(TestCase):
+    def test_delete_removes_student_from_gallery(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        self.addCleanup(os.chdir, cwd)
+
+        student = make_student()
+        folder = os.path.join("faces", str(student.student_id))
+        os.makedirs(folder)
+        np.save(os.path.join(folder, f"{student.student_id}_embedding.npy"), np.ones((2, 16)))
+        store = GalleryStore("faces")
+        self.assertEqual(len(store.load()), 1)
+
+        student.delete()
+        self.assertFalse(os.path.exists(folder))
+        self.assertEqual(store.read_manifest()["version"], 2)
+        self.assertEqual(len(store.load()), 0)
+
+
+class FramePreprocessorTests(SimpleTestCase):
+    def test_buffers_reused_and_results_match_opencv(self):
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+        preprocessor = FramePreprocessor(brightness_step=4)
+
+        rgb = preprocessor.rgb(frame)
+        np.testing.assert_array_equal(rgb, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        self.assertIs(preprocessor.rgb(frame[::-1]), rgb)
+        self.assertIsNot(preprocessor.rgb(frame, slot=1), rgb)
+
+        small = preprocessor.resized(frame, (80, 60))
+        self.assertEqual(small.shape, (60, 80, 3))
+        self.assertIs(preprocessor.resized(frame, (80, 60)), small)
+
+        full = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).mean()
+        self.assertAlmostEqual(preprocessor.brightness(frame), full, delta=2)
+
+
+class FaceTrackerTests(SimpleTestCase):
+    FACE = (10, 10, 20, 20)
+
+    def setUp(self):
+        self.still = np.full((48, 64, 3), 100, np.uint8)
+
+    def detect(self, tracker, boxes, frame=None):
+        """One detection pass: should_detect() then update(); returns the tracks to embed."""
+        frame = self.still if frame is None else frame
+        tracker.should_detect(frame)
+        return tracker.update(frame, boxes)
+
+    def test_iou(self):
+        self.assertEqual(iou((0, 0, 10, 10), (0, 0, 10, 10)), 1.0)
+        self.assertAlmostEqual(iou((0, 0, 10, 10), (5, 0, 10, 10)), 1 / 3)
+        self.assertEqual(iou((0, 0, 10, 10), (20, 20, 10, 10)), 0.0)
+
+    def test_detects_on_cadence_motion_and_without_tracks(self):
+        tracker = FaceTracker(detect_every=3, motion_threshold=10.0)
+        self.assertTrue(tracker.should_detect(self.still))  # nothing tracked yet
+        tracker.update(self.still, [self.FACE])
+
+        self.assertEqual([tracker.should_detect(self.still) for _ in range(3)], [False, False, True])
+        tracker.update(self.still, [self.FACE])
+        self.assertFalse(tracker.should_detect(self.still + 5))  # below the motion threshold
+        self.assertTrue(tracker.should_detect(self.still + 50))  # the scene moved
+
+        empty = FaceTracker(detect_every=100)
+        for _ in range(3):
+            self.assertTrue(empty.should_detect(self.still))
+            empty.update(self.still, [])
+
+    def test_update_matches_by_iou_and_expires_tracks(self):
+        tracker = FaceTracker(max_misses=1)
+        track, = self.detect(tracker, [self.FACE])
+
+        # A slightly moved face is the same track; unidentified, it is embedded again
+        moved = (12, 11, 20, 20)
+        self.assertEqual(self.detect(tracker, [moved]), [track])
+        self.assertEqual(track.box, moved)
+
+        track.identify("7", 0.9)
+        self.assertEqual(self.detect(tracker, [self.FACE]), [])  # identified: no more embeddings
+
+        far = (40, 20, 20, 20)
+        new, = self.detect(tracker, [self.FACE, far])
+        self.assertIsNot(new, track)
+        self.assertEqual(len(tracker.tracks), 2)
+
+        self.detect(tracker, [])
+        self.assertEqual(len(tracker.tracks), 2)  # one miss is tolerated
+        self.detect(tracker, [])
+        self.assertEqual(tracker.tracks, [])
+
+    def test_unknown_face_embedded_at_most_max_attempts(self):
+        tracker = FaceTracker(max_embed_attempts=2)
+        embedded = 0
+        for _ in range(4):
+            for track in self.detect(tracker, [self.FACE]):
+                track.identify(None, 0.2)
+                embedded += 1
+        self.assertEqual(embedded, 2)
+        self.assertEqual(len(tracker.tracks), 1)
+
+    def test_iou_tracker_holds_boxes_between_detections(self):
+        self.assertIsNone(create_box_tracker("iou"))
+        tracker = FaceTracker(box_tracker="iou")
+        track, = self.detect(tracker, [self.FACE])
+        self.assertIsNone(track.box_tracker)
+
+        tracker.should_detect(self.still)
+        tracker.propagate(np.roll(self.still, 5, axis=1))
+        self.assertEqual(track.box, self.FACE)
+
+
+class FrameList:
+    """A capture that ends after `count` blank frames, like a video file, one per `interval`."""
+
+    def __init__(self, count, size=(48, 64), interval=0.0):
+        self.frames = [np.zeros(size + (3,), dtype=np.uint8) for _ in range(count)]
+        self.count = count
+        self.interval = interval
+
+    def read(self):
+        time.sleep(self.interval)
+        return (True, self.frames.pop()) if self.frames else (False, None)
+
+    def get(self, prop):
+        return self.count if prop == cv2.CAP_PROP_FRAME_COUNT else 0
+
+
+class OneFaceBatcher:
+    """Finds one face per frame; every embedding is zeros."""
+
+    def clone(self):
+        return self
+
+    def detect(self, rgb_frame):
+        return [(0, 0, 8, 8)], [{}]
+
+    def embed_many(self, frames_and_boxes):
+        return np.zeros((sum(len(boxes) for _, boxes in frames_and_boxes), 4), dtype=np.float32)
+
+
+class NewStudentMatcher:
+    """Recognises a different student in every face, so no event hits the cooldown."""
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+
+    def best(self, embeddings, threshold=0.6):
+        return [(next(self.ids), 0.9) for _ in embeddings]
+
+
+class BrightnessBatcher(OneFaceBatcher):
+    """One face per frame whose 1-d embedding is the frame's mean brightness."""
+
+    def embed_many(self, frames_and_boxes):
+        return np.array([[frame.mean()] for frame, boxes in frames_and_boxes for _ in boxes], dtype=np.float32)
+
+
+class BrightnessMatcher:
+    def best(self, embeddings, threshold=0.6):
+        return [("light" if value > 128 else "dark", 0.9) for value in embeddings[:, 0]]
+
+
+class RecordingSink:
+    """AttendanceSink stand-in: slow by `delay`, failing the first `failures` flushes."""
+
+    def __init__(self, delay=0.0, failures=0, window=0.0):
+        self.delay = delay
+        self.failures = failures
+        self.window = window
+        self.events = []
+        self.written = []
+
+    def add(self, student_id, when=None):
+        self.events.append((student_id, when))
+
+    def due(self):
+        return bool(self.events)
+
+    def flush(self):
+        events, self.events = self.events, []
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        self.written += events
+        return [(student_id, "Check-In Successful", when) for student_id, when in events]
+
+
+class RecognitionEngineTests(SimpleTestCase):
+    def run_engine(self, sources, sink, **options):
+        engine = RecognitionEngine(sources, OneFaceBatcher(), NewStudentMatcher(), sink, cooldown=0, **options)
+        engine.start()
+        self.addCleanup(engine.stop)
+        engine.wait_until_finished(poll=0.01)
+        return engine
+
+    @override_settings(FACE_ENGINE={"WORKERS": 3})
+    def test_settings_fill_in_defaults(self):
+        engine = recognition_engine_from_settings({"cam": FrameList(1)}, OneFaceBatcher(), NewStudentMatcher())
+        self.assertEqual((engine.workers, engine.cooldown, engine.sink.window), (3, 5.0, 0.5))
+
+    def test_full_write_queue_drops_frames_not_check_ins(self):
+        sink = RecordingSink(delay=0.05)  # the writer falls far behind the cameras
+        engine = self.run_engine({"cam": FrameList(40, interval=0.002)}, sink, write_queue_size=1, workers=2)
+        recognized = engine.stats["recognize"].snapshot()["count"]
+        self.assertGreater(recognized, 2)
+        self.assertGreater(engine.stats["capture"].snapshot()["dropped"], 0)  # backpressure lands on frames
+        self.assertEqual(len(sink.written), recognized)
+        self.assertEqual(len({student_id for student_id, _ in sink.written}), recognized)
+        self.assertEqual(engine.stats["write"].snapshot()["dropped"], 0)
+
+    def test_recorded_videos_from_several_cameras(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        specs = []
+        for folder, level in (("entrance", 40), ("library", 220)):  # same file name, different scenes
+            os.makedirs(os.path.join(tmp, folder))
+            path = os.path.join(tmp, folder, "cam.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+            for _ in range(15):
+                writer.write(np.full((48, 64, 3), level, dtype=np.uint8))
+            writer.release()
+            specs.append(path)
+
+        names = source_names(specs + [specs[0]])
+        self.assertEqual(names, {"cam.avi": specs[0], "cam.avi#2": specs[1]})
+
+        # Played at their 25 FPS, like live cameras (15 frames: 0.6s)
+        hub = CameraHub(opener=lambda spec: VideoFileSource(spec, realtime=True))
+        sources = {name: hub.subscribe(spec) for name, spec in names.items()}
+        sink = RecordingSink()
+        engine = RecognitionEngine(sources, BrightnessBatcher(), BrightnessMatcher(), sink, cooldown=60)
+        engine.start()
+        self.addCleanup(engine.stop)
+        engine.wait_until_finished(poll=0.01)
+        for capture in sources.values():
+            capture.release()
+
+        # One shared batcher saw both cameras; each student was written once (cooldown)
+        self.assertEqual(sorted(student_id for student_id, _ in sink.written), ["dark", "light"])
+        self.assertEqual(set(engine.statuses), {"dark", "light"})
+        for name in names:
+            packet, result = engine._latest[name]
+            self.assertEqual(packet.source, name)
+            self.assertIsNotNone(result)
+        self.assertEqual(hub.active_sources(), {})
+
+    def test_failed_flush_is_retried(self):
+        sink = RecordingSink(failures=2)
+        engine = self.run_engine({"cam": FrameList(1)}, sink)
+        self.assertEqual([student_id for student_id, _ in sink.written], [1])
+        self.assertEqual(engine.statuses, {1: "Check-In Successful"})
+
+    def test_given_up_events_do_not_hold_the_cooldown(self):
+        sink = RecordingSink(failures=WRITE_RETRIES + 1)
+        engine = self.run_engine({"cam": FrameList(1)}, sink)
+        self.assertEqual(sink.written, [])
+        self.assertEqual(engine.stats["write"].snapshot()["dropped"], 1)
+        self.assertNotIn(1, engine._last_event)  # the next sighting will be written
+
+
+class EnrollmentSelectorTests(SimpleTestCase):
+    def setUp(self):
+        self.crop = np.random.default_rng(0).integers(60, 200, (64, 64, 3), dtype=np.uint8)
+
+    def test_quality_gates(self):
+        self.assertEqual(assess_face(np.full((64, 64, 3), 10, np.uint8))["reason"], "too dark")
+        self.assertEqual(assess_face(np.full((64, 64, 3), 128, np.uint8))["reason"], "blurry")
+        self.assertIsNone(assess_face(self.crop)["reason"])
+
+        turned = {"keypoints": {"left_eye": (10, 20), "right_eye": (40, 20), "nose": (45, 35)}}
+        self.assertEqual(assess_face(self.crop, turned)["reason"], "turned away")
+        frontal = {"keypoints": {"left_eye": (10, 20), "right_eye": (40, 20), "nose": (26, 35)}}
+        self.assertIsNone(assess_face(self.crop, frontal)["reason"])
+
+    def test_duplicates_rejected_and_diverse_templates_kept(self):
+        rng = np.random.default_rng(1)
+        selector = EnrollmentSelector(k=3)
+        base = rng.normal(size=512)
+        self.assertEqual(selector.add(base, self.crop), (True, None))
+        self.assertEqual(selector.add(base + 0.01 * rng.normal(size=512), self.crop), (False, "duplicate"))
+
+        others = rng.normal(size=(5, 512))
+        for embedding in others:
+            selector.add(embedding, self.crop)
+        self.assertEqual(len(selector), 6)
+        self.assertEqual(selector.template_matrix().shape, (3, 512))
+        self.assertEqual(selector.rejected, {"duplicate": 1})
+
+
+class ReembedTests(SimpleTestCase):
+    class CountingEmbedder:
+        """Embeds a crop as its mean colour, padded to 8 dims; records batch sizes."""
+
+        def __init__(self):
+            self.batches = []
+
+        def embeddings(self, images):
+            self.batches.append(len(images))
+            means = images.reshape(len(images), -1, 3).mean(axis=1)
+            return np.hstack([means, np.ones((len(images), 5))])
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        for student_id, images in (("7", 4), ("12", 3)):
+            folder = os.path.join(self.tmp, student_id)
+            os.makedirs(folder)
+            for i in range(images):
+                cv2.imwrite(os.path.join(folder, f"Student_{i}.jpg"), rng.integers(0, 255, (40, 40, 3), dtype=np.uint8))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_batches_span_students(self):
+        embedder = self.CountingEmbedder()
+        results = embed_students(student_folders(self.tmp), embedder, batch_size=5)
+        self.assertEqual(embedder.batches, [5, 2])
+        self.assertEqual([(sid, len(e)) for sid, e in results], [("7", 4), ("12", 3)])
+        self.assertEqual(choose_templates(results[0][1], 2).shape, (2, 8))
+
+    def test_registration_keeps_raw_captures(self):
+        rng = np.random.default_rng(2)
+        selector = EnrollmentSelector(k=2)
+        crop = rng.integers(60, 200, (64, 64, 3), dtype=np.uint8)
+        for embedding in rng.normal(size=(5, 512)):
+            selector.add(embedding, crop)
+        folder = os.path.join(self.tmp, "7")
+        save_templates(folder, SimpleNamespace(student_id=7, name="Student"), selector)
+
+        # The folder holds the templates; re-embedding reads every capture
+        self.assertEqual(len([f for f in os.listdir(folder) if f.endswith(".jpg")]), 2)
+        self.assertEqual(len(os.listdir(os.path.join(folder, "raw"))), 5)
+        (_, embeddings), = embed_students(student_folders(self.tmp, ["7"]), self.CountingEmbedder())
+        self.assertEqual(len(embeddings), 5)
+
+    def test_resume_and_commit(self):
+        checkpoint = ReembedCheckpoint(self.tmp, {"templates": 2})
+        self.assertEqual(checkpoint.open(), set())
+        embedder = self.CountingEmbedder()
+        folders = student_folders(self.tmp, ["7"])
+        sources = source_signature(folders[0][1])
+        (student_id, embeddings), = embed_students(folders, embedder)
+        checkpoint.save(student_id, choose_templates(embeddings, 2), sources)
+
+        # An interrupted run resumes with the same settings, restarts with different ones
+        self.assertEqual(ReembedCheckpoint(self.tmp, {"templates": 2}).open(), {"7"})
+        resumed = ReembedCheckpoint(self.tmp, {"templates": 2})
+        resumed.open()
+        swapped, stale, manifest = resumed.commit()
+        self.assertEqual((swapped, stale), (1, []))
+        self.assertEqual(manifest["count"], 2)
+        self.assertEqual(np.load(os.path.join(self.tmp, "7", "7_embedding.npy")).shape, (2, 8))
+        self.assertEqual(ReembedCheckpoint(self.tmp, {"templates": 3}).open(), set())
+
+
+    def test_commit_keeps_templates_of_students_registered_meanwhile(self):
+        checkpoint = ReembedCheckpoint(self.tmp, {"templates": 2})
+        checkpoint.open()
+        folders = dict(student_folders(self.tmp))
+        for student_id, embeddings in embed_students(list(folders.items()), self.CountingEmbedder()):
+            checkpoint.save(student_id, choose_templates(embeddings, 2), source_signature(folders[student_id]))
+
+        # Student 12 re-registers before the run commits
+        rng = np.random.default_rng(3)
+        cv2.imwrite(os.path.join(folders["12"], "Student_0.jpg"), rng.integers(0, 255, (40, 40, 3), dtype=np.uint8))
+        registered = rng.normal(size=(3, 8)).astype(np.float32)
+        np.save(os.path.join(folders["12"], "12_embedding.npy"), registered)
+
+        swapped, stale, _ = checkpoint.commit()
+        self.assertEqual((swapped, stale), (1, ["12"]))
+        np.testing.assert_array_equal(np.load(os.path.join(folders["12"], "12_embedding.npy")), registered)
+        self.assertEqual(np.load(os.path.join(folders["7"], "7_embedding.npy")).shape, (2, 8))
+
+class MonthReportTests(TestCase):
+    def setUp(self):
+        self.student = make_student()
+        for day in (3, 4):
+            Attendance.objects.create(
+                student=self.student, date=date(2025, 6, day),
+                check_in=datetime(2025, 6, day, 3, 0, tzinfo=dt_timezone.utc),
+            )
+        rebuild_summaries()
+        # Leaves reach into the month from both sides; only approved ones count.
+        # bulk_create skips LeaveRequest.clean()'s per-month limit.
+        self.add_leaves(
+            (date(2025, 5, 28), date(2025, 6, 2), 'approved'),
+            (date(2025, 6, 24), date(2025, 7, 3), 'approved'),
+            (date(2025, 6, 10), date(2025, 6, 12), 'pending'),
+            (date(2025, 6, 16), date(2025, 6, 16), 'rejected'),
+        )
+
+    def add_leaves(self, *leaves):
+        LeaveRequest.objects.bulk_create(
+            LeaveRequest(student=self.student, from_date=from_date, to_date=to_date, reason="test", status=status)
+            for from_date, to_date, status in leaves
+        )
+
+    def test_statuses(self):
+        with self.assertNumQueries(2):
+            rows = month_report(self.student, 2025, 6, today=date(2025, 7, 15))
+        status = {row['date']: row['status'] for row in rows}
+
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(status['2025-06-02'], 'On Leave')
+        self.assertEqual(status['2025-06-03'], 'Present')
+        self.assertEqual(rows[2]['check_in'], '08:45:00')
+        self.assertEqual(status['2025-06-07'], 'Weekend')
+        self.assertEqual(status['2025-06-11'], 'Absent')  # pending leave
+        self.assertEqual(status['2025-06-16'], 'Absent')  # rejected leave
+        self.assertEqual(status['2025-06-30'], 'On Leave')
+
+    def test_query_count_does_not_grow_with_leaves(self):
+        self.add_leaves(*((date(2025, 2, day), date(2025, 2, day + 1), 'approved') for day in range(1, 29, 2)))
+        with self.assertNumQueries(2):
+            rows = month_report(self.student, 2025, 2, today=date(2025, 7, 15))
+        self.assertEqual(sum(row['status'] == 'On Leave' for row in rows), 24)  # 28 days minus 4 Saturdays
+
+    def test_view(self):
+        session = self.client.session
+        session['student_id'] = self.student.student_id
+        session.save()
+        # session + student + attendance + leaves
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('attendance_report'), {'month': 6, 'year': 2025})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_present'], 2)
+        self.assertEqual(response.context['total_leave'], 8)
+
+    def test_excel_export(self):
+        from openpyxl import load_workbook
+
+        session = self.client.session
+        session['student_id'] = self.student.student_id
+        session.save()
+        response = self.client.get(reverse('attendance_report'), {'month': 6, 'year': 2025, 'format': 'excel'})
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0], ('Date', 'Day', 'Status', 'Check-In', 'Check-Out'))
+        self.assertEqual(rows[3][2:4], ('Present', '08:45:00'))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class AttendanceSinkTests(TestCase):
+    def setUp(self):
+        self.students = [make_student(f"Student {i}", f"s{i}@example.com") for i in range(10)]
+        self.sessions = OpenSessionCache()
+
+    def at(self, hour, minute=0, second=0):
+        return timezone.make_aware(datetime.combine(timezone.localdate(), time_of_day(hour, minute, second)))
+
+    def flush(self, events, min_interval_seconds=60, sessions=None):
+        sink = AttendanceSink(min_interval_seconds, sessions=sessions)
+        for student, when in events:
+            sink.add(student.student_id, when)
+        return [status for _, status, _ in sink.flush()]
+
+    def sessions_of(self, student):
+        return list(Attendance.objects.filter(student=student).order_by("id").values_list("check_in", "check_out"))
+
+    def test_check_in_out_and_in_again_in_one_batch(self):
+        student = self.students[0]
+        statuses = self.flush([(student, self.at(9)), (student, self.at(10)), (student, self.at(11))])
+        self.assertEqual(statuses, [CHECK_IN, CHECK_OUT, CHECK_IN])
+        self.assertEqual(self.sessions_of(student), [(self.at(9), self.at(10)), (self.at(11), None)])
+        self.assertEqual(AttendanceDailySummary.objects.get(student=student).sessions, 2)
+
+    def test_checkout_waits_min_interval(self):
+        student = self.students[0]
+        statuses = self.flush([(student, self.at(9)), (student, self.at(9, 0, 20)), (student, self.at(9, 1))])
+        self.assertEqual(statuses, [CHECK_IN, "Wait 40s before checkout", CHECK_OUT])
+        self.assertEqual(self.sessions_of(student), [(self.at(9), self.at(9, 1))])
+
+        # An open session from an earlier batch counts too
+        self.assertEqual(self.flush([(student, self.at(10))]), [CHECK_IN])
+        self.assertEqual(self.flush([(student, self.at(10, 0, 30))]), ["Wait 30s before checkout"])
+
+    def test_several_students_interleaved(self):
+        a, b = self.students[:2]
+        self.flush([(a, self.at(8))])  # a already has an open session
+        statuses = self.flush([(b, self.at(9)), (a, self.at(9)), (b, self.at(10)), (a, self.at(10))])
+        self.assertEqual(statuses, [CHECK_IN, CHECK_OUT, CHECK_OUT, CHECK_IN])
+        self.assertEqual(self.sessions_of(a), [(self.at(8), self.at(9)), (self.at(10), None)])
+        self.assertEqual(self.sessions_of(b), [(self.at(9), self.at(10))])
+
+    def test_queries_per_batch_do_not_grow_with_students(self):
+        first_two, everyone = self.students[:2], self.students
+
+        # latest sessions, savepoint, insert, summaries (savepoint, read, upsert, release), release
+        with self.assertNumQueries(8):
+            self.flush([(student, self.at(9)) for student in first_two])
+
+        # Two check-outs and eight check-ins, then the reverse: one insert and one update in total
+        events = [(student, self.at(10)) for student in everyone] + [(student, self.at(11)) for student in everyone]
+        with self.assertNumQueries(9):
+            statuses = self.flush(events)
+        self.assertEqual(statuses.count(CHECK_OUT), 10)
+
+        # A warm open-session cache answers the lookup without a query
+        self.sessions.warm()
+        with self.assertNumQueries(8):
+            self.flush([(student, self.at(12)) for student in everyone], sessions=self.sessions)
+        self.assertEqual(Attendance.objects.count(), 2 + 8 + 2 + 8)
+
+    def test_face_success_view(self):
+        session_cache.reset()
+        self.addCleanup(session_cache.reset)
+        url = reverse("face_success", args=[self.students[0].student_id])
+        self.assertEqual(self.client.get(url).context["status"], CHECK_IN)
+        self.assertEqual(self.client.get(url).context["status"], CHECK_OUT)  # no wait from the kiosk page
+        self.assertEqual(len(self.sessions_of(self.students[0])), 1)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class OpenSessionCacheTests(TestCase):
+    def setUp(self):
+        self.students = [make_student(f"Student {i}", f"s{i}@example.com") for i in range(3)]
+        self.ids = [student.student_id for student in self.students]
+        self.sessions = OpenSessionCache()
+        self.now = timezone.now()
+
+    def check_in(self, student_id, when=None, sessions=None):
+        sink = AttendanceSink(min_interval_seconds=0, sessions=sessions or self.sessions)
+        sink.add(student_id, when or self.now)
+        return sink.flush()[0][1]
+
+    def test_warm_then_lookups_need_no_queries(self):
+        Attendance.objects.create(student=self.students[0], date=timezone.localdate(), check_in=self.now)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.sessions.warm(), 1)
+        with self.assertNumQueries(0):
+            latest = self.sessions.lookup(self.ids)
+        self.assertIsNone(latest[self.ids[0]].check_out)
+        self.assertIsNone(latest[self.ids[1]])  # warmed: no row means no session today
+
+    def test_write_through(self):
+        self.sessions.warm()
+        self.check_in(self.ids[1])
+        with self.assertNumQueries(0):
+            record = self.sessions.lookup([self.ids[1]])[self.ids[1]]
+        self.assertEqual(record.pk, Attendance.objects.get(student=self.students[1]).pk)
+
+    @mock.patch("attendance.session_cache.EPOCH_CHECK_INTERVAL", 0)
+    def test_admin_edit_in_another_process_invalidates(self):
+        self.check_in(self.ids[0])
+        self.sessions.warm()
+
+        # The admin (another process) deletes the session and publishes the change
+        Attendance.objects.filter(student=self.students[0]).delete()
+        OpenSessionCache().publish_change()
+
+        with self.assertNumQueries(1):  # re-warm
+            self.assertIsNone(self.sessions.lookup([self.ids[0]])[self.ids[0]])
+        self.assertEqual(self.check_in(self.ids[0]), CHECK_IN)
+
+    @mock.patch("attendance.session_cache.EPOCH_CHECK_INTERVAL", 0)
+    def test_concurrent_publishes_are_all_seen(self):
+        kiosk, admin = OpenSessionCache(), OpenSessionCache()
+        kiosk.warm()
+        self.sessions.warm()
+        # Both bump from the same epoch; whichever lands last, the epoch moved
+        kiosk.publish_change()
+        admin.publish_change()
+        for instance in (kiosk, self.sessions):
+            with self.assertNumQueries(1):
+                instance.lookup(self.ids)
+
+    def test_resets_at_midnight_in_kathmandu(self):
+        # 23:55 and 00:05 Asia/Kathmandu (UTC+5:45)
+        before = datetime(2025, 6, 1, 18, 10, tzinfo=dt_timezone.utc)
+        after = datetime(2025, 6, 1, 18, 20, tzinfo=dt_timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=before):
+            self.assertEqual(self.check_in(self.ids[0], before), CHECK_IN)
+            self.assertIsNotNone(self.sessions.lookup([self.ids[0]])[self.ids[0]])
+        with mock.patch("django.utils.timezone.now", return_value=after):
+            with self.assertNumQueries(1):  # new day: re-warm
+                self.assertIsNone(self.sessions.lookup([self.ids[0]])[self.ids[0]])
+            self.assertEqual(self.check_in(self.ids[0], after), CHECK_IN)  # not a check-out of yesterday's
+        self.assertEqual(
+            sorted(Attendance.objects.values_list("date", flat=True)), [date(2025, 6, 1), date(2025, 6, 2)]
+        )
+
+
+class DailySummaryTests(TestCase):
+    def setUp(self):
+        self.student = make_student()
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(timezone.localdate(), time_of_day(hour, minute)))
+
+    def summary(self):
+        return AttendanceDailySummary.objects.get(student=self.student, date=timezone.localdate())
+
+    def test_sink_keeps_summary_current(self):
+        sink = AttendanceSink(min_interval_seconds=0, sessions=None)
+        for when in (self.at(9), self.at(10), self.at(10, 30), self.at(12)):
+            sink.add(self.student.student_id, when)
+            sink.flush()
+
+        summary = self.summary()
+        self.assertEqual((summary.first_in, summary.last_out), (self.at(9), self.at(12)))
+        self.assertEqual(summary.sessions, 2)
+        self.assertEqual(summary.present_seconds, int(2.5 * 3600))
+        self.assertEqual(summary.break_seconds, 30 * 60)
+
+    def test_admin_delete_refreshes_summary(self):
+        sink = AttendanceSink(min_interval_seconds=0, sessions=None)
+        sink.add(self.student.student_id, self.at(9))
+        sink.flush()
+        self.assertEqual(self.summary().sessions, 1)
+
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:attendance_bulk_delete_confirm'), {
+            'student_id': self.student.student_id, 'student_name': self.student.name,
+            'date': timezone.localdate().isoformat(), 'remarks': "duplicate",
+        })
+        self.assertFalse(AttendanceDailySummary.objects.exists())
+
+    def test_rebuild_command_only_touches_range(self):
+        for day in (1, 2, 3):
+            Attendance.objects.create(student=self.student, date=date(2025, 3, day),
+                                      check_in=datetime(2025, 3, day, 3, tzinfo=dt_timezone.utc),
+                                      check_out=datetime(2025, 3, day, 5, tzinfo=dt_timezone.utc))
+        call_command("rebuild_daily_summaries", "--from", "2025-03-02", "--to", "2025-03-03", stdout=io.StringIO())
+
+        summaries = AttendanceDailySummary.objects.order_by('date')
+        self.assertEqual([s.date.day for s in summaries], [2, 3])
+        self.assertEqual(summaries[0].present_seconds, 7200)
+
+
+@override_settings(
+    ATTENDANCE_ADMIN={"PAGE_SIZE": 3},
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class DailySummaryAdminTests(TestCase):
+    def setUp(self):
+        self.students = [make_student(f"Student {i}", f"s{i}@example.com") for i in range(3)]
+        Student.objects.filter(pk=self.students[2].pk).update(course="BBA")
+        AttendanceDailySummary.objects.bulk_create(
+            AttendanceDailySummary(student=student, date=date(2025, 6, day), sessions=1)
+            for student in self.students for day in (1, 2, 3)
+        )
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.url = reverse('admin:attendance_attendance_changelist')
+
+    def keys(self, rows):
+        return [(row['date'].day, row['student_id']) for row in rows]
+
+    def test_keyset_pages_cover_everything_once(self):
+        summary = AttendanceDailySummary.objects.values("date", "student_id")
+        expected = self.keys(summary.order_by("-date", "-student_id"))
+
+        seen, after = [], None
+        while True:
+            rows, has_older, _ = summary_page(summary, after=after, size=4)
+            seen += self.keys(rows)
+            if not has_older:
+                break
+            after = (rows[-1]['date'], rows[-1]['student_id'])
+        self.assertEqual(seen, expected)
+
+        # "Newer" from the last page (which starts at row 8) is rows 4-7
+        rows, has_older, has_newer = summary_page(summary, before=(rows[0]['date'], rows[0]['student_id']), size=4)
+        self.assertEqual(self.keys(rows), expected[4:8])
+        self.assertTrue(has_older and has_newer)
+
+    def test_changelist_pages_and_filters(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['daily_summary']), 3)
+        self.assertEqual(response.context['summary_counts'], {"days": 9, "students": 3, "sessions": 9})
+        self.assertIsNone(response.context['newer_url'])
+
+        response = self.client.get(self.url + response.context['older_url'])
+        self.assertEqual([row['date'].day for row in response.context['daily_summary']], [2, 2, 2])
+        self.assertIsNotNone(response.context['newer_url'])
+
+        response = self.client.get(self.url, {"course": "BBA", "from": "2025-06-02"})
+        self.assertEqual(self.keys(response.context['daily_summary']),
+                         [(3, self.students[2].pk), (2, self.students[2].pk)])
+        self.assertEqual(response.context['summary_counts']["days"], 2)
+        self.assertIsNone(response.context['older_url'])
+
+    def test_counts_cached_until_summaries_change(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(summary_counts(AttendanceDailySummary.objects.all(), "")["days"], 9)
+
+        # Counts are invalidated only once the rebuild's transaction commits
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            rebuild_summaries(date(2025, 6, 3), date(2025, 6, 3))  # no sessions: drops that day
+            self.assertEqual(summary_counts(AttendanceDailySummary.objects.all(), "")["days"], 9)
+        self.assertEqual(len(callbacks), 1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['summary_counts']["days"], 6)
+
+    def test_every_bump_publishes_a_new_token(self):
+        tokens = set()
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_version()
+            tokens.add(cache.get(VERSION_KEY))
+        self.assertEqual(len(tokens), 3)
+        self.assertNotIn(None, tokens)
+
+    def test_actions_run_from_summary_page(self):
+        sessions = [Attendance.objects.create(student=student, date=date(2025, 6, 1)) for student in self.students[:2]]
+        response = self.client.post(self.url, {
+            "action": "delete_daily_attendance_action",
+            "_selected_action": [session.pk for session in sessions],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Attendance.objects.exists())
+        self.assertEqual(AttendanceDailySummary.objects.filter(date=date(2025, 6, 1)).count(), 1)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class AttendanceFromVideoTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.video = os.path.join(self.tmp, "lecture.avi")
+        write_test_video(self.video, frames=12)
+
+    def test_unknown_frame_count_is_read_sequentially(self):
+        with mock.patch("attendance.batch.video_info", return_value=(25.0, 0)):
+            self.assertEqual(video_segments(self.video, 4), [(self.video, 0, None)])
+
+        batch._worker.update(
+            batcher=FaceBatcher(FixedDetector(), MeanEmbedder(), min_face_size=8),
+            matcher=BrightnessMatcher(), threshold=0.6,
+        )
+        self.addCleanup(batch._worker.clear)
+        result = process_segment(self.video, 0, None, stride=3)
+        self.assertEqual(result["frames"], 4)  # frames 0, 3, 6, 9 of 12
+        self.assertEqual(sum(hits for _, _, hits in result["sightings"].values()), 4)
+
+    def test_unknown_length_needs_start(self):
+        with mock.patch("attendance.management.commands.attendance_from_video.video_info", return_value=(25.0, 0)):
+            with self.assertRaisesMessage(CommandError, "pass --start"):
+                call_command("attendance_from_video", self.video, stdout=io.StringIO())
+
+    @override_settings(FACE_PIPELINE={"MAX_BATCH": 4})
+    def test_missing_pipeline_settings_use_defaults(self):
+        stats = {"decoded": {self.video: 12}, "frames": 12, "faces": 0, "seconds": 1.0,
+                 "frames_per_second": 12.0, "faces_per_second": 0.0}
+        module = "attendance.management.commands.attendance_from_video"
+        with mock.patch(f"{module}.ProcessPoolExecutor") as executor, \
+                mock.patch(f"{module}.recognize_videos", return_value=({}, stats)):
+            call_command("attendance_from_video", self.video, "--dry-run", stdout=io.StringIO())
+        pipeline_options = executor.call_args.kwargs["initargs"][2]
+        self.assertEqual(pipeline_options, {"max_batch": 4, "min_face_size": 80, "detection_scale": 1.0})
+
+    def test_write_attendance_updates_summaries_and_open_sessions(self):
+        student = make_student()
+        sessions = OpenSessionCache()
+        sessions.warm()
+        today = timezone.localdate()
+        now = timezone.now()
+
+        command = AttendanceFromVideoCommand(stdout=io.StringIO(), stderr=io.StringIO())
+        written = command.write_attendance({(str(student.student_id), today): [now - timedelta(hours=1), now, 5]})
+        self.assertEqual(written, 1)
+        self.assertEqual(AttendanceDailySummary.objects.get(student=student, date=today).sessions, 1)
+
+        # A warm recognizer cache sees the change at its next epoch check
+        with mock.patch("attendance.session_cache.EPOCH_CHECK_INTERVAL", 0):
+            latest = sessions.lookup([student.student_id])[student.student_id]
+        self.assertIsNotNone(latest)
+        self.assertEqual(latest.check_out, now)
+
+        # Re-running over the same recording writes nothing new
+        self.assertEqual(command.write_attendance({(str(student.student_id), today): [now - timedelta(hours=1), now, 5]}), 0)
+
+
+    def test_single_sighting_session_is_closed(self):
+        student = make_student()
+        seen = timezone.now() - timedelta(hours=2)
+        command = AttendanceFromVideoCommand(stdout=io.StringIO(), stderr=io.StringIO())
+        command.write_attendance({(str(student.student_id), timezone.localtime(seen).date()): [seen, seen, 3]})
+
+        record = Attendance.objects.get(student=student)
+        self.assertEqual(record.check_out, seen)
+        # A live sighting afterwards starts a new session rather than closing the recorded one
+        self.assertEqual(mark_attendance(student, min_interval_seconds=60)[0], CHECK_IN)
+
+class AttendanceExportTests(TestCase):
+    def setUp(self):
+        self.students = [make_student(f"Student {i}", f"s{i}@example.com") for i in range(3)]
+        Student.objects.filter(pk=self.students[2].pk).update(course="BBA")
+        Attendance.objects.bulk_create(
+            Attendance(
+                student=student, date=date(2025, 6, day),
+                check_in=datetime(2025, 6, day, 3, 0, tzinfo=dt_timezone.utc),
+                check_out=datetime(2025, 6, day, 5, 15, tzinfo=dt_timezone.utc),
+            )
+            for student in self.students for day in (1, 2, 3)
+        )
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.url = reverse('admin:attendance_export')
+
+    def test_csv_per_course_range(self):
+        response = self.client.get(self.url, {"course": "BBA", "from": "2025-06-02", "format": "csv"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        pk = self.students[2].pk
+        self.assertEqual(lines, [
+            "Student ID,Name,Course,Date,Check-In,Check-Out",
+            f"{pk},Student 2,BBA,2025-06-02,08:45:00,11:00:00",
+            f"{pk},Student 2,BBA,2025-06-03,08:45:00,11:00:00",
+        ])
+
+    def test_xlsx_per_student_and_everyone(self):
+        from openpyxl import load_workbook
+
+        def sheet_rows(params):
+            response = self.client.get(self.url, {**params, "format": "xlsx"})
+            self.assertEqual(response.status_code, 200)
+            return list(load_workbook(io.BytesIO(b"".join(response.streaming_content))).active.values)
+
+        rows = sheet_rows({"student": self.students[0].pk, "to": "2025-06-01"})
+        self.assertEqual(rows[1:], [(self.students[0].pk, "Student 0", "BIT", "2025-06-01", "08:45:00", "11:00:00")])
+        self.assertEqual(len(sheet_rows({})), 10)  # header + every session
+
+        self.assertEqual(self.client.get(self.url, {"format": "pdf"}).status_code, 400)
+
+    async def asgi_export(self, params, keep=False):
+        """
+        GET the export through the ASGI handler; returns (response, body, traced
+        peak). Only the body's size is kept unless `keep`, so the peak is the view's.
+        """
+        await self.async_client.aforce_login(await User.objects.aget(username="admin"))
+        tracemalloc.start()
+        response = await self.async_client.get(self.url, params)
+        body, size = [], 0
+        async for chunk in response.streaming_content:
+            size += len(chunk)
+            if keep:
+                body.append(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertTrue(response.is_async)  # a sync iterator would be buffered by Django under ASGI
+        return response, b"".join(body) if keep else size, peak
+
+    async def test_asgi_memory_does_not_grow_with_rows(self):
+        async def peak(days):
+            await Attendance.objects.filter(date__gt=date(2025, 6, 3)).adelete()
+            await Attendance.objects.abulk_create(
+                Attendance(student=student, date=date(2025, 7, 1) + timedelta(days=day))
+                for student in self.students for day in range(days)
+            )
+            _, size, peak = await self.asgi_export({"format": "csv"})
+            return size, peak
+
+        (small_size, small), (large_size, large) = await peak(1000), await peak(5000)  # 3,000 vs 15,000 rows
+        self.assertGreater(large_size, small_size * 4)
+        self.assertLess(large, small * 1.5)
+
+    async def test_asgi_xlsx(self):
+        from openpyxl import load_workbook
+
+        response, body, _ = await self.asgi_export({"format": "xlsx", "course": "BBA"}, keep=True)
+        self.assertEqual(int(response["Content-Length"]), len(body))
+        self.assertIn('attachment; filename="attendance_BBA.xlsx"', response["Content-Disposition"])
+        rows = list(load_workbook(io.BytesIO(body)).active.values)
+        self.assertEqual([row[3] for row in rows[1:]], ["2025-06-01", "2025-06-02", "2025-06-03"])
@@ -0,0 +1,196 @@
+# attendance/tracking.py
+import itertools
+import time
+
+import cv2
+import numpy as np
+
+MOTION_THUMB_SIZE = (64, 48)
+
+
+# ----------------------------
+# HELPERS
+# ----------------------------
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def create_box_tracker(kind):
+    """
+    Return a new OpenCV single-object tracker, or None for plain IoU tracking.
+    KCF needs opencv-contrib; when it is missing we fall back to MIL.
+    """
+    if kind == "iou":
+        return None
+    factories = {
+        "kcf": ["TrackerKCF_create", "legacy.TrackerKCF_create", "TrackerMIL_create"],
+        "mil": ["TrackerMIL_create"],
+    }
+    for name in factories.get(kind, []):
+        factory = cv2
+        try:
+            for attr in name.split("."):
+                factory = getattr(factory, attr)
+        except AttributeError:
+            continue
+        return factory()
+    return None
+
+
+class Track:
+    """One face followed across frames, embedded until it has an identity."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, box, frame_index):
+        self.track_id = next(self._ids)
+        self.box = box
+        self.student_id = None
+        self.score = 0.0
+        self.status = ""
+        self.embed_attempts = 0
+        self.misses = 0
+        self.last_detected = frame_index
+        self.created_at = time.time()
+        self.box_tracker = None
+
+    @property
+    def identified(self):
+        return self.student_id is not None
+
+    def identify(self, student_id, score):
+        self.embed_attempts += 1
+        self.score = score
+        if student_id is not None:
+            self.student_id = student_id
+
+
+# ----------------------------
+# TRACKER
+# ----------------------------
+class FaceTracker:
+    """
+    Detect-once, track-between-detections state for the recognition loop.
+
+    Full detection runs every `detect_every` frames, when the scene moved more
+    than `motion_threshold` (mean abs grey-level difference on a small
+    thumbnail) or when nothing is tracked. In between, boxes are propagated
+    with an OpenCV tracker, or simply held for plain IoU tracking. A track is
+    dropped after `max_misses` detection passes without a matching face.
+    """
+
+    def __init__(self, detect_every=10, motion_threshold=12.0, iou_threshold=0.3,
+                 max_misses=2, max_embed_attempts=3, box_tracker="iou"):
+        self.detect_every = detect_every
+        self.motion_threshold = motion_threshold
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.max_embed_attempts = max_embed_attempts
+        self.box_tracker = box_tracker
+
+        self.tracks = []
+        self.frame_index = 0
+        self.last_detection_frame = None
+        self._last_thumb = None
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def should_detect(self, frame):
+        """Advance the frame counter and decide whether to run full detection."""
+        self.frame_index += 1
+        if not self.tracks or self.last_detection_frame is None:
+            return True
+        if self.frame_index - self.last_detection_frame >= self.detect_every:
+            return True
+        if self.motion_threshold:
+            motion = np.abs(self._thumbnail(frame) - self._last_thumb).mean()
+            return motion > self.motion_threshold
+        return False
+
+    def update(self, frame, boxes):
+        """
+        Match fresh detections to existing tracks (greedy IoU).
+        Returns the tracks that still need an embedding.
+        """
+        self.last_detection_frame = self.frame_index
+        if self.motion_threshold:
+            self._last_thumb = self._thumbnail(frame)
+
+        pairs = sorted(
+            ((iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True,
+        )
+        matched_tracks, matched_boxes = set(), set()
+        for overlap, t, b in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            track = self.tracks[t]
+            track.box = boxes[b]
+            track.misses = 0
+            track.last_detected = self.frame_index
+            self._start_box_tracker(track, frame)
+
+        alive = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            alive.append(track)
+
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                track = Track(box, self.frame_index)
+                self._start_box_tracker(track, frame)
+                alive.append(track)
+
+        self.tracks = alive
+        return [
+            track for track in self.tracks
+            if not track.identified
+            and track.last_detected == self.frame_index
+            and track.embed_attempts < self.max_embed_attempts
+        ]
+
+    def propagate(self, frame):
+        """Move every track to its position in `frame` without running detection."""
+        for track in self.tracks:
+            if track.box_tracker is None:
+                continue
+            ok, box = track.box_tracker.update(frame)
+            if ok:
+                x, y, w, h = (int(v) for v in box)
+                track.box = (max(0, x), max(0, y), w, h)
+
+    def _start_box_tracker(self, track, frame):
+        track.box_tracker = create_box_tracker(self.box_tracker)
+        if track.box_tracker is not None:
+            track.box_tracker.init(frame, tuple(int(v) for v in track.box))
+
+
+def face_tracker_from_settings():
+    """FaceTracker configured from settings.FACE_TRACKING."""
+    from django.conf import settings
+
+    config = getattr(settings, "FACE_TRACKING", {})
+    return FaceTracker(
+        detect_every=config.get("DETECT_EVERY", 10),
+        motion_threshold=config.get("MOTION_THRESHOLD", 12.0),
+        iou_threshold=config.get("IOU_THRESHOLD", 0.3),
+        max_misses=config.get("MAX_MISSES", 2),
+        max_embed_attempts=config.get("MAX_EMBED_ATTEMPTS", 3),
+        box_tracker=config.get("BOX_TRACKER", "iou"),
+    )
@@ -12,6 +12,7 @@ urlpatterns = [
     path('camera_feed/', views.camera_feed, name='camera_feed'),
     path('start_capture_api/<int:student_id>/', views.start_capture_api, name='start_capture_api'),
     path('check_progress/<int:student_id>/', views.check_capture_progress, name='check_progress'),
+    path('capture_progress_stream/<int:student_id>/', views.capture_progress_stream, name='capture_progress_stream'),
     path('face_success/<int:student_id>/', views.face_success, name='face_success'),
     path('logout/', views.logout_view, name='logout'),
     path('course/', views.course_view, name='course'),
@@ -1,22 +1,20 @@
-from datetime import date, timedelta
+from datetime import date
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.hashers import make_password, check_password
 from .forms import StudentForm
-from .models import Student, Attendance, PasswordReset
-from collections import defaultdict
+from .models import Student, PasswordReset
 from django.contrib import messages
 from django.contrib.auth import login
 from .utils import export_attendance_pdf
-import calendar
-import pandas as pd
-import cv2
-import numpy as np
-import os
-import threading
-import time
-from keras_facenet import FaceNet
-from mtcnn import MTCNN
+from .marking import mark_attendance
+from .reports import month_report
+from .exports import REPORT_HEADER, export_response, report_rows
+from .face_models import face_models
+from .camera import camera_hub_from_settings, default_camera
+from .capture_jobs import capture_progress, capture_runner_from_settings, capture_state, request_cancel
+from .streaming import mjpeg_broadcaster_from_settings, progress_events, aprogress_events
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.mail import EmailMessage
@@ -27,14 +25,13 @@ from django.views.decorators.csrf import csrf_exempt
 from .models import LeaveRequest
 from django.views.decorators.http import require_POST
 import json
-from django.db.models import Min, Max
 
-# In-memory capture state
-capture_progress = defaultdict(lambda: {"count": 0, "done": False})
+# One reader per camera, shared by the MJPEG stream and face capture
+camera_hub = camera_hub_from_settings()
+mjpeg = mjpeg_broadcaster_from_settings(camera_hub)  # encodes each frame once for all viewers
 
-# Load models
-embedder = FaceNet()
-detector = MTCNN()
+# Face captures run as CaptureJob rows on a small per-process worker pool
+capture_runner = capture_runner_from_settings(camera_hub, face_models.face_batcher)
 
 # ⬛⬛⬛ AUTH / FORM VIEWS ⬛⬛⬛
 def student_login_view(request):
@@ -66,111 +63,15 @@ def attendance_report_view(request):
     month = int(request.GET.get('month', today.month))
     year = int(request.GET.get('year', today.year))
 
-    # Calculate days in month
-    _, num_days = calendar.monthrange(year, month)
-    last_day_date = date(year, month, num_days)
-    
-    # We only show records up to 'today' if viewing current month
-    limit_date = min(last_day_date, today)
-    all_dates = [date(year, month, day) for day in range(1, limit_date.day + 1)]
-
-    # 1. Fetch Attendance
-    # 1. Fetch and aggregate Attendance
-    attendance_agg = Attendance.objects.filter(
-    student=student, date__year=year, date__month=month
-).values('date').annotate(
-    first_check_in=Min('check_in'),
-    last_check_out=Max('check_out')
-)
-
-
-    attendance_map = {
-    rec['date']: {
-        'check_in': rec['first_check_in'],
-        'check_out': rec['last_check_out']
-    } for rec in attendance_agg
-}
-
-    # 2. Fetch Approved Leave Requests
-    leaves = LeaveRequest.objects.filter(
-        student=student, 
-        from_date__lte=last_day_date, 
-        to_date__gte=date(year, month, 1)
-    )
-
-    # 3. Comprehensive Nepali Public Holidays 2026
-    public_holidays = {
-        date(2026, 1, 11): "Prithvi Jayanti",
-        date(2026, 1, 14): "Maghe Sankranti",
-        date(2026, 1, 30): "Martyrs' Day",
-        date(2026, 2, 15): "Maha Shivaratri",
-        date(2026, 2, 18): "Gyalpo Lhosar",
-        date(2026, 2, 19): "Prajatantra Diwas",
-        date(2026, 3, 2): "Holi (Hilly Region)",
-        date(2026, 3, 3): "Holi (Terai Region)",
-        date(2026, 3, 8): "Women's Day",
-        date(2026, 4, 14): "Nepali New Year",
-        date(2026, 5, 1): "Labour Day / Buddha Jayanti",
-        date(2026, 5, 29): "Republic Day",
-        date(2026, 9, 19): "Constitution Day",
-        date(2026, 10, 21): "Dashain (Vijaya Dashami)",
-        date(2026, 11, 11): "Bhai Tika (Tihar)",
-    }
-
-    attendance_status = []
-    for d in all_dates:
-        record = attendance_map.get(d)
-        on_leave = leaves.filter(from_date__lte=d, to_date__gte=d).exists()
-        holiday_name = public_holidays.get(d)
-        is_saturday = (d.weekday() == 5)
-
-        # Determine Logic Status
-        if is_saturday:
-            status = 'Weekend'
-        elif holiday_name:
-            status = f'Holiday ({holiday_name})'
-        elif on_leave:
-            status = 'On Leave'
-        elif record:
-            status = 'Present'
-        else:
-            status = 'Absent'
-
-        # Calculate times with Nepal timezone conversion (+5:45)
-        check_in_str = "—"
-        check_out_str = "—"
-
-        if record and record['check_in']:
-            # Convert UTC to Nepal Time (UTC+5:45)
-            utc_time = record['check_in']
-            nepal_time = utc_time + timedelta(hours=5, minutes=45)
-            check_in_str = nepal_time.strftime("%H:%M:%S")
-
-        if record and record['check_out']:
-            # Convert UTC to Nepal Time (UTC+5:45)
-            utc_time = record['check_out']
-            nepal_time = utc_time + timedelta(hours=5, minutes=45)
-            check_out_str = nepal_time.strftime("%H:%M:%S")
-
-        attendance_status.append({
-            'date': d.strftime("%Y-%m-%d"),
-            'day': d.strftime("%A"),
-            'status': status,
-            'check_in': check_in_str,
-            'check_out': check_out_str,
-        })
+    attendance_status = month_report(student, year, month, today)
 
     # Export Logic
     export_format = request.GET.get('format')
-    if export_format == 'excel':
-        df = pd.DataFrame(attendance_status)
-        df.columns = ['Date', 'Day', 'Status', 'Check-In', 'Check-Out']
-        response = HttpResponse(content_type='application/vnd.ms-excel')
-        response['Content-Disposition'] = f'attachment; filename=attendance_{year}_{month}.xlsx'
-        df.to_excel(response, index=False)
-        return response
-    
-    elif export_format == 'pdf':
+    if export_format in ('csv', 'xlsx', 'excel'):
+        return export_response(request, export_format, REPORT_HEADER, report_rows(attendance_status),
+                               f'attendance_{year}_{month}', title=f'{year}-{month:02d}')
+
+    if export_format == 'pdf':
         # Ensure your utils.py accepts the new status field in attendance_status
         return export_attendance_pdf(request, student, attendance_status, month, year)
 
@@ -286,29 +187,14 @@ def register_view(request):
     return render(request, 'attendance/signup.html', {'form': StudentForm()})
 
 # ⬛⬛⬛ MJPEG STREAM VIEW ⬛⬛⬛
-def gen_frames():
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("❌ Failed to open camera stream.")
-        return
-
-    while True:
-        success, frame = cap.read()
-        if not success:
-            continue
-
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
-        frame_bytes = buffer.tobytes()
-
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n\r\n')
-
-    cap.release()
-
-def camera_feed(request):
-    return StreamingHttpResponse(gen_frames(),
+async def camera_feed(request):
+    # Under ASGI every viewer is a coroutine waiting on the broadcaster;
+    # under WSGI (runserver, gunicorn sync workers) fall back to a sync generator.
+    if isinstance(request, ASGIRequest):
+        frames = mjpeg.astream(default_camera())
+    else:
+        frames = mjpeg.stream(default_camera())
+    return StreamingHttpResponse(frames,
         content_type='multipart/x-mixed-replace; boundary=frame')
 
 # ⬛⬛⬛ FACE REGISTRATION VIEWS ⬛⬛⬛
@@ -319,106 +205,29 @@ def register_face(request, student_id):
 @csrf_exempt
 def start_capture_api(request, student_id):
     student = get_object_or_404(Student, student_id=student_id)
-    name = student.name
-    student_folder = os.path.join("faces", str(student_id))
-    os.makedirs(student_folder, exist_ok=True)
-
-    capture_progress[student_id] = {"count": 0, "done": False}
-    captured_embeddings = []
-
-    def capture_thread():
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            print("❌ Failed to open stream for capture.")
-            return
-
-        count = 0
-        while count < 10:
-            success, frame = cap.read()
-            if not success:
-                continue
-
-            try:
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                faces = detector.detect_faces(rgb_frame)
-
-                for face in faces:
-                    x, y, w, h = face['box']
-                    if w < 80 or h < 80:
-                        continue
-
-                    face_rgb = rgb_frame[y:y+h, x:x+w]
-                    face_rgb = cv2.resize(face_rgb, (160, 160))
-
-                    embedding = embedder.embeddings([face_rgb])[0]
-                    captured_embeddings.append(embedding)
-
-                    img_name = f"{name}_{count+1}.jpg"
-                    save_path = os.path.join(student_folder, img_name)
-                    cv2.imwrite(save_path, frame[y:y+h, x:x+w])
+    job = capture_runner.submit(student, default_camera())
+    return JsonResponse({'status': 'started', 'job_id': str(job.job_id)})
 
-                    count += 1
-                    capture_progress[student_id]['count'] = count
-                    print(f"✅ Captured {count}/10")
-
-                    time.sleep(0.5)
-                    break
-            except Exception as e:
-                print(f"⚠️ Error during capture: {e}")
-                continue
-
-        cap.release()
-
-        if captured_embeddings:
-            mean_embedding = np.mean(captured_embeddings, axis=0)
-            np.save(os.path.join(student_folder, f"{student_id}_embedding.npy"), mean_embedding)
-            print("✅ Embedding saved.")
-
-        capture_progress[student_id]['done'] = True
-        print("✅ Face capture complete.")
+def check_capture_progress(request, student_id):
+    return JsonResponse(capture_state(student_id))
 
-    threading.Thread(target=capture_thread).start()
-    return JsonResponse({'status': 'started'})
+async def capture_progress_stream(request, student_id):
+    """Server-Sent Events: pushes the capture job's progress whenever it changes."""
+    def read_state():
+        return capture_state(student_id)
 
-def check_capture_progress(request, student_id):
-    return JsonResponse(capture_progress.get(student_id, {"count": 0, "done": False}))
+    if isinstance(request, ASGIRequest):
+        events = aprogress_events(read_state, capture_progress, student_id)
+    else:
+        events = progress_events(read_state, capture_progress, student_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass events through immediately
+    return response
 
 def face_success(request, student_id):
     student = Student.objects.get(student_id=student_id)
-    today = date.today()
-    now = timezone.now()
-
-    # Latest attendance entry for today
-    last_record = (
-        Attendance.objects
-        .filter(student=student, date=today)
-        .order_by('-id')
-        .first()
-    )
-
-    # Case 1: no record today → first CHECK-IN
-    if last_record is None:
-        Attendance.objects.create(
-            student=student,
-            date=today,
-            check_in=now
-        )
-        status = "Check-In Successful"
-
-    # Case 2: open session → CHECK-OUT
-    elif last_record.check_out is None:
-        last_record.check_out = now
-        last_record.save()
-        status = "Check-Out Successful"
-
-    # Case 3: last session closed → start NEW CHECK-IN
-    else:
-        Attendance.objects.create(
-            student=student,
-            date=today,
-            check_in=now
-        )
-        status = "Check-In Successful"
+    status, now = mark_attendance(student, min_interval_seconds=0)
 
     return render(request, "attendance/face_success.html", {
         "student": student,
@@ -428,7 +237,7 @@ def face_success(request, student_id):
 
 
 def cancel_capture(request, student_id):
-    capture_progress[student_id] = {"count": 0, "done": True}
+    request_cancel(student_id)
     return JsonResponse({'status': 'cancelled'})
 
 @csrf_exempt
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_system.settings')
 
 application = get_asgi_application()
+
+# Optionally load the face models now rather than on the first capture request
+from attendance.face_models import warm_up_from_settings  # noqa: E402
+
+warm_up_from_settings()
@@ -150,3 +150,91 @@ JAZZMIN_SETTINGS = {
     "hide_models": ["admin.logentry"],
     # Customize the admin panel look further
 }
+
+# Face matching backend used by the recognizers.
+# "exact" scores every registered face; "ivf" switches to the approximate
+# IVF index (attendance/ann.py) once the gallery has MIN_SIZE rows.
+# Use scripts/ann_report.py to pick NLIST / NPROBE for a given gallery size.
+FACE_MATCHER = {
+    "BACKEND": "exact",
+    "MIN_SIZE": 20000,
+    "NLIST": None,   # None -> 4 * sqrt(gallery size)
+    "NPROBE": 8,     # ~0.98 recall@1 at 2.4x exact speed on 20k rows; 16 for ~0.99 (see IVFMatcher)
+    "AGGREGATE": "max",  # score of a student with several templates: "max" or "mean_top"
+    "TOP_N": 2,          # templates averaged by "mean_top"
+    "RELOAD_EVERY": 2.0,  # seconds between checks for a new gallery version in running recognizers
+}
+
+FACE_ENROLLMENT = {
+    "TEMPLATES": 5,          # most diverse good faces kept per student
+    "MAX_SIMILARITY": 0.95,  # faces closer than this to an already kept one count as duplicates
+}
+
+# Per-frame face pipeline (attendance/face_pipeline.py).
+# All faces of a frame are embedded together, at most MAX_BATCH per FaceNet call.
+FACE_PIPELINE = {
+    "MAX_BATCH": 16,
+    "MIN_FACE_SIZE": 80,
+    "DETECTION_SCALE": 1.0,      # e.g. 0.5 detects on a half-size frame; see scripts/bench_detect_scale.py
+    "TIMING_REPORT_EVERY": 100,  # frames between timing lines printed by the kiosk
+}
+
+# Detect-once, track-between-detections mode of the kiosk (attendance/tracking.py).
+# DETECT_EVERY = 1 runs MTCNN on every frame. BOX_TRACKER is "iou" (hold boxes
+# between detections), "mil" or "kcf" (OpenCV trackers; kcf needs opencv-contrib).
+FACE_TRACKING = {
+    "DETECT_EVERY": 10,
+    "MOTION_THRESHOLD": 12.0,
+    "IOU_THRESHOLD": 0.3,
+    "MAX_MISSES": 2,
+    "MAX_EMBED_ATTEMPTS": 3,
+    "BOX_TRACKER": "iou",
+}
+
+# Pipelined recognizer (attendance/engine.py, `python scripts/recognize.py --pipeline`).
+FACE_ENGINE = {
+    "WORKERS": 2,            # detection/embedding threads sharing the loaded models
+    "QUEUE_SIZE": 2,         # frames waiting for a worker; older frames are dropped
+    "WRITE_QUEUE_SIZE": 64,  # recognised students waiting for the attendance writer
+    "COOLDOWN": 5.0,         # seconds before the same student is written again
+    "WRITE_WINDOW": 0.5,     # seconds of recognitions written together in one transaction
+    "STATS_EVERY": 10.0,     # seconds between stage/queue reports
+}
+
+CAMERA_HUB = {
+    "SOURCE": "0",      # camera index, stream URL or video file used by the web app
+    "BUFFER_SIZE": 4,   # newest frames kept for subscribers that fall slightly behind
+}
+
+MJPEG_STREAM = {
+    "MAX_FPS": 15,        # frames encoded per second, shared by every viewer
+    "SCALE": 1.0,         # e.g. 0.5 streams at half width/height
+    "JPEG_QUALITY": 80,
+}
+
+CAPTURE_JOBS = {
+    "MAX_WORKERS": 2,   # capture threads per web process
+    "PER_CAMERA": 1,    # captures allowed on one camera at a time (across processes)
+    "IMAGES": 10,       # face images per registration
+    "TIMEOUT": 120.0,   # seconds before a queued/running capture is failed
+}
+
+FACE_MODELS = {
+    "WARM_UP": False,         # load MTCNN/FaceNet when the web server starts instead of on first use
+    "WORKER_ADDRESS": None,   # e.g. "127.0.0.1:6010": send frames to `manage.py inference_worker` (listens on localhost)
+    "AUTHKEY": os.getenv("FACE_WORKER_AUTHKEY"),  # required for the worker; its requests are unpickled
+}
+
+ATTENDANCE_ADMIN = {
+    "PAGE_SIZE": 50,             # daily summary rows per admin page
+    "COUNT_CACHE_SECONDS": 300,  # summary counts are also dropped whenever a summary changes
+}
+
+# Shared cache (used across processes, e.g. the kiosk and the web app, to
+# invalidate the open-session cache in attendance/session_cache.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+    }
+}
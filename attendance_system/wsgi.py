@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_system.settings')
 
 application = get_wsgi_application()
+
+# Optionally load the face models now rather than on the first capture request
+from attendance.face_models import warm_up_from_settings  # noqa: E402
+
+warm_up_from_settings()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from attendance.gallery import GalleryMatcher, l2_normalize
+from attendance.ann import IVFMatcher
+
+# ----------------------------
+# SYNTHETIC GALLERY
+# ----------------------------
+EMBEDDING_DIM = 512
+
+
+def synthetic_gallery(size, queries, noise, rng):
+    """
+    Random unit identities plus noisy probes of some of them, which is
+    roughly how FaceNet embeddings of the same person spread out.
+    """
+    gallery = l2_normalize(rng.standard_normal((size, EMBEDDING_DIM)))
+    truth = rng.choice(size, queries, replace=False)
+    probes = gallery[truth] + noise * l2_normalize(rng.standard_normal((queries, EMBEDDING_DIM)))
+    return gallery, [str(i) for i in range(size)], probes
+
+
+def timed_match(matcher, probes, k, **kwargs):
+    start = time.perf_counter()
+    ids, _ = matcher.match(probes, k=k, **kwargs)
+    return ids, (time.perf_counter() - start) * 1000 / len(probes)
+
+
+def recall(approx_ids, exact_ids):
+    """Fraction of the exact top-k that the approximate search also returned."""
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx_ids, exact_ids))
+    return hits / exact_ids.size
+
+
+# ----------------------------
+# MAIN
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF matcher against exact search.")
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.8)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gallery, ids, probes = synthetic_gallery(args.size, args.queries, args.noise, rng)
+
+    exact = GalleryMatcher(gallery, ids, normalized=True)
+    exact_ids, exact_ms = timed_match(exact, probes, args.k)
+    print(f"Gallery: {args.size} x {EMBEDDING_DIM}, {args.queries} queries, k={args.k}")
+    print(f"Exact search: {exact_ms:.3f} ms/query\n")
+
+    print(f"{'nlist':>6} {'nprobe':>7} {'build s':>8} {'ms/query':>9} {'speedup':>8} "
+          f"{'recall@1':>9} {'recall@k':>9}")
+    for nlist in args.nlist:
+        start = time.perf_counter()
+        ivf = IVFMatcher(gallery, ids, nlist=nlist, normalized=True)
+        build_s = time.perf_counter() - start
+
+        for nprobe in args.nprobe:
+            if nprobe > nlist:
+                continue
+            approx_ids, approx_ms = timed_match(ivf, probes, args.k, nprobe=nprobe)
+            print(f"{nlist:>6} {nprobe:>7} {build_s:>8.1f} {approx_ms:>9.3f} "
+                  f"{exact_ms / approx_ms:>7.1f}x "
+                  f"{recall(approx_ids[:, :1], exact_ids[:, :1]):>9.3f} "
+                  f"{recall(approx_ids, exact_ids):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from mtcnn import MTCNN
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from attendance.face_pipeline import FaceBatcher
+from attendance.tracking import iou
+
+KNOWN_FACES_DIR = os.path.join(BASE_DIR, "faces")
+
+
+# ----------------------------
+# SAMPLE FRAMES
+# ----------------------------
+def camera_frames(frame_size, face_height, limit):
+    """
+    Paste the stored face crops onto a camera-sized canvas so detection runs
+    on frames that look like the kiosk feed (small face, large background).
+    """
+    width, height = frame_size
+    rng = np.random.default_rng(0)
+    paths = sorted(glob.glob(os.path.join(KNOWN_FACES_DIR, "*", "*.jpg")))[:limit]
+
+    frames = []
+    for path in paths:
+        crop = cv2.imread(path)
+        if crop is None:
+            continue
+        scale = face_height / crop.shape[0]
+        crop = cv2.resize(crop, (int(crop.shape[1] * scale), face_height))
+        canvas = np.full((height, width, 3), 90, dtype=np.uint8)
+        x = int(rng.integers(0, width - crop.shape[1]))
+        y = int(rng.integers(0, height - crop.shape[0]))
+        canvas[y:y + crop.shape[0], x:x + crop.shape[1]] = crop
+        frames.append((os.path.relpath(path, KNOWN_FACES_DIR), cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)))
+    return frames
+
+
+def recall(reference, boxes, threshold=0.5):
+    """Fraction of reference boxes that have a detection with IoU >= threshold."""
+    if not reference:
+        return 1.0
+    return sum(any(iou(ref, box) >= threshold for box in boxes) for ref in reference) / len(reference)
+
+
+# ----------------------------
+# MAIN
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Detection latency and recall at several detection scales.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[1280, 720], metavar=("W", "H"))
+    parser.add_argument("--face-height", type=int, default=220, help="Face height in pixels on the full frame")
+    parser.add_argument("--limit", type=int, default=30, help="Number of stored images to use")
+    args = parser.parse_args()
+
+    frames = camera_frames(tuple(args.frame_size), args.face_height, args.limit)
+    if not frames:
+        print("❌ No sample images found in faces/.")
+        return
+
+    detector = MTCNN()
+    batchers = {scale: FaceBatcher(detector, embedder=None, detection_scale=scale) for scale in args.scales}
+    batchers.setdefault(1.0, FaceBatcher(detector, embedder=None))
+
+    # Full-resolution detections are the reference for recall.
+    batchers[1.0].detect(frames[0][1])  # warm-up
+    reference = {name: batchers[1.0].detect(frame)[0] for name, frame in frames}
+    print(f"{len(frames)} frames of {args.frame_size[0]}x{args.frame_size[1]}, "
+          f"{sum(map(len, reference.values()))} faces found at full resolution\n")
+
+    print(f"{'scale':>6} {'ms/frame':>9} {'speedup':>8} {'recall':>7} {'faces':>6}")
+    baseline_ms = None
+    for scale in args.scales:
+        batcher = batchers[scale]
+        batcher.detect(frames[0][1])  # warm-up
+        total_ms, recalls, found = 0.0, [], 0
+        for name, frame in frames:
+            start = time.perf_counter()
+            boxes, _ = batcher.detect(frame)
+            total_ms += (time.perf_counter() - start) * 1000
+            recalls.append(recall(reference[name], boxes))
+            found += len(boxes)
+
+        ms = total_ms / len(frames)
+        baseline_ms = baseline_ms or ms
+        print(f"{scale:>6.2f} {ms:>9.1f} {baseline_ms / ms:>7.1f}x {np.mean(recalls):>7.3f} {found:>6}")
+
+
+if __name__ == "__main__":
+    main()
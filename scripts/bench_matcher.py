@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from attendance.gallery import GalleryMatcher
+
+# ----------------------------
+# SYNTHETIC GALLERY
+# ----------------------------
+EMBEDDING_DIM = 512
+
+
+def synthetic_gallery(size, rng):
+    embeddings = rng.standard_normal((size, EMBEDDING_DIM)).astype(np.float32)
+    ids = [str(i) for i in range(size)]
+    return embeddings, ids
+
+
+def legacy_match(embedding, known_face_encodings):
+    """The old per-identity loop from recognize_face, for comparison."""
+    from sklearn.metrics.pairwise import cosine_similarity
+    similarities = [cosine_similarity([embedding], [enc])[0][0] for enc in known_face_encodings]
+    best_index = np.argmax(similarities)
+    return best_index, similarities[best_index]
+
+
+def time_call(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+# ----------------------------
+# MAIN
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gallery match latency against gallery size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--faces", type=int, default=4, help="Faces per frame")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--legacy", action="store_true",
+                        help="Also time the old cosine_similarity loop (galleries up to 10k only)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.faces, EMBEDDING_DIM)).astype(np.float32)
+
+    print(f"{'gallery':>10} {'build ms':>10} {'match ms':>10} {'per face ms':>12} {'legacy ms':>10}")
+    for size in args.sizes:
+        embeddings, ids = synthetic_gallery(size, rng)
+
+        start = time.perf_counter()
+        matcher = GalleryMatcher(embeddings, ids)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        match_ms = time_call(lambda: matcher.match(queries, k=args.k), args.repeats)
+
+        legacy = "-"
+        if args.legacy and size <= 10000:
+            legacy_ms = time_call(
+                lambda: [legacy_match(q, embeddings) for q in queries],
+                max(1, args.repeats // 10),
+            )
+            legacy = f"{legacy_ms:.1f}"
+
+        print(f"{size:>10} {build_ms:>10.1f} {match_ms:>10.3f} {match_ms / args.faces:>12.3f} {legacy:>10}")
+
+
+if __name__ == "__main__":
+    main()
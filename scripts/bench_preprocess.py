@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from attendance.enrollment import MIN_BRIGHTNESS, is_too_dark
+from attendance.face_pipeline import FACE_SIZE, FaceBatcher
+
+
+# ----------------------------
+# STAND-INS FOR THE MODELS
+# ----------------------------
+class FixedDetector:
+    """Returns the same detections for every frame, so only preprocessing is timed."""
+
+    def __init__(self, boxes, scale):
+        # MTCNN sees the downscaled frame, so report boxes in its coordinates
+        self.detections = [{"box": [round(v * scale) for v in box], "confidence": 1.0} for box in boxes]
+
+    def detect_faces(self, frame):
+        return self.detections
+
+
+class NullEmbedder:
+    def __init__(self, max_batch):
+        self.output = np.zeros((max_batch, 512), dtype=np.float32)
+
+    def embeddings(self, images):
+        return self.output[:len(images)]
+
+
+# ----------------------------
+# BEFORE / AFTER
+# ----------------------------
+def legacy_frame(frame, boxes, detection_scale):
+    """The per-frame work as it was: fresh RGB copy, full grey image, one new array per crop."""
+    if is_too_dark(frame, MIN_BRIGHTNESS):
+        return None
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if detection_scale < 1.0:
+        height, width = rgb_frame.shape[:2]
+        cv2.resize(rgb_frame, (round(width * detection_scale), round(height * detection_scale)),
+                   interpolation=cv2.INTER_AREA)
+    crops = [cv2.resize(rgb_frame[y:y + h, x:x + w], (FACE_SIZE, FACE_SIZE)) for x, y, w, h in boxes]
+    return np.stack(crops)
+
+
+def fast_frame(batcher, frame):
+    preprocessor = batcher.preprocessor
+    if preprocessor.brightness(frame) < MIN_BRIGHTNESS:
+        return None
+    return batcher.process(preprocessor.rgb(frame))
+
+
+def measure(step, frames):
+    """(ms per frame, peak KB allocated per frame) over `frames` calls."""
+    step()  # warm-up: first-call buffers are not per-frame cost
+    tracemalloc.start()
+    peak_bytes = 0
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        step()
+        peak_bytes += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        step()
+    ms = (time.perf_counter() - start) * 1000 / frames
+    return ms, peak_bytes / frames / 1024
+
+
+# ----------------------------
+# MAIN
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory of per-frame preprocessing, before and after.")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[1280, 720], metavar=("W", "H"))
+    parser.add_argument("--faces", type=int, default=4, help="Faces per frame")
+    parser.add_argument("--face-size", type=int, default=180, help="Face box side in pixels")
+    parser.add_argument("--detection-scale", type=float, default=0.5)
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    width, height = args.frame_size
+    rng = np.random.default_rng(0)
+    frame = rng.integers(40, 220, (height, width, 3), dtype=np.uint8)
+    boxes = [(int(rng.integers(0, width - args.face_size)), int(rng.integers(0, height - args.face_size)),
+              args.face_size, args.face_size) for _ in range(args.faces)]
+
+    batcher = FaceBatcher(FixedDetector(boxes, args.detection_scale), NullEmbedder(16), min_face_size=0,
+                          detection_scale=args.detection_scale)
+
+    print(f"{args.frames} frames of {width}x{height}, {args.faces} face(s), detection scale {args.detection_scale}\n")
+    print(f"{'path':>8} {'ms/frame':>9} {'KB/frame':>9}")
+    before = measure(lambda: legacy_frame(frame, boxes, args.detection_scale), args.frames)
+    after = measure(lambda: fast_frame(batcher, frame), args.frames)
+    for name, (ms, kb) in (("before", before), ("after", after)):
+        print(f"{name:>8} {ms:>9.2f} {kb:>9.0f}")
+    print(f"\n⚡ {before[0] / after[0]:.1f}x faster, {before[1] / max(after[1], 1):.0f}x less memory allocated per frame")
+
+
+if __name__ == "__main__":
+    main()
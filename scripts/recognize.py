@@ -1,13 +1,9 @@
 import cv2
-import numpy as np
 import os
 import sys
 import django
 from keras_facenet import FaceNet
 from mtcnn import MTCNN
-from datetime import date
-from sklearn.metrics.pairwise import cosine_similarity
-from django.utils import timezone
 import time
 
 # ----------------------------
@@ -17,13 +13,22 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE_DIR)
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "attendance_system.settings")
 django.setup()
-from attendance.models import Student, Attendance
+from attendance.models import Student
+from attendance.marking import mark_attendance
+from attendance.session_cache import session_cache
+from attendance.gallery import gallery_watcher_from_settings
+from attendance.face_pipeline import TIMING_REPORT_EVERY, face_batcher_from_settings, format_timings
+from attendance.preprocess import FramePreprocessor
+from attendance.tracking import face_tracker_from_settings
+from attendance.engine import STATS_EVERY, recognition_engine_from_settings
+from django.conf import settings
 
 # ----------------------------
 # LOAD MODELS
 # ----------------------------
 embedder = FaceNet()
 detector = MTCNN()
+face_batcher = face_batcher_from_settings(detector, embedder)
 
 # ----------------------------
 # PATHS
@@ -34,71 +39,36 @@ KNOWN_FACES_DIR = os.path.join(BASE_DIR, "faces")
 # HELPER FUNCTIONS
 # ----------------------------
 def load_known_faces():
-    """Load embeddings and IDs of registered students."""
-    known_face_encodings = []
-    known_face_ids = []
-
-    if not os.path.exists(KNOWN_FACES_DIR):
-        print("❌ Faces folder not found.")
-        return known_face_encodings, known_face_ids
-
-    for folder in os.listdir(KNOWN_FACES_DIR):
-        folder_path = os.path.join(KNOWN_FACES_DIR, folder)
-        embedding_path = os.path.join(folder_path, f"{folder}_embedding.npy")
-
-        if os.path.exists(embedding_path):
-            encoding = np.load(embedding_path)
-            known_face_encodings.append(encoding)
-            known_face_ids.append(folder)
-
-    return known_face_encodings, known_face_ids
-
-def mark_attendance(student, min_interval_seconds=60):
     """
-    Mark check-in or check-out for the latest session today.
-    If the latest session is closed, start a new one with check-in.
-    Optionally enforce a minimum interval before checkout.
+    Load the consolidated gallery of registered students (a single mmap).
+    The returned matcher picks up newly registered or deleted students by itself.
     """
-    today = date.today()
-    now = timezone.now()
-
-    # latest record for today
-    last_record = (
-        Attendance.objects
-        .filter(student=student, date=today)
-        .order_by('-id')
-        .first()
-    )
-
-    # No record today -> first CHECK-IN
-    if last_record is None:
-        Attendance.objects.create(student=student, date=today, check_in=now)
-        status = "Check-In Successful"
-
-    # Open session -> CHECK-OUT (with optional wait)
-    elif last_record.check_out is None:
-        elapsed_seconds = (now - last_record.check_in).total_seconds()
-        if elapsed_seconds >= min_interval_seconds:
-            last_record.check_out = now
-            last_record.save()
-            status = "Check-Out Successful"
-        else:
-            wait_seconds = int(min_interval_seconds - elapsed_seconds)
-            status = f"Wait {wait_seconds}s before checkout"
-
-    # Last session closed -> start NEW CHECK-IN
+    if not os.path.exists(KNOWN_FACES_DIR):
+        print("❌ Faces folder not found.")
+        return None
+
+    return gallery_watcher_from_settings(KNOWN_FACES_DIR)
+
+def draw_status(frame, box, status):
+    x, y, w, h = box
+    if "Check-In" in status:
+        color = (0, 255, 0)  # Green
+    elif "Check-Out" in status:
+        color = (255, 0, 0)  # Blue
+    elif "Wait" in status:
+        color = (0, 165, 255)  # Orange
     else:
-        Attendance.objects.create(student=student, date=today, check_in=now)
-        status = "Check-In Successful"
+        color = (0, 255, 255)  # Yellow
 
-    return status, now
+    cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+    cv2.putText(frame, f"{status}", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
 
 # ----------------------------
 # FACE RECOGNITION LOOP
 # ----------------------------
 def recognize_face():
-    known_face_encodings, known_face_ids = load_known_faces()
-    if not known_face_encodings:
+    matcher = load_known_faces()
+    if not matcher:
         print("❌ No registered faces found.")
         return
 
@@ -107,49 +77,51 @@ def recognize_face():
         print("❌ Could not open camera.")
         return
 
+    session_cache.warm()
     print("🎥 Starting face recognition...")
 
-    recognized_faces = {}  # matched_id -> {"coords": (x,y,w,h), "status": status, "last_seen": timestamp}
+    tracker = face_tracker_from_settings()
+    report_every = getattr(settings, "FACE_PIPELINE", {}).get("TIMING_REPORT_EVERY", TIMING_REPORT_EVERY)
+    preprocessor = FramePreprocessor()
+    frame_count = 0
 
     while True:
         ret, frame = cap.read()
         if not ret:
             continue
 
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        detections = detector.detect_faces(rgb_frame)
-
-        # Process each detected face
-        for detection in detections:
-            x, y, w, h = detection['box']
-            x, y = max(0, x), max(0, y)
-            if w < 80 or h < 80:
-                continue
-
-            face_crop = rgb_frame[y:y+h, x:x+w]
-            face_crop = cv2.resize(face_crop, (160, 160))
-            embedding = embedder.embeddings([face_crop])[0]
-
-            similarities = [cosine_similarity([embedding], [enc])[0][0] for enc in known_face_encodings]
-            best_index = np.argmax(similarities)
-            best_score = similarities[best_index]
-            matched_id = known_face_ids[best_index]
-
-            if best_score > 0.6:
-                last_seen = recognized_faces.get(matched_id, {}).get("last_seen", 0)
-                if time.time() - last_seen < 5:  # avoid rapid re-recognition
+        timings = {}
+        if tracker.should_detect(frame):
+            rgb_frame = preprocessor.rgb(frame)
+            start = time.perf_counter()
+            boxes, _ = face_batcher.detect(rgb_frame)
+            timings["detect"] = (time.perf_counter() - start) * 1000
+
+            # Only new (or not yet recognised) tracks are embedded
+            pending = tracker.update(frame, boxes)
+            matches = []
+            if pending:
+                start = time.perf_counter()
+                embeddings = face_batcher.embed(rgb_frame, [track.box for track in pending])
+                timings["embed"] = (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                matches = matcher.best(embeddings, threshold=0.6)
+                timings["match"] = (time.perf_counter() - start) * 1000
+
+            for track, (matched_id, best_score) in zip(pending, matches):
+                track.identify(matched_id, best_score)
+                if matched_id is None:
                     continue
 
-                recognized_faces[matched_id] = {"coords": (x, y, w, h), "last_seen": time.time()}
-
                 try:
                     student = Student.objects.get(student_id=matched_id)
                     status, _ = mark_attendance(student, min_interval_seconds=60)
-                    recognized_faces[matched_id]["status"] = status
+                    track.status = status
                     print(f"✅ {status} for {student.name}")
-                    
+
                     # ⬇️ keep window visible briefly, then quit
-                    
+
                     if status in ["Check-In Successful", "Check-Out Successful"]:
                         cv2.imshow("Face Recognition", frame)   # show final frame
                         cv2.waitKey(2000)                       # 2000 ms = 2 second
@@ -157,25 +129,19 @@ def recognize_face():
                         cv2.destroyAllWindows()
                         return
 
-
                 except Student.DoesNotExist:
                     print(f"❌ Student with ID {matched_id} not found.")
+        else:
+            tracker.propagate(frame)
 
-        # Draw all recognized faces persistently
-        for info in recognized_faces.values():
-            x, y, w, h = info["coords"]
-            status = info.get("status", "")
-            if "Check-In" in status:
-                color = (0, 255, 0)  # Green
-            elif "Check-Out" in status:
-                color = (255, 0, 0)  # Blue
-            elif "Wait" in status:
-                color = (0, 165, 255)  # Orange
-            else:
-                color = (0, 255, 255)  # Yellow
-
-            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-            cv2.putText(frame, f"{status}", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+        frame_count += 1
+        if timings and frame_count % report_every == 0:
+            print(f"⏱️ {len(tracker.tracks)} track(s) | {format_timings(timings)}")
+
+        # Draw all recognized tracks persistently
+        for track in tracker.tracks:
+            if track.identified:
+                draw_status(frame, track.box, track.status)
 
         cv2.imshow("Face Recognition", frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -184,8 +150,58 @@ def recognize_face():
     cap.release()
     cv2.destroyAllWindows()
 
+# ----------------------------
+# PIPELINED RECOGNITION (continuous, for busy entrances)
+# ----------------------------
+def recognize_face_pipelined():
+    matcher = load_known_faces()
+    if not matcher:
+        print("❌ No registered faces found.")
+        return
+
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        print("❌ Could not open camera.")
+        return
+
+    session_cache.warm()
+    stats_every = getattr(settings, "FACE_ENGINE", {}).get("STATS_EVERY", STATS_EVERY)
+    engine = recognition_engine_from_settings(cap, face_batcher, matcher).start()
+    print("🎥 Starting pipelined face recognition...")
+
+    last_index = None
+    last_report = time.time()
+    try:
+        while engine.running:
+            packet, result = engine.wait_for_frame(last_index)
+            if packet is None or packet.index == last_index:
+                continue
+            last_index = packet.index
+
+            # Overlay the most recent recognition result on the live frame
+            frame = packet.frame.copy()
+            if result is not None:
+                for box, (matched_id, _) in zip(result.boxes, result.matches):
+                    if matched_id is not None:
+                        draw_status(frame, box, engine.statuses.get(matched_id, ""))
+
+            if time.time() - last_report >= stats_every:
+                print(f"⏱️ {engine.stats_summary()}")
+                last_report = time.time()
+
+            cv2.imshow("Face Recognition", frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        engine.stop()
+        cap.release()
+        cv2.destroyAllWindows()
+
 # ----------------------------
 # MAIN
 # ----------------------------
 if __name__ == "__main__":
-    recognize_face()
+    if "--pipeline" in sys.argv:
+        recognize_face_pipelined()
+    else:
+        recognize_face()
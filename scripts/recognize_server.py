@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import time
+
+import django
+from keras_facenet import FaceNet
+from mtcnn import MTCNN
+
+# ----------------------------
+# DJANGO SETUP
+# ----------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "attendance_system.settings")
+django.setup()
+from django.conf import settings
+from attendance.session_cache import session_cache
+from attendance.gallery import gallery_watcher_from_settings
+from attendance.face_pipeline import face_batcher_from_settings
+from attendance.engine import STATS_EVERY, recognition_engine_from_settings
+from attendance.camera import CameraHub, open_source, source_names
+
+KNOWN_FACES_DIR = os.path.join(BASE_DIR, "faces")
+
+
+# ----------------------------
+# MAIN
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recognize faces from several cameras with one shared set of models."
+    )
+    parser.add_argument("sources", nargs="+",
+                        help="Camera indices (0), stream URLs (rtsp://...) or video files")
+    parser.add_argument("--loop", action="store_true", help="Loop video files forever")
+    parser.add_argument("--fast", action="store_true",
+                        help="Read video files as fast as possible instead of at their FPS")
+    args = parser.parse_args()
+
+    # One reader thread per device; the engine consumes it through a subscription
+    hub = CameraHub(opener=lambda spec: open_source(spec, realtime=not args.fast, loop=args.loop))
+    sources = {}
+    for name, spec in source_names(args.sources).items():
+        try:
+            sources[name] = hub.subscribe(spec)
+        except IOError:
+            print(f"❌ Could not open source {spec}.")
+            return
+
+    # Swaps in new gallery versions while running, so registrations need no restart
+    matcher = gallery_watcher_from_settings(KNOWN_FACES_DIR)
+    if not matcher:
+        print("❌ No registered faces found.")
+        return
+
+    print(f"🗓️ {session_cache.warm()} open session(s) loaded for today.")
+
+    # One detector/embedder pair shared by every camera
+    face_batcher = face_batcher_from_settings(MTCNN(), FaceNet())
+
+    stats_every = getattr(settings, "FACE_ENGINE", {}).get("STATS_EVERY", STATS_EVERY)
+    engine = recognition_engine_from_settings(sources, face_batcher, matcher).start()
+    print(f"🎥 Recognizing from {len(sources)} source(s): {', '.join(sources)}")
+
+    try:
+        while engine.running:
+            time.sleep(stats_every)
+            print(f"⏱️ {engine.stats_summary()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        for capture in sources.values():
+            capture.release()
+        print(f"⏹️ Stopped. {engine.stats_summary()}")
+
+
+if __name__ == "__main__":
+    main()
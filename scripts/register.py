@@ -1,5 +1,4 @@
 import cv2
-import numpy as np
 import os
 import sys
 import django
@@ -17,6 +16,11 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "attendance_system.settings")
 django.setup()
 
 from attendance.models import Student
+from attendance.gallery import GalleryStore
+from attendance.face_pipeline import face_batcher_from_settings
+from attendance.enrollment import MIN_BRIGHTNESS, EnrollmentSelector, enrollment_options_from_settings
+from attendance.preprocess import FramePreprocessor
+from attendance.capture_jobs import save_templates
 
 # Constants
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -25,6 +29,7 @@ KNOWN_FACES_DIR = os.path.join(BASE_DIR, "../faces/")
 # Load modelscap
 embedder = FaceNet()
 detector = MTCNN()
+face_batcher = face_batcher_from_settings(detector, embedder)
 
 # Get student details
 if len(sys.argv) < 8:
@@ -81,23 +86,18 @@ if not cap.isOpened():
     print("❌ Failed to open video stream.")
     sys.exit(1)
 
-# Helper: Check brightness
-def is_too_dark(frame, threshold=40):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    brightness = np.mean(gray)
-    return brightness < threshold
-
-# Start capture
-captured_embeddings = []
-print("⏳ Starting automatic face capture. Please look at the camera...")
+# Start capture: keep only sharp, well-lit, frontal and distinct faces
+selector = EnrollmentSelector(**enrollment_options_from_settings())
+preprocessor = FramePreprocessor()
+print("⏳ Starting automatic face capture. Please look at the camera and turn your head slowly...")
 start_time = time.time()
 
-while len(captured_embeddings) < 10:
+while len(selector) < 10:
     ret, frame = cap.read()
     if not ret:
         continue
 
-    if is_too_dark(frame):
+    if preprocessor.brightness(frame) < MIN_BRIGHTNESS:
         cv2.putText(frame, "💡 Increase Lighting", (10, 30), cv2.FONT_HERSHEY_SIMPLEX,
                     0.8, (0, 0, 255), 2)
         cv2.imshow("Registering Face", frame)
@@ -105,39 +105,28 @@ while len(captured_embeddings) < 10:
             break
         continue
 
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    faces = detector.detect_faces(rgb_frame)
-
-    for face in faces:
-        x, y, w, h = face['box']
-        x, y = max(0, x), max(0, y)
-        if w < 80 or h < 80:
-            continue
-
-        face_rgb = rgb_frame[y:y + h, x:x + w]
-        face_rgb = cv2.resize(face_rgb, (160, 160))
-
-        embedding = embedder.embeddings([face_rgb])[0]
-        captured_embeddings.append(embedding)
+    faces = face_batcher.process(preprocessor.rgb(frame))
 
-        img_path = os.path.join(student_folder, f"{name}_{len(captured_embeddings)}.jpg")
-        cv2.imwrite(img_path, frame[y:y + h, x:x + w])
-        print(f"✅ Captured image {len(captured_embeddings)}")
+    for ((x, y, w, h), embedding), detection in zip(faces, faces.detections):
+        accepted, reason = selector.add(embedding, frame[y:y + h, x:x + w], detection)
+        if accepted:
+            print(f"✅ Captured image {len(selector)}")
+        elif reason != "duplicate":
+            cv2.putText(frame, reason, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
 
     # Show progress
-    cv2.putText(frame, f"📸 Captured: {len(captured_embeddings)}/10", (10, 30),
+    cv2.putText(frame, f"📸 Captured: {len(selector)}/10", (10, 30),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
     cv2.imshow("Registering Face", frame)
 
     if cv2.waitKey(1) & 0xFF == ord("q"):
         break
 
-# Save embedding
-if captured_embeddings:
-    mean_embedding = np.mean(captured_embeddings, axis=0)
-    embedding_path = os.path.join(student_folder, f"{student_id}_embedding.npy")
-    np.save(embedding_path, mean_embedding)
-    print(f"✅ Saved embedding for {student_id} at {embedding_path}")
+# Save the most diverse faces as templates
+if len(selector):
+    templates = save_templates(student_folder, student, selector)
+    GalleryStore(KNOWN_FACES_DIR).upsert(student_id, templates)
+    print(f"✅ Saved {len(templates)} templates for {student_id} in {student_folder}")
 else:
     print("❌ No face embeddings captured.")
 